@@ -1,12 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
+from django.utils import timezone
+from . import change_log
 from .models import (
     Vehicle,
     WeightReading,
     Alert,
+    AlertNotification,
+    GeocodeCell,
     Report,
     Penalty,
-    PenaltyRate
+    PenaltyRate,
+    ThresholdRule
 )
 
 # Unregister default Group model if you don't need it
@@ -20,7 +25,8 @@ class VehicleAdmin(admin.ModelAdmin):
     readonly_fields = ('last_reported_location', 'timestamp')
     fieldsets = (
         ('Basic Information', {
-            'fields': ('vehicle_name', 'vehicle_id', 'description', 'owner', 'driver', 'vehicle_image')
+            'fields': ('vehicle_name', 'vehicle_id', 'description', 'owner', 'driver', 'vehicle_image',
+                       'vehicle_class', 'axle_configuration')
         }),
         ('Weight Information', {
             'fields': ('current_weight', 'max_allowed_weight', 'last_reported_weight', 'average_weight')
@@ -29,7 +35,7 @@ class VehicleAdmin(admin.ModelAdmin):
             'fields': ('latitude', 'longitude', 'last_reported_location')
         }),
         ('Status Information', {
-            'fields': ('status', 'is_currently_overloaded', 'weight_alert', 'alert_history')
+            'fields': ('status', 'is_currently_overloaded', 'weight_alert')
         }),
     )
 
@@ -49,6 +55,26 @@ class AlertAdmin(admin.ModelAdmin):
     date_hierarchy = 'timestamp'
     readonly_fields = ('timestamp',)
 
+@admin.register(AlertNotification)
+class AlertNotificationAdmin(admin.ModelAdmin):
+    list_display = ('alert', 'subject', 'severity', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'severity')
+    search_fields = ('subject', 'last_error')
+    raw_id_fields = ('alert',)
+    readonly_fields = ('created_at', 'claimed_at', 'sent_at', 'attempts', 'last_error')
+    actions = ['requeue']
+
+    @admin.action(description="Send selected notifications again")
+    def requeue(self, request, queryset):
+        count = queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f"{count} notification(s) queued again.")
+
+@admin.register(GeocodeCell)
+class GeocodeCellAdmin(admin.ModelAdmin):
+    list_display = ('place_name', 'lat_index', 'lon_index', 'precision', 'provider', 'resolved_at')
+    list_filter = ('provider', 'precision')
+    search_fields = ('place_name',)
+
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
     list_display = ('vehicle', 'report_type', 'generated_at')
@@ -81,17 +107,22 @@ class PenaltyAdmin(admin.ModelAdmin):
     )
     
     def mark_as_paid(self, request, queryset):
+        ids = list(queryset.values_list('id', flat=True))
         updated = queryset.update(paid=True, status='paid', paid_date=timezone.now())
+        change_log.record('penalties', ids)
         self.message_user(request, f"{updated} penalties marked as paid.")
     mark_as_paid.short_description = "Mark selected penalties as paid"
 
 @admin.register(PenaltyRate)
 class PenaltyRateAdmin(admin.ModelAdmin):
-    list_display = ('amount', 'effective_from')
-    readonly_fields = ('effective_from',)
-    
-    def save_model(self, request, obj, form, change):
-        # Make sure there's only one active rate
-        if not change:
-            PenaltyRate.objects.all().delete()
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+    # Rates are kept as a history; the one in force at a reading's time applies
+    list_display = ('amount', 'effective_from', 'notes')
+    ordering = ('-effective_from',)
+
+@admin.register(ThresholdRule)
+class ThresholdRuleAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'vehicle', 'vehicle_class', 'axle_configuration', 'overload_tolerance',
+                    'warning_margin', 'is_active', 'updated_at')
+    list_filter = ('is_active', 'vehicle_class', 'axle_configuration')
+    search_fields = ('vehicle__vehicle_id', 'vehicle_class', 'axle_configuration')
+    raw_id_fields = ('vehicle',)
@@ -0,0 +1,201 @@
+"""
+Cold archive of old weight readings.
+
+`manage.py archive_readings` moves readings older than the hot window out of
+the database into one compressed columnar file per vehicle and month, listed
+in the `ReadingArchive` manifest. `read_range` reads them back for the
+history API.
+
+File format (version 1): <archive dir>/<YYYY>/<MM>/vehicle-<id>.json.gz is a
+gzip-compressed JSON object
+
+    {
+        "format": "rtms-readings",
+        "version": 1,
+        "vehicle": <vehicle id>,
+        "month": "YYYY-MM",
+        "rows": <row count>,
+        "columns": {
+            "id": [...],           delta-encoded integers
+            "timestamp": [...],    delta-encoded milliseconds since the Unix epoch (UTC)
+            "weight": [...],
+            "latitude": [...],
+            "longitude": [...],
+            "sensor_id": [...],
+            "status": [...],
+            "sensor_health": [...],
+            "sequence": [...],
+            "idempotency_key": [...]
+        }
+    }
+
+with rows ordered by timestamp and every column holding one value per row.
+Storing columns rather than rows keeps repeated values next to each other,
+which is what lets gzip shrink them.
+
+Weight rollups are left in place when readings are archived, so only rebuild
+them with --since inside the hot window.
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+
+from .config import ARCHIVE_CONFIG
+from .models import WeightReading, ReadingArchive
+from .partitions import add_months, month_start
+
+FORMAT = 'rtms-readings'
+VERSION = 1
+
+FIELDS = [
+    'id', 'timestamp', 'weight', 'latitude', 'longitude', 'sensor_id',
+    'status', 'sensor_health', 'sequence', 'idempotency_key',
+]
+DELTA_FIELDS = ('id', 'timestamp')
+
+# Readings deleted per statement once archived
+DELETE_CHUNK_SIZE = 1000
+
+
+def archive_directory():
+    return os.path.join(settings.BASE_DIR, ARCHIVE_CONFIG['DIRECTORY'])
+
+
+def archive_path(vehicle_id, month):
+    return os.path.join(f'{month:%Y}', f'{month:%m}', f'vehicle-{vehicle_id}.json.gz')
+
+
+def encode(vehicle_id, month, rows):
+    columns = {field: [row[field] for row in rows] for field in FIELDS}
+    columns['timestamp'] = [round(value.timestamp() * 1000) for value in columns['timestamp']]
+    for field in DELTA_FIELDS:
+        values, previous = columns[field], 0
+        for index, value in enumerate(values):
+            values[index], previous = value - previous, value
+
+    document = {
+        'format': FORMAT,
+        'version': VERSION,
+        'vehicle': vehicle_id,
+        'month': f'{month:%Y-%m}',
+        'rows': len(rows),
+        'columns': columns,
+    }
+    return gzip.compress(json.dumps(document, separators=(',', ':')).encode())
+
+
+def decode(data):
+    document = json.loads(gzip.decompress(data))
+    if document.get('format') != FORMAT or document.get('version') != VERSION:
+        raise ValueError(f"Unsupported archive format {document.get('format')} v{document.get('version')}")
+
+    columns = document['columns']
+    for field in DELTA_FIELDS:
+        total = 0
+        for index, delta in enumerate(columns[field]):
+            total += delta
+            columns[field][index] = total
+    columns['timestamp'] = [
+        datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc) for value in columns['timestamp']
+    ]
+    return [dict(zip(FIELDS, values)) for values in zip(*(columns[field] for field in FIELDS))]
+
+
+def read_file(path):
+    with open(os.path.join(archive_directory(), path), 'rb') as archive_file:
+        return decode(archive_file.read())
+
+
+def write_file(path, data):
+    """Write `data` atomically, so readers never see a partial file."""
+    full_path = os.path.join(archive_directory(), path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    temporary = f'{full_path}.tmp'
+    with open(temporary, 'wb') as archive_file:
+        archive_file.write(data)
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+    os.replace(temporary, full_path)
+
+
+def archive_before(cutoff):
+    """
+    Move every reading older than `cutoff` into the archive. Returns the
+    manifest entries written.
+    """
+    vehicle_months = WeightReading.objects.filter(
+        timestamp__lt=cutoff
+    ).annotate(
+        month=TruncMonth('timestamp', tzinfo=dt_timezone.utc)
+    ).values_list('vehicle_id', 'month').distinct().order_by('month', 'vehicle_id')
+
+    return [
+        archive_vehicle_month(vehicle_id, month_start(month), cutoff)
+        for vehicle_id, month in list(vehicle_months)
+    ]
+
+
+def archive_vehicle_month(vehicle_id, month, cutoff):
+    """
+    Archive one vehicle's readings for one month, up to `cutoff`. Readings
+    archived earlier for the same month are merged into the new file. The
+    file is written before the readings are deleted, and rows are keyed by
+    id, so an interrupted run can simply be repeated.
+    """
+    readings = WeightReading.objects.filter(
+        vehicle_id=vehicle_id,
+        timestamp__gte=month,
+        timestamp__lt=min(add_months(month, 1), cutoff)
+    )
+    rows = {row['id']: row for row in readings.values(*FIELDS)}
+    archived_ids = list(rows)
+
+    entry = ReadingArchive.objects.filter(vehicle_id=vehicle_id, month=month.date()).first()
+    if entry is not None:
+        for row in read_file(entry.path):
+            rows.setdefault(row['id'], row)
+
+    if not rows:
+        return entry
+
+    rows = sorted(rows.values(), key=lambda row: (row['timestamp'], row['id']))
+    path = archive_path(vehicle_id, month)
+    data = encode(vehicle_id, month, rows)
+    write_file(path, data)
+
+    with transaction.atomic():
+        entry, _ = ReadingArchive.objects.update_or_create(
+            vehicle_id=vehicle_id,
+            month=month.date(),
+            defaults={
+                'path': path,
+                'row_count': len(rows),
+                'first_timestamp': rows[0]['timestamp'],
+                'last_timestamp': rows[-1]['timestamp'],
+                'size_bytes': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+        )
+        for offset in range(0, len(archived_ids), DELETE_CHUNK_SIZE):
+            WeightReading.objects.filter(id__in=archived_ids[offset:offset + DELETE_CHUNK_SIZE]).delete()
+    return entry
+
+
+def read_range(vehicle_id, start, end):
+    """Archived readings of a vehicle with start <= timestamp < end, oldest first."""
+    entries = ReadingArchive.objects.filter(
+        vehicle_id=vehicle_id,
+        last_timestamp__gte=start,
+        first_timestamp__lt=end
+    ).order_by('month')
+
+    rows = []
+    for entry in entries:
+        rows.extend(row for row in read_file(entry.path) if start <= row['timestamp'] < end)
+    return rows
@@ -0,0 +1,113 @@
+"""
+Compact binary frame format for low-bandwidth weight sensors.
+
+Every reading is one fixed-size, little-endian frame of 34 bytes:
+
+    offset  size  type     field
+    0       1     uint8    protocol version (currently 1)
+    1       1     uint8    flags, see below
+    2       4     uint32   vehicle id (primary key of the Vehicle)
+    6       4     uint32   sensor id
+    10      4     uint32   sequence number, per sensor
+    14      8     int64    device timestamp, milliseconds since the Unix epoch (UTC)
+    22      4     float32  weight in kg
+    26      4     int32    latitude in microdegrees
+    30      4     int32    longitude in microdegrees
+
+Flags:
+
+    bit 0   sensor malfunctioning
+    bit 1   reading suspected by the sensor
+    bit 2   latitude/longitude present
+
+A UDP datagram carries one or more whole frames. Over TCP, frames are sent
+back to back on the stream. Frames with a timestamp outside 2000-2100, a
+weight that is not a finite number or a location out of range are rejected
+one by one by `reading_fields`.
+"""
+import math
+import struct
+from datetime import datetime, timezone as dt_timezone
+
+PROTOCOL_VERSION = 1
+
+FLAG_MALFUNCTIONING = 0x01
+FLAG_SUSPECTED = 0x02
+FLAG_HAS_LOCATION = 0x04
+
+FRAME = struct.Struct('<BBIIIqfii')
+FRAME_SIZE = FRAME.size
+
+MICRODEGREES = 1_000_000
+
+# Device timestamps accepted, 2000-01-01 to 2100-01-01 UTC
+MIN_TIMESTAMP_MS = 946_684_800_000
+MAX_TIMESTAMP_MS = 4_102_444_800_000
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_frame(vehicle_id, sensor_id, sequence, timestamp_ms, weight,
+                 latitude=None, longitude=None, malfunctioning=False, suspected=False):
+    flags = 0
+    if malfunctioning:
+        flags |= FLAG_MALFUNCTIONING
+    if suspected:
+        flags |= FLAG_SUSPECTED
+    if latitude is not None and longitude is not None:
+        flags |= FLAG_HAS_LOCATION
+    else:
+        latitude = longitude = 0.0
+
+    return FRAME.pack(
+        PROTOCOL_VERSION,
+        flags,
+        vehicle_id,
+        sensor_id,
+        sequence,
+        timestamp_ms,
+        weight,
+        round(latitude * MICRODEGREES),
+        round(longitude * MICRODEGREES),
+    )
+
+
+def decode_frames(data):
+    """
+    Yield the raw field tuples of every frame in `data`. The buffer is read
+    in place through a memoryview; a trailing partial frame is an error.
+    """
+    view = memoryview(data)
+    if len(view) % FRAME_SIZE:
+        raise FrameError(f"Buffer of {len(view)} bytes is not a whole number of {FRAME_SIZE}-byte frames")
+    for fields in FRAME.iter_unpack(view):
+        if fields[0] != PROTOCOL_VERSION:
+            raise FrameError(f"Unsupported protocol version {fields[0]}")
+        yield fields
+
+
+def reading_fields(frame):
+    """Map a decoded frame to `WeightReading` field values. Raises `FrameError` on implausible values."""
+    _, flags, vehicle_id, sensor_id, sequence, timestamp_ms, weight, latitude, longitude = frame
+    if not MIN_TIMESTAMP_MS <= timestamp_ms < MAX_TIMESTAMP_MS:
+        raise FrameError(f"Timestamp {timestamp_ms} out of range")
+    if not math.isfinite(weight):
+        raise FrameError(f"Weight {weight} is not a finite number")
+    has_location = flags & FLAG_HAS_LOCATION
+    if has_location and not (
+        abs(latitude) <= 90 * MICRODEGREES and abs(longitude) <= 180 * MICRODEGREES
+    ):
+        raise FrameError(f"Location {latitude}, {longitude} out of range")
+    return {
+        'vehicle_id': vehicle_id,
+        'sensor_id': str(sensor_id),
+        'sequence': sequence,
+        'timestamp': datetime.fromtimestamp(timestamp_ms / 1000, tz=dt_timezone.utc),
+        'weight': float(weight),
+        'latitude': latitude / MICRODEGREES if has_location else None,
+        'longitude': longitude / MICRODEGREES if has_location else None,
+        'sensor_health': 'malfunctioning' if flags & FLAG_MALFUNCTIONING else 'healthy',
+        'status': 'suspected' if flags & FLAG_SUSPECTED else 'valid',
+    }
@@ -0,0 +1,112 @@
+"""
+Change log behind the delta sync endpoint (GET /api/sync/).
+
+Every write to a vehicle, alert or penalty appends a `ChangeLog` row in the
+same transaction: from the model signals in monitoring/signals.py, and
+explicitly wherever rows are written in bulk without signals. The reading
+pipeline collects its rows into one insert at the end of its transaction.
+
+Clients keep the id of the last change they have seen as their cursor and
+read forward from it on the primary key, so a sync costs the size of the
+delta, not of the tables. Ids are taken when rows are inserted but become
+visible when their transaction commits, so reads stop short of changes
+younger than SYNC_CONFIG['SETTLE_SECONDS'] to let slower transactions with
+smaller ids commit first.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .config import SYNC_CONFIG
+from .models import Alert, ChangeLog, Penalty, Vehicle
+
+RESOURCE_MODELS = {
+    'vehicles': Vehicle,
+    'alerts': Alert,
+    'penalties': Penalty,
+}
+
+_local = threading.local()
+
+
+def record(resource, object_ids, deleted=False):
+    """Log a change to the `object_ids` rows of `resource`."""
+    entries = [ChangeLog(resource=resource, object_id=object_id, deleted=deleted) for object_id in object_ids]
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.extend(entries)
+    elif entries:
+        ChangeLog.objects.bulk_create(entries)
+
+
+def record_for(model, object_ids, deleted=False):
+    """Log a change to rows of `model`, if it is synced."""
+    for resource, resource_model in RESOURCE_MODELS.items():
+        if resource_model is model:
+            record(resource, object_ids, deleted)
+
+
+@contextmanager
+def collect():
+    """Write the changes recorded inside the block with one insert when it ends."""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    pending = _local.pending = []
+    try:
+        yield
+    finally:
+        _local.pending = None
+    now = timezone.now()
+    for entry in pending:
+        entry.changed_at = now
+    ChangeLog.objects.bulk_create(pending)
+
+
+def settled_before():
+    return timezone.now() - timedelta(seconds=SYNC_CONFIG['SETTLE_SECONDS'])
+
+
+def latest_cursor():
+    """The cursor a client starts syncing from, before it downloads the full lists."""
+    unsettled = ChangeLog.objects.filter(
+        changed_at__gte=settled_before()
+    ).order_by('id').values_list('id', flat=True).first()
+    if unsettled is not None:
+        return unsettled - 1
+    return ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def expired(cursor):
+    """Whether changes after `cursor` may have been pruned already."""
+    oldest = ChangeLog.objects.order_by('id').values_list('id', flat=True).first()
+    return oldest is not None and cursor < oldest - 1
+
+
+def changes_since(cursor, limit):
+    """
+    Changes after `cursor`, reading at most `limit` log rows. Returns
+    `({resource: (changed_ids, deleted_ids)}, next_cursor, has_more)`, where
+    each object appears once, in the state of its last change.
+    """
+    rows = list(ChangeLog.objects.filter(id__gt=cursor).order_by('id').values_list(
+        'id', 'resource', 'object_id', 'deleted', 'changed_at'
+    )[:limit + 1])
+    has_more = len(rows) > limit
+    horizon = settled_before()
+
+    latest = {}
+    next_cursor = cursor
+    for row_id, resource, object_id, deleted, changed_at in rows[:limit]:
+        if changed_at >= horizon:
+            has_more = False
+            break
+        latest[(resource, object_id)] = deleted
+        next_cursor = row_id
+
+    changes = {resource: ([], []) for resource in RESOURCE_MODELS}
+    for (resource, object_id), deleted in latest.items():
+        changes[resource][1 if deleted else 0].append(object_id)
+    return changes, next_cursor, has_more
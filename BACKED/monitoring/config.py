@@ -25,7 +25,7 @@ ALERT_CONFIG = {
 MAP_CONFIG = {
     'DEFAULT_MAP_PROVIDER': 'google',  # or 'tomtom'
     'GOOGLE_MAPS_URL_FORMAT': 'https://www.google.com/maps?q={latitude},{longitude}',
-    'TOMTOM_STATIC_MAP_URL': 'https://api.tomtom.com/map/1/staticimage?key={api_key}&zoom=9&center={latitude},{longitude}&format=jpg&layer=basic&style=main&width=1305&height=748&view=Unified&language=en-GB',
+    'TOMTOM_STATIC_MAP_URL': 'https://api.tomtom.com/map/1/staticimage?key={api_key}&zoom={zoom}&center={latitude},{longitude}&format=jpg&layer=basic&style=main&width=1305&height=748&view=Unified&language=en-GB',
 }
 
 # Report Configuration
@@ -38,4 +38,129 @@ REPORT_CONFIG = {
 WEIGHT_READING_CONFIG = {
     'VALID_READING_DAYS': 30,
     'MAX_READINGS_FOR_AVERAGE': 100,
-}
\ No newline at end of file
+}
+
+# Ingest Configuration
+INGEST_CONFIG = {
+    'MAX_BATCH_SIZE': 5000,       # readings accepted per batch upload
+    'VECTORIZE_MIN_BATCH': 256,   # batches at least this large are evaluated with NumPy
+}
+
+# Asynchronous Ingest Queue Configuration
+INGEST_QUEUE_CONFIG = {
+    'WORKERS': 4,
+    'BATCH_SIZE': 500,          # readings claimed by a worker at a time
+    'POLL_INTERVAL': 0.5,       # seconds to sleep when the queue is empty
+    'CLAIM_TIMEOUT': 300,       # seconds before a claimed batch is considered abandoned
+    'MAX_ATTEMPTS': 3,
+    'RETRY_BASE_DELAY': 5,      # seconds before the first retry, doubled on every further one
+    'RETRY_MAX_DELAY': 300,
+}
+
+# WebSocket Reading Stream Configuration
+STREAM_INGEST_CONFIG = {
+    'MAX_PENDING': 1000,  # readings buffered per connection before reads block
+    'BATCH_SIZE': 200,    # readings processed per pipeline call
+    'PAUSE_AT': 800,      # pending readings at which the client is asked to pause
+    'RESUME_AT': 200,     # pending readings at which the client may resume
+}
+
+# Binary Ingest Gateway Configuration
+GATEWAY_CONFIG = {
+    'HOST': '0.0.0.0',
+    'UDP_PORT': 9100,
+    'TCP_PORT': 9101,
+    'BATCH_SIZE': 1000,      # frames per pipeline call
+    'FLUSH_INTERVAL': 0.5,   # seconds before a partial batch is processed
+    'MAX_PENDING': 50000,    # frames buffered before UDP frames are dropped and TCP reads pause
+}
+
+# Duplicate Reading Detection Configuration
+DEDUP_CONFIG = {
+    'CACHE_SIZE': 100000,      # recently seen reading keys kept in memory per process
+    'KEY_RETENTION_DAYS': 30,  # how long retries are recognised as duplicates
+}
+
+# Weight Reading Partitioning Configuration (PostgreSQL)
+PARTITION_CONFIG = {
+    'MONTHS_AHEAD': 3,         # monthly partitions created in advance
+    'RETENTION_MONTHS': None,  # months of readings kept online, None keeps everything
+    'DROP_EXPIRED': False,     # drop expired partitions instead of detaching them
+}
+
+# Weight Rollup Configuration
+ROLLUP_CONFIG = {
+    'MINUTE_RETENTION_DAYS': 7,   # minute buckets older than this are pruned
+    'HOUR_RETENTION_DAYS': 400,   # hour buckets older than this are pruned, day buckets are kept
+}
+
+# Reading Archive Configuration
+ARCHIVE_CONFIG = {
+    'DIRECTORY': 'reading_archive',  # relative paths are under the project directory
+    'HOT_DAYS': 365,                 # readings older than this are moved to the archive
+    'MAX_HISTORY_RESULTS': 10000,    # readings returned by one history request
+}
+
+# Penalty Rate Cache Configuration
+PENALTY_RATE_CONFIG = {
+    'CACHE_SECONDS': 60,  # how long a process trusts its copy of the rate history
+}
+
+# Threshold Rule Cache Configuration
+THRESHOLD_CONFIG = {
+    'CACHE_SECONDS': 60,  # how long a process trusts its compiled threshold rules
+}
+
+# Notification Outbox Configuration
+NOTIFICATION_CONFIG = {
+    'BATCH_SIZE': 50,           # notifications sent over one SMTP connection
+    'POLL_INTERVAL': 5,         # seconds to sleep when the outbox is empty
+    'CLAIM_TIMEOUT': 300,       # seconds before a claimed notification is considered abandoned
+    'MAX_ATTEMPTS': 6,          # attempts before a notification is dead-lettered
+    'RETRY_BASE_DELAY': 30,     # seconds before the first retry, doubled on every further one
+    'RETRY_MAX_DELAY': 3600,
+    # Seconds notifications of each severity are collected before they go out
+    # together in one digest per recipient list; 0 sends them at once
+    'DIGEST_WINDOWS': {'high': 0, 'medium': 300, 'low': 900},
+    'DIGEST_MAX_ALERTS': 100,   # alerts summarised in one digest email
+    'AUTO_NOTIFY_ALERT_TYPES': ['overload', 'sensor_malfunction'],  # pipeline alerts emailed to authorities
+}
+
+# Static Map Image Cache Configuration
+MAP_IMAGE_CONFIG = {
+    'ZOOM': 9,
+    'COORDINATE_PRECISION': 2,      # decimal places kept, nearby locations share an image
+    'CONNECT_TIMEOUT': 2,           # seconds
+    'READ_TIMEOUT': 5,              # seconds
+    'POOL_SIZE': 4,                 # pooled connections to the map service
+    'FAILURE_COOLDOWN': 60,         # seconds without requests after the map service failed
+    'MAX_IMAGE_BYTES': 2 * 1024 * 1024,
+    'CACHE_DIRECTORY': 'map_cache',  # relative paths are under the project directory
+    'CACHE_MAX_BYTES': 200 * 1024 * 1024,
+}
+
+# Reverse Geocoding Configuration
+GEOCODING_CONFIG = {
+    'PROVIDER': 'monitoring.geocoding.NominatimProvider',  # dotted path of the provider class
+    'PRECISION': 2,         # grid cells are 10**-PRECISION degrees square (about 1 km)
+    'CACHE_SIZE': 10000,    # cells kept in memory per process
+    'MAX_BATCH': 200,       # points answered by one batch request
+    'LIVE_LOOKUPS': 3,      # unknown cells a batch request may look up with the provider
+    'NOMINATIM_URL': 'https://nominatim.openstreetmap.org/reverse',
+    'USER_AGENT': 'RTMS Weight Monitoring System',
+    'TIMEOUT': 5,           # seconds
+    'MIN_INTERVAL': 1.0,    # seconds between provider requests (Nominatim usage policy)
+}
+
+# List Pagination Configuration
+PAGINATION_CONFIG = {
+    'MAX_PAGE_SIZE': 200,  # largest page_size a client may ask for
+}
+
+# Delta Sync Configuration
+SYNC_CONFIG = {
+    'PAGE_SIZE': 500,        # changes returned per request by default
+    'MAX_PAGE_SIZE': 2000,
+    'SETTLE_SECONDS': 5,     # changes younger than this wait, so slower transactions commit first
+    'RETENTION_DAYS': 30,    # older changes are pruned, their cursors have to sync again
+}
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from . import fleet_feed
+from .config import STREAM_INGEST_CONFIG
+from .models import Vehicle, WeightReading
+from .pipeline import ReadingPipeline
+from .serializers import WeightReadingBatchItemSerializer
+
+logger = logging.getLogger(__name__)
+
+
+@database_sync_to_async
+def authenticate(scope):
+    """The active user of the JWT in the connection's query string, or None."""
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = query.get('token', [None])[0]
+    if not token:
+        return None
+
+    authentication = JWTAuthentication()
+    try:
+        user = authentication.get_user(authentication.get_validated_token(token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return user if user.is_active else None
+
+
+class ReadingStreamConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Persistent ingest connection for sensors and station gateways.
+
+    Connect to ws/readings/?token=<JWT access token>, then send readings as
+    JSON messages, either one reading object or a list of them, in the same
+    format as POST /api/weights/. An optional "id" on a reading is echoed
+    back in its acknowledgement:
+
+        {"type": "ack", "id": ..., "reading_id": 42, "status": "valid"}
+        {"type": "ack", "id": ..., "reading_id": 42, "duplicate": true}
+        {"type": "error", "id": ..., "errors": {...}}
+
+    Readings are processed in batches through the same pipeline as the REST
+    API. When the server falls behind it sends {"type": "pause"}; clients
+    should stop sending until {"type": "resume"}. Readings that were not
+    acknowledged before a disconnect should be resent; give them a sequence
+    or idempotency_key so a resend is recognised as a duplicate.
+    """
+
+    async def connect(self):
+        self.user = await authenticate(self.scope)
+        if self.user is None:
+            await self.close(code=4401)
+            return
+
+        self.pending = asyncio.Queue(maxsize=STREAM_INGEST_CONFIG['MAX_PENDING'])
+        self.paused = False
+        self.pipeline = ReadingPipeline()
+        self.worker = asyncio.create_task(self.drain())
+        await self.accept()
+
+    async def disconnect(self, code):
+        worker = getattr(self, 'worker', None)
+        if worker:
+            worker.cancel()
+
+    async def receive_json(self, content, **kwargs):
+        readings = content if isinstance(content, list) else [content]
+        for reading in readings:
+            # Blocks once MAX_PENDING readings are waiting, which stops this
+            # connection from being read until the worker catches up
+            await self.pending.put(reading)
+
+        if not self.paused and self.pending.qsize() >= STREAM_INGEST_CONFIG['PAUSE_AT']:
+            self.paused = True
+            await self.send_json({'type': 'pause', 'pending': self.pending.qsize()})
+
+    async def drain(self):
+        while True:
+            batch = [await self.pending.get()]
+            while len(batch) < STREAM_INGEST_CONFIG['BATCH_SIZE'] and not self.pending.empty():
+                batch.append(self.pending.get_nowait())
+
+            try:
+                acks = await database_sync_to_async(self.process)(batch)
+            except Exception:
+                logger.exception("Failed to process streamed readings")
+                acks = [
+                    {'type': 'error', 'id': self.message_id(item), 'errors': {'detail': 'Processing failed'}}
+                    for item in batch
+                ]
+            for ack in acks:
+                await self.send_json(ack)
+
+            if self.paused and self.pending.qsize() <= STREAM_INGEST_CONFIG['RESUME_AT']:
+                self.paused = False
+                await self.send_json({'type': 'resume', 'pending': self.pending.qsize()})
+
+    def process(self, batch):
+        valid, errors = WeightReadingBatchItemSerializer.validate_batch(batch)
+        readings = [(index, WeightReading(**data)) for index, data in valid]
+        self.pipeline.process_batch([reading for _, reading in readings])
+
+        acks = [
+            {'type': 'error', 'id': self.message_id(batch[error['index']]), 'errors': error['errors']}
+            for error in errors
+        ]
+        for index, reading in readings:
+            if reading.duplicate_of:
+                acks.append({
+                    'type': 'ack',
+                    'id': self.message_id(batch[index]),
+                    'reading_id': reading.duplicate_of,
+                    'duplicate': True
+                })
+                continue
+            acks.append({
+                'type': 'ack',
+                'id': self.message_id(batch[index]),
+                'reading_id': reading.id,
+                'status': reading.status
+            })
+        return acks
+
+    @staticmethod
+    def message_id(item):
+        return item.get('id') if isinstance(item, dict) else None
+
+
+class FleetFeedConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Push feed of the fleet state for dashboards.
+
+    Connect to ws/fleet/?token=<JWT access token>. Changes to every vehicle
+    are sent until the client narrows its subscription:
+
+        {"type": "subscribe"}                                        all vehicles
+        {"type": "subscribe", "vehicles": [1, 2]}                    some vehicles
+        {"type": "subscribe", "bbox": [south, west, north, east]}    vehicles in a map area
+
+    Each subscribe is answered with the current state of the matching
+    vehicles, {"type": "snapshot", "vehicles": [...]}; after that changes
+    arrive as {"type": "fleet.update", "changes": [...]} when readings are
+    processed (see monitoring/fleet_feed.py for the format).
+    """
+
+    async def connect(self):
+        self.user = await authenticate(self.scope)
+        if self.user is None:
+            await self.close(code=4401)
+            return
+
+        self.vehicle_ids = None
+        self.bbox = None
+        await self.channel_layer.group_add(fleet_feed.FLEET_GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(fleet_feed.FLEET_GROUP, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if not isinstance(content, dict) or content.get('type') != 'subscribe':
+            await self.send_json({'type': 'error', 'errors': {'type': 'Expected a subscribe message'}})
+            return
+
+        vehicle_ids = content.get('vehicles')
+        bbox = content.get('bbox')
+        if vehicle_ids is not None and not (
+            isinstance(vehicle_ids, list) and all(isinstance(i, int) for i in vehicle_ids)
+        ):
+            await self.send_json({'type': 'error', 'errors': {'vehicles': 'Expected a list of vehicle ids'}})
+            return
+        if bbox is not None and not (
+            isinstance(bbox, list) and len(bbox) == 4 and all(isinstance(v, (int, float)) for v in bbox)
+        ):
+            await self.send_json({'type': 'error', 'errors': {'bbox': 'Expected [south, west, north, east]'}})
+            return
+
+        self.vehicle_ids = set(vehicle_ids) if vehicle_ids is not None else None
+        self.bbox = bbox
+        await self.send_json({'type': 'snapshot', 'vehicles': await self.snapshot()})
+
+    async def fleet_update(self, event):
+        if self.vehicle_ids is None and self.bbox is None:
+            await self.send(text_data=event['text'])
+            return
+        pieces = [piece for vehicle_id, lat, lon, piece in event['changes'] if self.watches(vehicle_id, lat, lon)]
+        if pieces:
+            await self.send(text_data=fleet_feed.frame(pieces))
+
+    def watches(self, vehicle_id, lat, lon):
+        if self.vehicle_ids is not None and vehicle_id not in self.vehicle_ids:
+            return False
+        if self.bbox is not None:
+            south, west, north, east = self.bbox
+            if lat is None or lon is None or not (south <= lat <= north and west <= lon <= east):
+                return False
+        return True
+
+    @database_sync_to_async
+    def snapshot(self):
+        vehicles = Vehicle.objects.only(
+            'id', 'current_weight', 'latitude', 'longitude', 'is_currently_overloaded', 'weight_alert'
+        ).order_by('id')
+        if self.vehicle_ids is not None:
+            vehicles = vehicles.filter(pk__in=self.vehicle_ids)
+        if self.bbox is not None:
+            south, west, north, east = self.bbox
+            vehicles = vehicles.filter(latitude__range=(south, north), longitude__range=(west, east))
+        return [fleet_feed.vehicle_state(vehicle) for vehicle in vehicles]
@@ -0,0 +1,55 @@
+"""
+Duplicate detection for retried readings.
+
+A reading is identified by its client idempotency key or, failing that, by
+(sensor_id, sequence). Keys are claimed in `ReadingDedupKey`, whose unique
+index is the source of truth. A bounded in-process LRU of recently
+committed keys sits in front of it, so retries are usually rejected without
+touching the database. The keys of new readings are inserted once the
+readings are, with their ids, in a single INSERT under a savepoint; only
+when it conflicts is the unique index consulted and the batch stored again
+without the retries.
+"""
+import threading
+from collections import OrderedDict
+
+from .config import DEDUP_CONFIG
+
+
+def reading_key(reading):
+    if reading.idempotency_key:
+        return f"key:{reading.idempotency_key}"
+    if reading.sensor_id and reading.sequence is not None:
+        return f"seq:{reading.sensor_id}:{reading.sequence}"
+    return None
+
+
+class RecentKeys:
+    """Thread-safe LRU mapping reading keys to the id of the stored reading."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.keys = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            reading_id = self.keys.get(key)
+            if reading_id is not None:
+                self.keys.move_to_end(key)
+            return reading_id
+
+    def add_many(self, items):
+        with self.lock:
+            for key, reading_id in items:
+                self.keys[key] = reading_id
+                self.keys.move_to_end(key)
+            while len(self.keys) > self.max_size:
+                self.keys.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+
+recent_keys = RecentKeys(DEDUP_CONFIG['CACHE_SIZE'])
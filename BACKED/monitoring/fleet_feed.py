@@ -0,0 +1,108 @@
+"""
+Real-time fleet state for dashboards.
+
+The reading pipeline calls `publish` once its transaction commits, with the
+new state of every vehicle it touched and the alerts it raised. The update
+is serialized here, once, and sent to the FLEET_GROUP channel layer group;
+each `FleetFeedConsumer` forwards it to its browser, filtered to the
+vehicles or map area the browser subscribed to. Screens are updated by push,
+so the database load does not grow with the number of open dashboards.
+
+Every vehicle change is sent to clients as a compact JSON object:
+
+    {"id": 7, "weight": 6100.0, "lat": -6.8, "lon": 39.28,
+     "overloaded": true, "weight_alert": true,
+     "alert": {"id": 93, "type": "overload", "severity": "high", "message": "...",
+               "timestamp": "..."}}
+
+where "alert" is the newest alert of the vehicle in the batch, if any.
+"""
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+FLEET_GROUP = 'fleet'
+
+
+def vehicle_state(vehicle):
+    return {
+        'id': vehicle.pk,
+        'weight': vehicle.current_weight,
+        'lat': vehicle.latitude,
+        'lon': vehicle.longitude,
+        'overloaded': vehicle.is_currently_overloaded,
+        'weight_alert': vehicle.weight_alert,
+    }
+
+
+def alert_state(alert):
+    return {
+        'id': alert.pk,
+        'type': alert.alert_type,
+        'severity': alert.severity,
+        'message': alert.message,
+        'timestamp': alert.timestamp,
+    }
+
+
+def changes(vehicles, alerts):
+    """Change objects for the vehicles of a processed batch, with their newest alert."""
+    newest = {}
+    for alert in alerts:
+        if alert.pk is not None and (alert.vehicle_id not in newest or alert.pk > newest[alert.vehicle_id].pk):
+            newest[alert.vehicle_id] = alert
+    result = []
+    for vehicle in vehicles:
+        change = vehicle_state(vehicle)
+        if vehicle.pk in newest:
+            change['alert'] = alert_state(newest[vehicle.pk])
+        result.append(change)
+    return result
+
+
+def encode(change_list):
+    """
+    The group message for a list of changes. Each change is serialized once;
+    consumers only join the serialized pieces, whatever they are filtered to.
+    """
+    pieces = [json.dumps(change, cls=DjangoJSONEncoder, separators=(',', ':')) for change in change_list]
+    return {
+        'type': 'fleet.update',
+        'changes': [[change['id'], change['lat'], change['lon'], piece] for change, piece in zip(change_list, pieces)],
+        'text': frame(pieces),
+    }
+
+
+def frame(pieces):
+    return '{"type":"fleet.update","changes":[' + ','.join(pieces) + ']}'
+
+
+def reaches_other_processes():
+    """Whether updates published here reach dashboards connected to other processes."""
+    channel_layer = get_channel_layer()
+    return channel_layer is not None and not isinstance(channel_layer, InMemoryChannelLayer)
+
+
+def warn_if_local(stderr):
+    """Warn a worker process that its updates will not reach any dashboard."""
+    if not reaches_other_processes():
+        stderr.write("The channel layer is in-memory, so fleet updates from this process reach "
+                     "no dashboard; set REDIS_URL to share it with the web processes")
+
+
+def publish(change_list):
+    """Send changes to every watching dashboard. Never raises, the data is already committed."""
+    if not change_list:
+        return
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(FLEET_GROUP, encode(change_list))
+    except Exception:
+        logger.exception("Failed to publish fleet update")
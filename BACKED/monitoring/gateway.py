@@ -0,0 +1,80 @@
+"""
+Binary ingest gateway.
+
+Decodes frames received by `manage.py run_ingest_gateway` (see
+`binary_protocol` for the frame layout) and feeds them to the reading
+pipeline in batches.
+"""
+import logging
+
+from .binary_protocol import FrameError, decode_frames, reading_fields
+from .models import Vehicle, WeightReading
+from .pipeline import ReadingPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class ReadingGateway:
+
+    def __init__(self, pipeline=None):
+        self.pipeline = pipeline or ReadingPipeline()
+        self.pending = []
+        self.received = 0
+        self.processed = 0
+        self.duplicates = 0
+        self.rejected = 0
+
+    def feed(self, data):
+        """Buffer the frames in `data`. Raises `FrameError` on a malformed buffer."""
+        frames = list(decode_frames(data))
+        self.pending.extend(frames)
+        self.received += len(frames)
+        return len(frames)
+
+    def take(self):
+        """Hand over the buffered frames, leaving the buffer empty."""
+        frames, self.pending = self.pending, []
+        return frames
+
+    def process(self, frames):
+        """
+        Turn frames into readings and run them through the pipeline. Frames
+        with implausible values or unknown vehicles are rejected one by one;
+        if the batch fails, its readings are retried on their own so only
+        the failing ones are rejected.
+        """
+        if not frames:
+            return 0
+        fields = []
+        for frame in frames:
+            try:
+                fields.append(reading_fields(frame))
+            except FrameError as e:
+                logger.warning("Rejected frame: %s", e)
+                self.rejected += 1
+        known = set(Vehicle.objects.filter(pk__in={f['vehicle_id'] for f in fields}).values_list('pk', flat=True))
+        accepted = [f for f in fields if f['vehicle_id'] in known]
+        self.rejected += len(fields) - len(accepted)
+
+        try:
+            readings = self.store(accepted)
+        except Exception:
+            logger.exception("Failed to process %s frame(s), retrying them one by one", len(accepted))
+            readings = []
+            for reading in accepted:
+                try:
+                    readings.extend(self.store([reading]))
+                except Exception:
+                    logger.exception("Failed to process frame of vehicle %s", reading['vehicle_id'])
+                    self.rejected += 1
+
+        duplicates = sum(1 for reading in readings if reading.duplicate_of)
+        self.duplicates += duplicates
+        self.processed += len(readings) - duplicates
+        return len(readings) - duplicates
+
+    def store(self, fields):
+        if not fields:
+            return []
+        # Built afresh for every attempt, a failed one may have left state on them
+        return self.pipeline.process_batch([WeightReading(**reading) for reading in fields])
@@ -0,0 +1,197 @@
+"""
+Server-side reverse geocoding on a spatial grid.
+
+Coordinates are snapped to grid cells 10**-GEOCODING_CONFIG['PRECISION']
+degrees square, and each cell is resolved to a place name once: the name is
+looked up at the cell centre, stored in `GeocodeCell` and kept in an
+in-process LRU. Every alert or penalty in the same cell reuses it, so reports
+need no outbound lookups once `manage.py geocode_locations` has filled in
+the `place_name` of recent alerts and penalties.
+
+Providers are classes with a `name` and a `reverse(latitude, longitude)`
+method returning a place name or None. The one used is configured by dotted
+path in GEOCODING_CONFIG['PROVIDER'].
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.utils.module_loading import import_string
+
+from . import change_log, resource_versions
+from .config import GEOCODING_CONFIG
+from .models import GeocodeCell
+
+logger = logging.getLogger(__name__)
+
+# Cells looked up per query
+LOAD_CHUNK_SIZE = 500
+
+
+class NominatimProvider:
+    """OpenStreetMap Nominatim, at most one request per MIN_INTERVAL as its usage policy asks."""
+    name = 'nominatim'
+
+    def __init__(self):
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = GEOCODING_CONFIG['USER_AGENT']
+        self.lock = threading.Lock()
+        self.last_request = 0.0
+
+    def reverse(self, latitude, longitude):
+        with self.lock:
+            wait = self.last_request + GEOCODING_CONFIG['MIN_INTERVAL'] - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.last_request = time.monotonic()
+            try:
+                response = self.session.get(
+                    GEOCODING_CONFIG['NOMINATIM_URL'],
+                    params={'format': 'json', 'lat': latitude, 'lon': longitude},
+                    timeout=GEOCODING_CONFIG['TIMEOUT']
+                )
+                response.raise_for_status()
+                display_name = response.json().get('display_name')
+            except (requests.RequestException, ValueError) as e:
+                logger.warning("Reverse geocoding failed for %s, %s: %s", latitude, longitude, e)
+                return None
+        if not display_name:
+            return None
+        # The first two parts, e.g. "Morogoro Road, Kibaha"
+        return ', '.join(part.strip() for part in display_name.split(',')[:2])
+
+
+class Geocoder:
+
+    def __init__(self, provider, precision, cache_size):
+        self.provider = provider
+        self.precision = precision
+        self.scale = 10 ** precision
+        self.cache_size = cache_size
+        self.names = OrderedDict()
+        self.lock = threading.Lock()
+
+    def cell(self, latitude, longitude):
+        return math.floor(float(latitude) * self.scale), math.floor(float(longitude) * self.scale)
+
+    def centre(self, cell):
+        return (cell[0] + 0.5) / self.scale, (cell[1] + 0.5) / self.scale
+
+    def place_names(self, points, resolve=True, max_lookups=None):
+        """
+        Map each (latitude, longitude) in `points` to its place name, or None.
+        Cells not known yet are looked up with the provider, unless `resolve`
+        is False, and at most `max_lookups` of them when given.
+        """
+        cells = {point: self.cell(*point) for point in set(points) if None not in point}
+        wanted = set(cells.values())
+
+        names = self.cached(wanted)
+        missing = wanted - names.keys()
+        if missing:
+            names.update(self.load(missing))
+            missing -= names.keys()
+        if missing and resolve:
+            if max_lookups is not None:
+                missing = sorted(missing)[:max_lookups]
+            names.update(self.resolve(missing))
+        return {point: names.get(cells[point]) if point in cells else None for point in points}
+
+    def place_name(self, latitude, longitude, resolve=True):
+        return self.place_names([(latitude, longitude)], resolve)[(latitude, longitude)]
+
+    def cached(self, cells):
+        with self.lock:
+            names = {}
+            for cell in cells:
+                name = self.names.get(cell)
+                if name is not None:
+                    self.names.move_to_end(cell)
+                    names[cell] = name
+            return names
+
+    def remember(self, names):
+        with self.lock:
+            for cell, name in names.items():
+                self.names[cell] = name
+                self.names.move_to_end(cell)
+            while len(self.names) > self.cache_size:
+                self.names.popitem(last=False)
+
+    def load(self, cells):
+        """Names of cells resolved before, from GeocodeCell."""
+        cells = sorted(cells)
+        names = {}
+        for offset in range(0, len(cells), LOAD_CHUNK_SIZE):
+            chunk = cells[offset:offset + LOAD_CHUNK_SIZE]
+            wanted = set(chunk)
+            rows = GeocodeCell.objects.filter(
+                precision=self.precision,
+                lat_index__in={lat for lat, _ in chunk},
+                lon_index__in={lon for _, lon in chunk}
+            ).values_list('lat_index', 'lon_index', 'place_name')
+            names.update(((lat, lon), name) for lat, lon, name in rows if (lat, lon) in wanted)
+        self.remember(names)
+        return names
+
+    def resolve(self, cells):
+        """Look cells up with the provider and store the ones it names."""
+        names = {}
+        for cell in sorted(cells):
+            name = self.provider.reverse(*self.centre(cell))
+            if name:
+                names[cell] = name[:255]
+        GeocodeCell.objects.bulk_create(
+            [GeocodeCell(precision=self.precision, lat_index=lat, lon_index=lon,
+                         place_name=name, provider=self.provider.name)
+             for (lat, lon), name in names.items()],
+            ignore_conflicts=True
+        )
+        self.remember(names)
+        return names
+
+    def clear(self):
+        with self.lock:
+            self.names.clear()
+
+    def fill_place_names(self, queryset, limit):
+        """
+        Set `place_name` on up to `limit` rows of `queryset` that have
+        coordinates but no name yet, newest first. Returns the rows named.
+        """
+        rows = list(queryset.filter(
+            place_name='', latitude__isnull=False, longitude__isnull=False
+        ).order_by('-id').values_list('id', 'latitude', 'longitude')[:limit])
+        names = self.place_names([(float(lat), float(lon)) for _, lat, lon in rows])
+
+        ids_by_name = {}
+        for row_id, lat, lon in rows:
+            name = names[(float(lat), float(lon))]
+            if name:
+                ids_by_name.setdefault(name, []).append(row_id)
+        for name, ids in ids_by_name.items():
+            queryset.model.objects.filter(pk__in=ids).update(place_name=name)
+            change_log.record_for(queryset.model, ids)
+        if ids_by_name:
+            resource_versions.bump_for(queryset.model)
+        return sum(len(ids) for ids in ids_by_name.values())
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def geocoder():
+    """The process-wide geocoder, created with the configured provider on first use."""
+    global _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            _geocoder = Geocoder(
+                import_string(GEOCODING_CONFIG['PROVIDER'])(),
+                GEOCODING_CONFIG['PRECISION'],
+                GEOCODING_CONFIG['CACHE_SIZE']
+            )
+        return _geocoder
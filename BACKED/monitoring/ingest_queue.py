@@ -0,0 +1,181 @@
+"""
+Durable queue for asynchronous reading ingestion.
+
+The API validates readings and stores them as `IngestQueueItem` rows, then
+returns immediately. Ingest workers claim batches with
+`SELECT ... FOR UPDATE SKIP LOCKED` and run them through `ReadingPipeline`.
+Each vehicle is routed to one worker (vehicle id modulo worker count), so
+the readings of a vehicle are always processed in order. A failing batch
+is retried in halves, so one bad reading cannot fail the others, and failed
+readings are retried with exponential backoff until MAX_ATTEMPTS. The later
+readings of a vehicle wait for its failed one: they are sent back to the
+queue and not claimed again until it has been stored or given up on.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, Min, OuterRef
+from django.db.models.functions import Mod
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .config import INGEST_QUEUE_CONFIG
+from .models import IngestQueueItem, Vehicle, WeightReading
+from .pipeline import ReadingPipeline
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(readings):
+    """Queue validated reading data (as produced by the reading serializers)."""
+    now = timezone.now()
+    items = []
+    for data in readings:
+        payload = {}
+        for name, value in data.items():
+            if isinstance(value, Vehicle):
+                value = value.pk
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            payload[name] = value
+        # Readings are stamped on arrival, not when a worker gets to them
+        payload.setdefault('timestamp', now.isoformat())
+        items.append(IngestQueueItem(vehicle_id=payload['vehicle'], payload=payload, enqueued_at=now))
+    return IngestQueueItem.objects.bulk_create(items)
+
+
+def claim_batch(shard=0, shards=1, batch_size=None):
+    """
+    Claim the oldest pending items of one shard for processing, leaving out
+    vehicles with an earlier item still waiting for its retry.
+    """
+    batch_size = batch_size or INGEST_QUEUE_CONFIG['BATCH_SIZE']
+    with transaction.atomic():
+        now = timezone.now()
+        waiting = IngestQueueItem.objects.filter(
+            vehicle_id=OuterRef('vehicle_id'),
+            id__lt=OuterRef('id'),
+            status='pending',
+            next_attempt_at__gt=now
+        )
+        pending = IngestQueueItem.objects.filter(status='pending', next_attempt_at__lte=now).exclude(Exists(waiting))
+        if shards > 1:
+            pending = pending.annotate(shard=Mod('vehicle_id', shards)).filter(shard=shard)
+        items = list(pending.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if items:
+            IngestQueueItem.objects.filter(pk__in=[item.pk for item in items]).update(
+                status='processing',
+                claimed_at=now,
+                attempts=F('attempts') + 1
+            )
+    return items
+
+
+def process_items(items, pipeline=None):
+    """
+    Run claimed items through the reading pipeline and settle them. A batch
+    that fails is split in halves and retried, so only the items that fail
+    on their own use up attempts, and the later items of their vehicles are
+    sent back to wait for them. Returns the number of items processed.
+    """
+    pipeline = pipeline or ReadingPipeline()
+    existing = set(Vehicle.objects.filter(pk__in={item.vehicle_id for item in items}).values_list('pk', flat=True))
+
+    valid = []
+    for item in items:
+        if item.vehicle_id not in existing:
+            fail_items([item], f"Vehicle {item.vehicle_id} does not exist", retry=False)
+            continue
+        try:
+            reading_for(item)
+        except (KeyError, TypeError, ValueError) as e:
+            fail_items([item], f"Invalid payload: {e}", retry=False)
+            continue
+        valid.append(item)
+    return settle(valid, pipeline, blocked=set())
+
+
+def reading_for(item):
+    """A new unsaved reading from a queued payload."""
+    payload = dict(item.payload)
+    payload.pop('vehicle')
+    timestamp = parse_datetime(payload['timestamp'])
+    if timestamp is None:
+        raise ValueError(f"Invalid timestamp {payload['timestamp']!r}")
+    payload['timestamp'] = timestamp
+    return WeightReading(vehicle_id=item.vehicle_id, **payload)
+
+
+def settle(items, pipeline, blocked):
+    """Store items in queue order, adding the vehicles of failed ones to `blocked`."""
+    release_items([item for item in items if item.vehicle_id in blocked])
+    items = [item for item in items if item.vehicle_id not in blocked]
+    if not items:
+        return 0
+    try:
+        with transaction.atomic():
+            # Built afresh on every attempt, a failed one may have left state on them
+            pipeline.process_batch([reading_for(item) for item in items])
+            IngestQueueItem.objects.filter(pk__in=[item.pk for item in items]).delete()
+    except Exception as e:
+        if len(items) == 1:
+            logger.exception("Failed to process queued reading %s", items[0].pk)
+            fail_items(items, str(e))
+            blocked.add(items[0].vehicle_id)
+            return 0
+        logger.warning("Ingest batch of %s failed, retrying it in halves: %s", len(items), e)
+        # Halves in queue order, so the readings of a vehicle stay in order
+        middle = len(items) // 2
+        stored = settle(items[:middle], pipeline, blocked)
+        return stored + settle(items[middle:], pipeline, blocked)
+    return len(items)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, after `attempts` failed ones."""
+    delay = INGEST_QUEUE_CONFIG['RETRY_BASE_DELAY'] * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, INGEST_QUEUE_CONFIG['RETRY_MAX_DELAY']))
+
+
+def fail_items(items, error, retry=True):
+    """Schedule a retry of items, or mark them failed once out of attempts."""
+    now = timezone.now()
+    for item in items:
+        # `attempts` was read before the claim incremented it
+        attempts = item.attempts + 1
+        if retry and attempts < INGEST_QUEUE_CONFIG['MAX_ATTEMPTS']:
+            changes = {'status': 'pending', 'next_attempt_at': now + retry_delay(attempts)}
+        else:
+            changes = {'status': 'failed'}
+        IngestQueueItem.objects.filter(pk=item.pk).update(last_error=error, **changes)
+
+
+def release_items(items):
+    """Send claimed items back to the queue without counting an attempt."""
+    if items:
+        IngestQueueItem.objects.filter(pk__in=[item.pk for item in items]).update(
+            status='pending',
+            attempts=F('attempts') - 1
+        )
+
+
+def release_stale_claims():
+    """Return items claimed by workers that died before settling them."""
+    cutoff = timezone.now() - timedelta(seconds=INGEST_QUEUE_CONFIG['CLAIM_TIMEOUT'])
+    return IngestQueueItem.objects.filter(status='processing', claimed_at__lt=cutoff).update(status='pending')
+
+
+def queue_stats():
+    now = timezone.now()
+    counts = dict(
+        IngestQueueItem.objects.values_list('status').annotate(count=Count('id')).order_by()
+    )
+    oldest = IngestQueueItem.objects.filter(status='pending').aggregate(oldest=Min('enqueued_at'))['oldest']
+    return {
+        'depth': counts.get('pending', 0),
+        'processing': counts.get('processing', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_enqueued_at': oldest,
+        'lag_seconds': (now - oldest).total_seconds() if oldest else 0.0,
+    }
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitoring import archive
+from monitoring.config import ARCHIVE_CONFIG
+
+
+class Command(BaseCommand):
+    help = "Move weight readings older than the hot window into compressed monthly archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ARCHIVE_CONFIG['HOT_DAYS'],
+                            help="Archive readings older than this many days")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        entries = [entry for entry in archive.archive_before(cutoff) if entry is not None]
+        for entry in entries:
+            self.stdout.write(f"{entry.path}: {entry.row_count} reading(s), {entry.size_bytes} bytes")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived readings older than {options['days']} days into {len(entries)} file(s)"
+        ))
@@ -0,0 +1,75 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitoring.models import Vehicle, WeightReading
+from monitoring.pipeline import ReadingPipeline
+
+
+class Command(BaseCommand):
+    help = ("Compare the throughput of the per-reading and the vectorized rule evaluation "
+            "on synthetic readings, without writing to the database")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=100000, help="Readings per run")
+        parser.add_argument('--vehicles', type=int, default=500, help="Vehicles the readings are spread over")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per engine, the best one is reported")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        pipeline = ReadingPipeline()
+        runs = {
+            'per-reading': self.apply_each,
+            'vectorized': pipeline.apply_batch,
+            'decisions only': lambda readings, alerts, penalties: pipeline.evaluate_batch(readings),
+        }
+        results = {}
+        for name, run in runs.items():
+            best = None
+            for _ in range(options['repeat']):
+                readings = self.build_readings(options['readings'], options['vehicles'], options['seed'])
+                alerts, penalties = [], []
+                started = time.perf_counter()
+                run(readings, alerts, penalties)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = best
+            self.stdout.write(f"{name:>14}: {best:.3f}s, {options['readings'] / best:,.0f} readings/s")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Vectorized speedup: {results['per-reading'] / results['vectorized']:.1f}x end to end"
+        ))
+
+    def apply_each(self, readings, alerts, penalties):
+        pipeline = ReadingPipeline()
+        for reading in readings:
+            pipeline.apply_reading(reading.vehicle, reading, alerts, penalties)
+
+    def build_readings(self, count, vehicle_count, seed):
+        """Unsaved readings grouped per vehicle and in timestamp order, as the pipeline hands them over."""
+        rng = random.Random(seed)
+        vehicles = [
+            Vehicle(
+                id=index + 1,
+                vehicle_name=f'Benchmark {index + 1}',
+                max_allowed_weight=rng.choice([8000.0, 12000.0, 20000.0]),
+                is_currently_overloaded=rng.random() < 0.1,
+            )
+            for index in range(vehicle_count)
+        ]
+        start = timezone.now() - timedelta(hours=1)
+        readings = []
+        for index in range(count):
+            vehicle = vehicles[index * vehicle_count // count]
+            readings.append(WeightReading(
+                vehicle=vehicle,
+                weight=vehicle.max_allowed_weight * rng.uniform(0.5, 1.2),
+                latitude=-6.8,
+                longitude=39.28,
+                timestamp=start + timedelta(milliseconds=index),
+                sensor_health='malfunctioning' if rng.random() < 0.01 else 'healthy',
+            ))
+        return readings
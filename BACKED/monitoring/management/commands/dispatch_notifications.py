@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from monitoring import notifications
+from monitoring.config import NOTIFICATION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Send the alert emails waiting in the notification outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=NOTIFICATION_CONFIG['BATCH_SIZE'])
+        parser.add_argument('--poll-interval', type=float, default=NOTIFICATION_CONFIG['POLL_INTERVAL'])
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once no notification is due instead of polling for new ones"
+        )
+
+    def handle(self, *args, **options):
+        released = notifications.release_stale_claims()
+        if released:
+            self.stdout.write(f"Released {released} abandoned notification(s) back to the outbox")
+
+        total = 0
+        try:
+            while True:
+                close_old_connections()
+                claimed, sent = notifications.dispatch(options['batch_size'])
+                total += sent
+                if claimed:
+                    logger.info("Sent %s of %s notification(s)", sent, claimed)
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f"Sent {total} notification(s)"))
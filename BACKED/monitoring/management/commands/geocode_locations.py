@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from monitoring.geocoding import geocoder
+from monitoring.models import Alert, Penalty
+
+
+class Command(BaseCommand):
+    help = "Fill in the place names of alerts and penalties by reverse geocoding their coordinates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=1000,
+                            help="Most recent unnamed alerts and penalties handled, each")
+
+    def handle(self, *args, **options):
+        service = geocoder()
+        for model in (Alert, Penalty):
+            named = service.fill_place_names(model.objects.all(), options['limit'])
+            self.stdout.write(f"Named {named} {model._meta.verbose_name_plural}")
+        self.stdout.write(self.style.SUCCESS("Reverse geocoding done"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring import partitions
+from monitoring.config import PARTITION_CONFIG
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly weight reading partitions and apply the retention policy (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=PARTITION_CONFIG['MONTHS_AHEAD'],
+                            help="Months of partitions to create in advance")
+        parser.add_argument('--retention-months', type=int, default=PARTITION_CONFIG['RETENTION_MONTHS'],
+                            help="Detach partitions whose month ended more than this many months ago")
+        parser.add_argument('--drop', action='store_true', default=PARTITION_CONFIG['DROP_EXPIRED'],
+                            help="Drop expired partitions instead of detaching them")
+
+    def handle(self, *args, **options):
+        if not partitions.is_supported():
+            raise CommandError("Reading partitions are only available on PostgreSQL")
+
+        for name in partitions.ensure_partitions(options['ahead']):
+            self.stdout.write(f"Created partition {name}")
+
+        if options['retention_months'] is not None:
+            action = "Dropped" if options['drop'] else "Detached"
+            for name in partitions.apply_retention(options['retention_months'], drop=options['drop']):
+                self.stdout.write(f"{action} partition {name}")
+
+        self.stdout.write(self.style.SUCCESS("Reading partitions are up to date"))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitoring.config import SYNC_CONFIG
+from monitoring.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = "Delete delta sync changes older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=SYNC_CONFIG['RETENTION_DAYS'])
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = ChangeLog.objects.filter(changed_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change(s) older than {options['days']} days"))
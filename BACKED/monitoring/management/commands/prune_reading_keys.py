@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitoring.config import DEDUP_CONFIG
+from monitoring.models import ReadingDedupKey
+
+
+class Command(BaseCommand):
+    help = "Delete reading deduplication keys older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=DEDUP_CONFIG['KEY_RETENTION_DAYS'])
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted, _ = ReadingDedupKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} reading key(s) older than {options['days']} days"))
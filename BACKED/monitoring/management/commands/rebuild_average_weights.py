@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from monitoring.models import Vehicle, VehicleWeightWindow
+
+
+class Command(BaseCommand):
+    help = "Rebuild the rolling average weight windows from the stored weight readings"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vehicle', type=int, action='append', dest='vehicles',
+            help="Only rebuild this vehicle (by id); may be given more than once"
+        )
+
+    def handle(self, *args, **options):
+        vehicles = Vehicle.objects.all()
+        if options['vehicles']:
+            vehicles = vehicles.filter(pk__in=options['vehicles'])
+
+        rebuilt = 0
+        for vehicle in vehicles.iterator():
+            with transaction.atomic():
+                window = VehicleWeightWindow.rebuild(vehicle)
+                vehicle.average_weight = window.average
+                vehicle.save(update_fields=['average_weight'])
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt average weight for {rebuilt} vehicle(s)"))
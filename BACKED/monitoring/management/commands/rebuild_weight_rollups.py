@@ -0,0 +1,39 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the weight rollups from the stored weight readings and prune expired buckets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild from this date (YYYY-MM-DD)")
+        parser.add_argument(
+            '--vehicle', type=int, action='append', dest='vehicles',
+            help="Only rebuild this vehicle (by id); may be given more than once"
+        )
+        parser.add_argument('--full', action='store_true',
+                            help="Also rebuild periods whose readings were archived or detached, "
+                                 "which empties their rollups")
+        parser.add_argument('--prune-only', action='store_true',
+                            help="Only delete minute and hour buckets past their retention")
+
+    def handle(self, *args, **options):
+        if not options['prune_only']:
+            since = None
+            if options['since']:
+                try:
+                    since = datetime.strptime(options['since'], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+                except ValueError:
+                    raise CommandError("Invalid date format. Use YYYY-MM-DD.")
+            start = None if options['full'] else rollups.hot_start()
+            rollups.rebuild(since=since, vehicle_ids=options['vehicles'], full=options['full'])
+            if start is not None and (since is None or since < start):
+                self.stdout.write(f"Rebuilt weight rollups from {start.date()}, earlier readings were moved out")
+            else:
+                self.stdout.write("Rebuilt weight rollups")
+
+        deleted = rollups.prune()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} expired rollup bucket(s)"))
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from monitoring import fleet_feed
+from monitoring.binary_protocol import FRAME_SIZE, FrameError
+from monitoring.config import GATEWAY_CONFIG
+from monitoring.gateway import ReadingGateway
+
+logger = logging.getLogger(__name__)
+
+
+class DatagramProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, command):
+        self.command = command
+
+    def datagram_received(self, data, addr):
+        gateway = self.command.gateway
+        if len(gateway.pending) >= self.command.max_pending:
+            gateway.rejected += len(data) // FRAME_SIZE
+            return
+        try:
+            gateway.feed(data)
+        except FrameError as e:
+            gateway.rejected += 1
+            logger.warning("Dropped datagram from %s: %s", addr, e)
+            return
+        self.command.schedule_flush(full_only=True)
+
+
+class Command(BaseCommand):
+    help = "Run the binary ingest gateway for low-bandwidth sensors (see monitoring/binary_protocol.py)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=GATEWAY_CONFIG['HOST'])
+        parser.add_argument('--udp-port', type=int, default=GATEWAY_CONFIG['UDP_PORT'])
+        parser.add_argument('--tcp-port', type=int, default=GATEWAY_CONFIG['TCP_PORT'])
+        parser.add_argument('--no-udp', action='store_true', help="Do not listen for UDP datagrams")
+        parser.add_argument('--no-tcp', action='store_true', help="Do not listen for TCP streams")
+        parser.add_argument('--batch-size', type=int, default=GATEWAY_CONFIG['BATCH_SIZE'])
+        parser.add_argument('--flush-interval', type=float, default=GATEWAY_CONFIG['FLUSH_INTERVAL'])
+
+    def handle(self, *args, **options):
+        fleet_feed.warn_if_local(self.stderr)
+        self.gateway = ReadingGateway()
+        self.batch_size = options['batch_size']
+        self.max_pending = GATEWAY_CONFIG['MAX_PENDING']
+        # One database thread keeps batches, and so each vehicle's readings, in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gateway-db')
+        self.flushing = None
+
+        try:
+            asyncio.run(self.serve(options))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.submit(self.process, self.gateway.take()).result()
+            self.executor.shutdown()
+            self.stdout.write(
+                f"Received {self.gateway.received} frame(s), processed {self.gateway.processed}, "
+                f"duplicates {self.gateway.duplicates}, rejected {self.gateway.rejected}"
+            )
+
+    async def serve(self, options):
+        self.loop = asyncio.get_running_loop()
+        servers = []
+        if not options['no_udp']:
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: DatagramProtocol(self),
+                local_addr=(options['host'], options['udp_port'])
+            )
+            servers.append(transport)
+            self.stdout.write(f"Listening for UDP frames on {options['host']}:{options['udp_port']}")
+        if not options['no_tcp']:
+            server = await asyncio.start_server(self.handle_stream, options['host'], options['tcp_port'])
+            servers.append(server)
+            self.stdout.write(f"Listening for TCP frames on {options['host']}:{options['tcp_port']}")
+
+        try:
+            while True:
+                await asyncio.sleep(options['flush_interval'])
+                self.schedule_flush()
+        finally:
+            for server in servers:
+                server.close()
+
+    async def handle_stream(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        remainder = b''
+        try:
+            while chunk := await reader.read(64 * 1024):
+                data = remainder + chunk
+                whole = len(data) - len(data) % FRAME_SIZE
+                self.gateway.feed(memoryview(data)[:whole])
+                remainder = data[whole:]
+                self.schedule_flush(full_only=True)
+                # Stop reading from the socket until the database catches up
+                while len(self.gateway.pending) >= self.max_pending:
+                    self.schedule_flush()
+                    await asyncio.wrap_future(self.flushing)
+        except FrameError as e:
+            logger.warning("Closing stream from %s: %s", peer, e)
+        finally:
+            writer.close()
+
+    def schedule_flush(self, full_only=False):
+        if self.flushing and not self.flushing.done():
+            return
+        if full_only and len(self.gateway.pending) < self.batch_size:
+            return
+        frames = self.gateway.take()
+        if frames:
+            self.flushing = self.executor.submit(self.process, frames)
+
+    def process(self, frames):
+        close_old_connections()
+        for start in range(0, len(frames), self.batch_size):
+            try:
+                self.gateway.process(frames[start:start + self.batch_size])
+            except Exception:
+                logger.exception("Failed to process %s frame(s)", len(frames[start:start + self.batch_size]))
+                self.gateway.rejected += len(frames[start:start + self.batch_size])
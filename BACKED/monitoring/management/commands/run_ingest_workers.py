@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from monitoring import fleet_feed, ingest_queue
+from monitoring.config import INGEST_QUEUE_CONFIG
+from monitoring.pipeline import ReadingPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run a pool of workers that drain the asynchronous reading ingest queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=INGEST_QUEUE_CONFIG['WORKERS'])
+        parser.add_argument('--batch-size', type=int, default=INGEST_QUEUE_CONFIG['BATCH_SIZE'])
+        parser.add_argument('--poll-interval', type=float, default=INGEST_QUEUE_CONFIG['POLL_INTERVAL'])
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty instead of polling for new readings"
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.stop = threading.Event()
+        fleet_feed.warn_if_local(self.stderr)
+
+        released = ingest_queue.release_stale_claims()
+        if released:
+            self.stdout.write(f"Released {released} abandoned reading(s) back to the queue")
+
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(shard, workers, options),
+                name=f"ingest-worker-{shard}",
+                daemon=True
+            )
+            for shard in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Started {workers} ingest worker(s)")
+
+        try:
+            last_report = time.monotonic()
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+                if time.monotonic() - last_report >= 5:
+                    stats = ingest_queue.queue_stats()
+                    logger.info("Ingest queue depth %s, lag %.1fs", stats['depth'], stats['lag_seconds'])
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+        finally:
+            connection.close()
+
+    def work(self, shard, shards, options):
+        pipeline = ReadingPipeline()
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                items = ingest_queue.claim_batch(shard, shards, options['batch_size'])
+                if items:
+                    processed = ingest_queue.process_items(items, pipeline)
+                    logger.debug("Worker %s processed %s reading(s)", shard, processed)
+                elif options['once']:
+                    break
+                else:
+                    self.stop.wait(options['poll_interval'])
+        finally:
+            connection.close()
@@ -0,0 +1,109 @@
+import random
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.binary_protocol import FRAME_SIZE, decode_frames, encode_frame, reading_fields
+from monitoring.config import GATEWAY_CONFIG
+from monitoring.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = (
+        "Send simulated sensor readings to the binary ingest gateway, "
+        "or benchmark frame decoding with --benchmark"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--protocol', choices=['udp', 'tcp'], default='udp')
+        parser.add_argument('--port', type=int, help="Defaults to the gateway port for the protocol")
+        parser.add_argument('--vehicle', type=int, action='append', dest='vehicles',
+                            help="Vehicle id to simulate; defaults to every vehicle")
+        parser.add_argument('--frames', type=int, default=10000, help="Number of readings to send")
+        parser.add_argument('--rate', type=float, default=0,
+                            help="Readings per second, 0 sends as fast as possible")
+        parser.add_argument('--frames-per-packet', type=int, default=32)
+        parser.add_argument('--benchmark', action='store_true',
+                            help="Measure decoding throughput locally instead of sending")
+
+    def handle(self, *args, **options):
+        vehicles = options['vehicles'] or list(Vehicle.objects.values_list('id', flat=True))
+        if not vehicles:
+            raise CommandError("No vehicles to simulate")
+
+        frames = self.generate(vehicles, options['frames'])
+        if options['benchmark']:
+            self.benchmark(frames)
+        else:
+            self.send(frames, options)
+
+    def generate(self, vehicles, count):
+        """Build `count` frames cycling through the vehicles, with a sequence per sensor."""
+        sequences = {}
+        now_ms = int(time.time() * 1000)
+        frames = []
+        for i in range(count):
+            vehicle_id = vehicles[i % len(vehicles)]
+            sequence = sequences[vehicle_id] = sequences.get(vehicle_id, 0) + 1
+            frames.append(encode_frame(
+                vehicle_id=vehicle_id,
+                sensor_id=vehicle_id,
+                sequence=sequence,
+                timestamp_ms=now_ms + i,
+                weight=random.uniform(2000, 30000),
+                latitude=random.uniform(-11.0, -1.0),
+                longitude=random.uniform(29.5, 40.0),
+                malfunctioning=random.random() < 0.01,
+            ))
+        return frames
+
+    def send(self, frames, options):
+        port = options['port'] or GATEWAY_CONFIG['UDP_PORT' if options['protocol'] == 'udp' else 'TCP_PORT']
+        address = (options['host'], port)
+        per_packet = max(1, options['frames_per_packet'])
+        interval = per_packet / options['rate'] if options['rate'] else 0
+
+        if options['protocol'] == 'udp':
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            send = lambda packet: sock.sendto(packet, address)
+        else:
+            sock = socket.create_connection(address)
+            send = sock.sendall
+
+        started = time.perf_counter()
+        sent_bytes = 0
+        try:
+            for start in range(0, len(frames), per_packet):
+                packet = b''.join(frames[start:start + per_packet])
+                send(packet)
+                sent_bytes += len(packet)
+                if interval:
+                    time.sleep(max(0, started + (start + per_packet) / options['rate'] - time.perf_counter()))
+        finally:
+            sock.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {len(frames)} frame(s), {sent_bytes} bytes over {options['protocol'].upper()} "
+            f"in {elapsed:.2f}s ({len(frames) / elapsed:,.0f} frames/s)"
+        ))
+
+    def benchmark(self, frames):
+        data = b''.join(frames)
+
+        started = time.perf_counter()
+        decoded = sum(1 for _ in decode_frames(data))
+        decode_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for frame in decode_frames(data):
+            reading_fields(frame)
+        convert_time = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{decoded} frame(s), {len(data)} bytes ({FRAME_SIZE} bytes per frame)\n"
+            f"Decode:            {decoded / decode_time:,.0f} frames/s\n"
+            f"Decode to fields:  {decoded / convert_time:,.0f} frames/s"
+        )
@@ -0,0 +1,149 @@
+"""
+Static map images for alert emails.
+
+`MapImageService` fetches images from the static map API over a pooled HTTP
+session with strict timeouts, and keeps them in a size-bounded cache on
+disk. Coordinates are rounded to MAP_IMAGE_CONFIG['COORDINATE_PRECISION']
+decimal places before the image is requested, so violations close to each
+other share one cached image. The least recently used images are evicted
+once the cache grows past MAP_IMAGE_CONFIG['CACHE_MAX_BYTES'].
+
+Every failure returns None instead of raising, and the service is left alone
+for MAP_IMAGE_CONFIG['FAILURE_COOLDOWN'] seconds afterwards, so emails go out
+with the map link only while it is unavailable.
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .config import API_KEYS, MAP_CONFIG, MAP_IMAGE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class MapImageService:
+
+    def __init__(self, url_template=None, api_key=None, directory=None, zoom=None, precision=None,
+                 timeout=None, max_image_bytes=None, max_cache_bytes=None, failure_cooldown=None):
+        config = MAP_IMAGE_CONFIG
+        self.url_template = url_template or MAP_CONFIG['TOMTOM_STATIC_MAP_URL']
+        self.api_key = api_key or API_KEYS['TOMTOM_API_KEY']
+        self.directory = directory or os.path.join(settings.BASE_DIR, config['CACHE_DIRECTORY'])
+        self.zoom = zoom if zoom is not None else config['ZOOM']
+        self.precision = precision if precision is not None else config['COORDINATE_PRECISION']
+        self.timeout = timeout or (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.max_image_bytes = max_image_bytes or config['MAX_IMAGE_BYTES']
+        self.max_cache_bytes = max_cache_bytes or config['CACHE_MAX_BYTES']
+        self.failure_cooldown = failure_cooldown if failure_cooldown is not None else config['FAILURE_COOLDOWN']
+        self.failed_at = None
+        self.lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['POOL_SIZE'], max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def key(self, latitude, longitude):
+        """Rounded coordinates the image is requested and cached for."""
+        return round(float(latitude), self.precision), round(float(longitude), self.precision)
+
+    def path(self, latitude, longitude):
+        return os.path.join(self.directory, f'z{self.zoom}_{latitude:.{self.precision}f}_{longitude:.{self.precision}f}.jpg')
+
+    def image(self, latitude, longitude):
+        """JPEG bytes of the map around a location, or None when unavailable."""
+        latitude, longitude = self.key(latitude, longitude)
+        path = self.path(latitude, longitude)
+        try:
+            with open(path, 'rb') as image_file:
+                data = image_file.read()
+            # The modification time orders the cache for eviction
+            os.utime(path)
+            return data
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning("Could not read cached map image %s", path, exc_info=True)
+
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.failure_cooldown:
+            return None
+        data = self.fetch(latitude, longitude)
+        if data is None:
+            self.failed_at = time.monotonic()
+            return None
+        self.failed_at = None
+        self.store(path, data)
+        return data
+
+    def fetch(self, latitude, longitude):
+        url = self.url_template.format(api_key=self.api_key, zoom=self.zoom, latitude=latitude, longitude=longitude)
+        try:
+            with self.session.get(url, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    logger.warning("Map service returned %s for %s, %s", response.status_code, latitude, longitude)
+                    return None
+                if not response.headers.get('Content-Type', '').startswith('image/'):
+                    logger.warning("Map service did not return an image for %s, %s", latitude, longitude)
+                    return None
+                data = b''
+                for chunk in response.iter_content(64 * 1024):
+                    data += chunk
+                    if len(data) > self.max_image_bytes:
+                        logger.warning("Map image for %s, %s is too large", latitude, longitude)
+                        return None
+                return data
+        except requests.RequestException as e:
+            logger.warning("Could not fetch the map image for %s, %s: %s", latitude, longitude, e)
+            return None
+
+    def store(self, path, data):
+        """Write an image atomically and evict the least recently used ones over the size limit."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temporary = f'{path}.{threading.get_ident()}.tmp'
+            with open(temporary, 'wb') as image_file:
+                image_file.write(data)
+            os.replace(temporary, path)
+            with self.lock:
+                self.evict()
+        except OSError:
+            logger.warning("Could not cache map image %s", path, exc_info=True)
+
+    def evict(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.is_file() and entry.name.endswith('.jpg'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def map_service():
+    """The process-wide service, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = MapImageService()
+        return _service
+
+
+def map_image(latitude, longitude):
+    return map_service().image(latitude, longitude)
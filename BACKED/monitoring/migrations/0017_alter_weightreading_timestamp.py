@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0016_alter_penalty_options_alter_penaltyrate_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='weightreading',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0017_alter_weightreading_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleWeightWindow',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='weight_window', serialize=False, to='monitoring.vehicle')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('readings', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+    ]
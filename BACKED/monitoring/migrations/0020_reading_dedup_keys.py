@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0019_ingestqueueitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingDedupKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=150, unique=True)),
+                ('reading_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='weightreading',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='weightreading',
+            name='sequence',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Per-sensor sequence number', null=True),
+        ),
+    ]
@@ -0,0 +1,99 @@
+"""
+Convert monitoring_weightreading into a table partitioned by month on
+"timestamp". PostgreSQL only; other backends keep the plain table.
+
+The new table copies the columns, defaults and CHECK constraints (such as
+the one on "sequence") of the old one. Indexes and the identity are not
+copied, as a unique index on id alone cannot exist on a partitioned table;
+the primary key, foreign key and vehicle index are recreated below, and
+later indexes are created on the partitioned table by their migrations.
+
+The primary key becomes (id, timestamp), as PostgreSQL requires the
+partition key in every unique constraint, so id alone is no longer unique
+in the database. Ids keep coming from a sequence, so they stay unique in
+practice and Django continues to address rows by id; no foreign key points
+at readings (ReadingDedupKey.reading_id is a plain column), which is checked
+by ReadingPartitionsTestCase.
+"""
+from django.db import migrations
+
+from monitoring import partitions
+from monitoring.config import PARTITION_CONFIG
+
+TABLE = partitions.TABLE
+OLD_TABLE = f'{TABLE}_unpartitioned'
+SEQUENCE = f'{TABLE}_partitioned_id_seq'
+
+
+def partition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        if partitions.is_partitioned(cursor):
+            return
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{OLD_TABLE}" INCLUDING ALL EXCLUDING INDEXES EXCLUDING IDENTITY) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{SEQUENCE}"\')')
+        cursor.execute(f'SELECT setval(\'"{SEQUENCE}"\', COALESCE(MAX("id"), 0) + 1, false) FROM "{OLD_TABLE}"')
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_part_pkey" PRIMARY KEY ("id", "timestamp")')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_part_vehicle_id_fk" '
+            f'FOREIGN KEY ("vehicle_id") REFERENCES "monitoring_vehicle" ("id") DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE INDEX "{TABLE}_part_vehicle_id" ON "{TABLE}" ("vehicle_id")')
+        cursor.execute(f'CREATE TABLE "{partitions.DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        # One partition per month that already holds readings, so the copy
+        # below lands in the right partitions rather than the default one
+        cursor.execute(f'SELECT MIN("timestamp"), MAX("timestamp") FROM "{OLD_TABLE}"')
+        first, last = cursor.fetchone()
+        if first is not None:
+            month = partitions.month_start(first)
+            while month <= last:
+                partitions.create_partition(cursor, month)
+                month = partitions.add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{OLD_TABLE}"')
+        cursor.execute(f'DROP TABLE "{OLD_TABLE}"')
+
+    partitions.ensure_partitions(PARTITION_CONFIG['MONTHS_AHEAD'])
+
+
+def unpartition_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        if not partitions.is_partitioned(cursor):
+            return
+
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+        cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY NONE')
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{OLD_TABLE}" INCLUDING ALL EXCLUDING INDEXES)')
+        cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}"."id"')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id")')
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_vehicle_id_fk" '
+            f'FOREIGN KEY ("vehicle_id") REFERENCES "monitoring_vehicle" ("id") DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE INDEX "{TABLE}_vehicle_id" ON "{TABLE}" ("vehicle_id")')
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{OLD_TABLE}"')
+        cursor.execute(f'DROP TABLE "{OLD_TABLE}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0020_reading_dedup_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_table, unpartition_table),
+    ]
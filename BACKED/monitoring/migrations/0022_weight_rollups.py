@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0021_partition_weightreading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetWeightRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('min_weight', models.FloatField(blank=True, null=True)),
+                ('max_weight', models.FloatField(blank=True, null=True)),
+                ('overload_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('resolution', 'bucket_start'), name='unique_fleet_rollup_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VehicleWeightRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('min_weight', models.FloatField(blank=True, null=True)),
+                ('max_weight', models.FloatField(blank=True, null=True)),
+                ('overload_count', models.PositiveIntegerField(default=0)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weight_rollups', to='monitoring.vehicle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vehicle', 'resolution', 'bucket_start'), name='unique_vehicle_rollup_bucket')],
+            },
+        ),
+    ]
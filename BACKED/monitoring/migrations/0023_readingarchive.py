@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0022_weight_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_id', models.BigIntegerField()),
+                ('month', models.DateField(help_text='First day of the archived month')),
+                ('path', models.CharField(help_text='Relative to the archive directory', max_length=255)),
+                ('row_count', models.PositiveIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('size_bytes', models.PositiveBigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['vehicle_id', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('vehicle_id', 'month'), name='unique_reading_archive_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0023_readingarchive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-timestamp'], name='monitoring__timesta_53f01c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['vehicle', 'id'], name='monitoring__vehicle_7398f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['severity', 'timestamp'], name='monitoring__severit_b0171b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['alert_type', 'timestamp'], name='monitoring__alert_t_3d4874_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightreading',
+            index=models.Index(fields=['vehicle', '-timestamp'], name='reading_vehicle_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightreading',
+            index=models.Index(condition=models.Q(('sensor_health', 'healthy'), ('status', 'valid')), fields=['vehicle', '-timestamp'], include=('weight',), name='reading_valid_recent_idx'),
+        ),
+    ]
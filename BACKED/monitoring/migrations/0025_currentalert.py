@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def point_to_latest_alerts(apps, schema_editor):
+    Alert = apps.get_model('monitoring', 'Alert')
+    CurrentAlert = apps.get_model('monitoring', 'CurrentAlert')
+    latest = Alert.objects.values('vehicle').annotate(latest=Max('id')).values_list('vehicle', 'latest')
+    CurrentAlert.objects.bulk_create(
+        (CurrentAlert(vehicle_id=vehicle_id, alert_id=alert_id) for vehicle_id, alert_id in latest.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0024_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentAlert',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='current_alert', serialize=False, to='monitoring.vehicle')),
+                ('alert', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='current_for', to='monitoring.alert')),
+            ],
+        ),
+        migrations.RunPython(point_to_latest_alerts, migrations.RunPython.noop),
+    ]
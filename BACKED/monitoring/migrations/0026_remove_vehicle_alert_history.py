@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:17
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0025_currentalert'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='vehicle',
+            name='alert_history',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0026_remove_vehicle_alert_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='axle_configuration',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='vehicle_class',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.CreateModel(
+            name='ThresholdRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehicle_class', models.CharField(blank=True, default='', max_length=50)),
+                ('axle_configuration', models.CharField(blank=True, default='', max_length=50)),
+                ('overload_tolerance', models.FloatField(default=100, help_text='kg over the max allowed weight before a reading counts as overloaded')),
+                ('warning_margin', models.FloatField(default=0, help_text='Warn above this percentage below the max allowed weight')),
+                ('overload_severity', models.CharField(default='high', max_length=10)),
+                ('warning_severity', models.CharField(default='medium', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='threshold_rules', to='monitoring.vehicle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_active', True), ('vehicle__isnull', False)), fields=('vehicle',), name='unique_active_vehicle_threshold_rule'), models.UniqueConstraint(condition=models.Q(('is_active', True), ('vehicle__isnull', True)), fields=('vehicle_class', 'axle_configuration'), name='unique_active_scoped_threshold_rule')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:29
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0028_alert_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='place_name',
+            field=models.CharField(blank=True, help_text='Filled in by reverse geocoding', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='penalty',
+            name='place_name',
+            field=models.CharField(blank=True, help_text='Place the violation occurred, filled in by reverse geocoding', max_length=255),
+        ),
+        migrations.CreateModel(
+            name='GeocodeCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('lat_index', models.IntegerField()),
+                ('lon_index', models.IntegerField()),
+                ('place_name', models.CharField(max_length=255)),
+                ('provider', models.CharField(max_length=50)),
+                ('resolved_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('precision', 'lat_index', 'lon_index'), name='unique_geocode_cell')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def set_digest_groups(apps, schema_editor):
+    AlertNotification = apps.get_model('monitoring', 'AlertNotification')
+    for notification in AlertNotification.objects.select_related('alert').iterator():
+        notification.severity = notification.alert.severity
+        key = '\n'.join([notification.severity] + sorted(notification.recipients))
+        notification.digest_group = hashlib.sha1(key.encode()).hexdigest()
+        notification.save(update_fields=['severity', 'digest_group'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0029_reverse_geocoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertnotification',
+            name='severity',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='alertnotification',
+            name='digest_group',
+            field=models.CharField(default='', help_text='Hash of the severity and recipients', max_length=40),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_digest_groups, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alertnotification',
+            index=models.Index(fields=['status', 'digest_group'], name='monitoring__status_0f1198_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertnotification',
+            index=models.Index(fields=['alert', 'digest_group'], name='monitoring__alert_i_e2220a_idx'),
+        ),
+    ]
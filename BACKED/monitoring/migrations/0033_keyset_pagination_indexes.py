@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-18 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0032_change_log'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alert',
+            name='monitoring__timesta_53f01c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['-timestamp', '-id'], name='monitoring__timesta_771716_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='penalty',
+            index=models.Index(fields=['-timestamp', '-id'], name='monitoring__timesta_32ae2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weightreading',
+            index=models.Index(fields=['-timestamp', '-id'], name='reading_time_id_idx'),
+        ),
+    ]
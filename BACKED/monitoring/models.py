@@ -1,8 +1,15 @@
 
 
 # Create your models here.
-from django.db import models
+import bisect
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
+
+from .config import ALERT_CONFIG, WEIGHT_READING_CONFIG
 class Vehicle(models.Model):
     vehicle_name = models.CharField(max_length=50, default="Unknown Vehicle")
     vehicle_image = models.ImageField(upload_to='vehicle_images/', null=True, blank=True)
@@ -19,30 +26,315 @@ class Vehicle(models.Model):
     last_reported_location = models.DateTimeField(auto_now=True)
     last_report_generated = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=[('active', 'Active'), ('inactive', 'Inactive')], default='inactive')
-    alert_history = models.JSONField(default=list, blank=True)
     average_weight = models.FloatField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True,null=True)
     is_currently_overloaded = models.BooleanField(
     default=False,
     help_text="Whether the vehicle is currently in an overloaded state"
 )
+    # Select the threshold rules that apply, see ThresholdRule
+    vehicle_class = models.CharField(max_length=50, blank=True, default='')
+    axle_configuration = models.CharField(max_length=50, blank=True, default='')
     def __str__(self):
         return self.vehicle_name
 
 
+class ThresholdRule(models.Model):
+    """
+    Overload and warning thresholds for a vehicle, a vehicle class, an axle
+    configuration, or everything when no scope is set. The most specific
+    active rule wins: vehicle, then class and axle configuration, then class,
+    then axle configuration, then the global rule (see monitoring/thresholds.py).
+    """
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, null=True, blank=True, related_name='threshold_rules')
+    vehicle_class = models.CharField(max_length=50, blank=True, default='')
+    axle_configuration = models.CharField(max_length=50, blank=True, default='')
+    overload_tolerance = models.FloatField(
+        default=ALERT_CONFIG['OVERLOAD_THRESHOLD'],
+        help_text="kg over the max allowed weight before a reading counts as overloaded"
+    )
+    warning_margin = models.FloatField(
+        default=ALERT_CONFIG['WARNING_THRESHOLD'],
+        help_text="Warn above this percentage below the max allowed weight"
+    )
+    overload_severity = models.CharField(max_length=10, default=ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL'])
+    warning_severity = models.CharField(max_length=10, default=ALERT_CONFIG['WARNING_SEVERITY_LEVEL'])
+    is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vehicle'],
+                condition=Q(is_active=True, vehicle__isnull=False),
+                name='unique_active_vehicle_threshold_rule'
+            ),
+            models.UniqueConstraint(
+                fields=['vehicle_class', 'axle_configuration'],
+                condition=Q(is_active=True, vehicle__isnull=True),
+                name='unique_active_scoped_threshold_rule'
+            ),
+        ]
+
+    def __str__(self):
+        if self.vehicle_id:
+            scope = f"vehicle {self.vehicle_id}"
+        else:
+            scope = " / ".join(filter(None, [self.vehicle_class, self.axle_configuration])) or "all vehicles"
+        return f"Thresholds for {scope}: +{self.overload_tolerance} kg"
+
+    def clean(self):
+        if self.vehicle_id and (self.vehicle_class or self.axle_configuration):
+            raise ValidationError("A vehicle rule cannot also be scoped by class or axle configuration.")
+
+    def is_overloaded(self, weight, max_allowed):
+        return weight > max_allowed + self.overload_tolerance
+
+    def is_warning(self, weight, max_allowed):
+        return weight > max_allowed * (1 - self.warning_margin / 100)
+
+
 class WeightReading(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE)
     #  on_delete=models.PROTECT
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     weight = models.FloatField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Defaults to arrival time; buffered uploads may supply the device timestamp
+    timestamp = models.DateTimeField(default=timezone.now)
     sensor_id = models.CharField(max_length=50, null=True, blank=True)  
     status = models.CharField(max_length=20, choices=[('valid', 'Valid'), ('suspected', 'Suspected')], default='valid')
     sensor_health = models.CharField(max_length=50, choices=[('healthy', 'Healthy'), ('malfunctioning', 'Malfunctioning')], default='healthy')
+    # Identify retried uploads, see monitoring/dedup.py
+    sequence = models.PositiveBigIntegerField(null=True, blank=True, help_text="Per-sensor sequence number")
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Readings of a vehicle over a time range (history, archiving)
+            models.Index(fields=['vehicle', '-timestamp'], name='reading_vehicle_time_idx'),
+            # Keyset pagination of the reading list
+            models.Index(fields=['-timestamp', '-id'], name='reading_time_id_idx'),
+            # Recent valid readings behind the average weight, covering the weight
+            models.Index(
+                fields=['vehicle', '-timestamp'],
+                name='reading_valid_recent_idx',
+                condition=Q(status='valid', sensor_health='healthy'),
+                include=['weight']
+            ),
+        ]
 
     def __str__(self):
         return f"Reading for {self.vehicle.vehicle_name} at {self.timestamp}"
+
+    @property
+    def counts_towards_average(self):
+        return self.status == 'valid' and self.sensor_health == 'healthy' and self.weight != 0
+
+
+class ReadingDedupKey(models.Model):
+    """Claimed identity of a stored reading; the unique index rejects retries."""
+    key = models.CharField(max_length=150, unique=True)
+    reading_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+
+class ReadingArchive(models.Model):
+    """
+    Manifest entry for one archive file: the readings of one vehicle in one
+    month that were moved out of the database (see monitoring/archive.py).
+    """
+    # Not a foreign key, archives outlive deleted vehicles
+    vehicle_id = models.BigIntegerField()
+    month = models.DateField(help_text="First day of the archived month")
+    path = models.CharField(max_length=255, help_text="Relative to the archive directory")
+    row_count = models.PositiveIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    size_bytes = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['vehicle_id', 'month']
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle_id', 'month'], name='unique_reading_archive_month'),
+        ]
+
+    def __str__(self):
+        return f"Archived readings of vehicle {self.vehicle_id} for {self.month:%Y-%m} ({self.row_count})"
+
+
+class VehicleWeightWindow(models.Model):
+    """
+    Rolling window of the recent valid readings behind `Vehicle.average_weight`,
+    kept up to date one reading at a time instead of re-querying the history.
+    """
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, primary_key=True, related_name='weight_window')
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0.0)
+    # [epoch seconds, weight] pairs, oldest first
+    readings = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return f"Weight window for {self.vehicle_id} ({self.count} readings)"
+
+    @classmethod
+    def for_vehicles(cls, vehicles, lock=False):
+        """
+        Return windows keyed by vehicle id, rebuilding any that are missing.
+        With `lock`, the stored ones are locked until the transaction ends.
+        """
+        queryset = cls.objects.select_for_update().order_by('pk') if lock else cls.objects
+        windows = queryset.in_bulk([vehicle.pk for vehicle in vehicles])
+        for vehicle in vehicles:
+            if vehicle.pk not in windows:
+                windows[vehicle.pk] = cls.rebuild(vehicle, save=False)
+        return windows
+
+    @classmethod
+    def rebuild(cls, vehicle, save=True):
+        """Recompute the window from `WeightReading` for one vehicle."""
+        window = cls(vehicle=vehicle)
+        window.readings = [[timestamp.timestamp(), weight] for timestamp, weight in reversed(cls.recent_readings(vehicle))]
+        window.count = len(window.readings)
+        window.total = sum(weight for _, weight in window.readings)
+        if save:
+            window.save()
+        return window
+
+    @classmethod
+    def recent_readings(cls, vehicle):
+        """(timestamp, weight) of the newest readings that count towards the average."""
+        return WeightReading.objects.filter(
+            vehicle=vehicle,
+            timestamp__gte=cls.cutoff(),
+            status='valid',
+            sensor_health='healthy'
+        ).exclude(weight=0).order_by('-timestamp').values_list(
+            'timestamp', 'weight'
+        )[:WEIGHT_READING_CONFIG['MAX_READINGS_FOR_AVERAGE']]
+
+    @staticmethod
+    def cutoff(now=None):
+        return (now or timezone.now()) - timedelta(days=WEIGHT_READING_CONFIG['VALID_READING_DAYS'])
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else None
+
+    def expire(self, now=None):
+        """Drop readings that have aged out of the window."""
+        cutoff = self.cutoff(now).timestamp()
+        while self.readings and self.readings[0][0] < cutoff:
+            self.remove_oldest()
+
+    def add(self, timestamp, weight):
+        """Add one reading, evicting the oldest once the window is full."""
+        entry = [timestamp.timestamp(), weight]
+        if entry[0] < self.cutoff().timestamp():
+            return
+        if self.count >= WEIGHT_READING_CONFIG['MAX_READINGS_FOR_AVERAGE'] and entry[0] <= self.readings[0][0]:
+            return
+
+        if not self.readings or entry[0] >= self.readings[-1][0]:
+            self.readings.append(entry)
+        else:
+            # Late reading, keep the window in timestamp order
+            bisect.insort(self.readings, entry)
+        self.count += 1
+        self.total += weight
+
+        while self.count > WEIGHT_READING_CONFIG['MAX_READINGS_FOR_AVERAGE']:
+            self.remove_oldest()
+
+    def remove_oldest(self):
+        _, weight = self.readings.pop(0)
+        self.count -= 1
+        self.total = self.total - weight if self.count else 0.0
+
+
+class IngestQueueItem(models.Model):
+    """A validated reading waiting to be processed by the ingest workers."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('failed', 'Failed'),
+    ]
+
+    vehicle_id = models.BigIntegerField(help_text="Used to route all readings of a vehicle to the same worker")
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    enqueued_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Queued reading #{self.id} for vehicle {self.vehicle_id} ({self.status})"
+
+
+class WeightRollup(models.Model):
+    """
+    Aggregate of the readings in one time bucket. count, total, min_weight and
+    max_weight cover valid readings from healthy sensors (the ones the weight
+    trends are drawn from); overload_count counts every overloaded reading.
+    """
+    RESOLUTION_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+    total = models.FloatField(default=0.0)
+    min_weight = models.FloatField(null=True, blank=True)
+    max_weight = models.FloatField(null=True, blank=True)
+    overload_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class VehicleWeightRollup(WeightRollup):
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='weight_rollups')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'resolution', 'bucket_start'], name='unique_vehicle_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.resolution} rollup at {self.bucket_start}"
+
+
+class FleetWeightRollup(WeightRollup):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['resolution', 'bucket_start'], name='unique_fleet_rollup_bucket'),
+        ]
+
+    def __str__(self):
+        return f"Fleet {self.resolution} rollup at {self.bucket_start}"
+
+
 class Alert(models.Model):
     SEVERITY_CHOICES = [
         ('low', 'Low'),
@@ -64,12 +356,168 @@ class Alert(models.Model):
     location = models.CharField(max_length=255,null=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    place_name = models.CharField(max_length=255, blank=True, help_text="Filled in by reverse geocoding")
     timestamp = models.DateTimeField(auto_now_add=True)
     notified = models.BooleanField(default=False)
     map_url = models.URLField(blank=True, null=True)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Keyset pagination of the alert list
+            models.Index(fields=['-timestamp', '-id']),
+            # Latest alert of each vehicle
+            models.Index(fields=['vehicle', 'id']),
+            # Report counts by severity and type over a date range
+            models.Index(fields=['severity', 'timestamp']),
+            models.Index(fields=['alert_type', 'timestamp']),
+        ]
+
+class CurrentAlert(models.Model):
+    """
+    Pointer to the latest alert of each vehicle, so the alert feed reads one
+    row per vehicle however long the alert history grows. Kept up to date by
+    the reading pipeline and by the Alert signals in monitoring/signals.py.
+    """
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, primary_key=True, related_name='current_alert')
+    alert = models.OneToOneField(Alert, on_delete=models.CASCADE, related_name='current_for')
+
+    def __str__(self):
+        return f"Current alert of vehicle {self.vehicle_id}: #{self.alert_id}"
+
+    @classmethod
+    def point_to(cls, alerts):
+        """
+        Make the newest of `alerts` the current alert of each of their
+        vehicles, by (timestamp, id), unless the vehicle already points at a
+        newer one: a transaction that commits late must not move it back.
+        """
+        latest = {}
+        for alert in alerts:
+            if alert.pk is not None and (alert.vehicle_id not in latest or
+                                         (alert.timestamp, alert.pk) > latest[alert.vehicle_id]):
+                latest[alert.vehicle_id] = (alert.timestamp, alert.pk)
+        with transaction.atomic():
+            current = cls.objects.select_for_update(of=('self',)).filter(vehicle_id__in=latest).order_by('pk')
+            for vehicle_id, timestamp, alert_id in current.values_list('vehicle_id', 'alert__timestamp', 'alert_id'):
+                if (timestamp, alert_id) >= latest[vehicle_id]:
+                    del latest[vehicle_id]
+            cls.objects.bulk_create(
+                [cls(vehicle_id=vehicle_id, alert_id=alert_id) for vehicle_id, (_, alert_id) in sorted(latest.items())],
+                update_conflicts=True,
+                unique_fields=['vehicle'],
+                update_fields=['alert']
+            )
+
+    @classmethod
+    def refresh(cls, vehicle_id):
+        """Point back at the newest remaining alert of a vehicle, e.g. after a delete."""
+        alert_id = Alert.objects.filter(vehicle_id=vehicle_id).order_by('-timestamp', '-id').values_list('id', flat=True).first()
+        if alert_id is None:
+            cls.objects.filter(vehicle_id=vehicle_id).delete()
+        else:
+            cls.objects.update_or_create(vehicle_id=vehicle_id, defaults={'alert_id': alert_id})
+
+
+class GeocodeCell(models.Model):
+    """
+    Place name of one cell of the reverse geocoding grid. Cells are
+    10**-precision degrees square and indexed by floor(coordinate * 10**precision).
+    """
+    precision = models.PositiveSmallIntegerField()
+    lat_index = models.IntegerField()
+    lon_index = models.IntegerField()
+    place_name = models.CharField(max_length=255)
+    provider = models.CharField(max_length=50)
+    resolved_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['precision', 'lat_index', 'lon_index'], name='unique_geocode_cell'),
+        ]
+
+    def __str__(self):
+        return f"{self.place_name} ({self.lat_index}, {self.lon_index} at 1e-{self.precision} degrees)"
+
+
+class ResourceVersion(models.Model):
+    """
+    Change counter of an API resource, incremented by every transaction that
+    changes it. List and detail responses are tagged with it, so unchanged
+    data is answered with 304 without being queried (see
+    monitoring/resource_versions.py).
+    """
+    resource = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.resource} v{self.version}"
+
+
+class ChangeLog(models.Model):
+    """
+    One change to a vehicle, alert or penalty. The id is the cursor of the
+    delta sync endpoint, which reads the log in id order (see
+    monitoring/change_log.py).
+    """
+    RESOURCE_CHOICES = [
+        ('vehicles', 'Vehicles'),
+        ('alerts', 'Alerts'),
+        ('penalties', 'Penalties'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        action = 'Deleted' if self.deleted else 'Changed'
+        return f"#{self.id} {action} {self.resource} {self.object_id}"
+
+
+class AlertNotification(models.Model):
+    """
+    Email about an alert waiting in the outbox. Written in the same
+    transaction as the alert and sent by `manage.py dispatch_notifications`,
+    alone or in a digest (see monitoring/notifications.py).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead'),
+    ]
+
+    alert = models.ForeignKey(Alert, on_delete=models.CASCADE, related_name='notifications')
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    recipients = models.JSONField()
+    attach_map = models.BooleanField(default=False, help_text="Attach a static map of the alert location")
+    # Notifications with the same severity and recipients are sent together
+    severity = models.CharField(max_length=10, blank=True)
+    digest_group = models.CharField(max_length=40, help_text="Hash of the severity and recipients")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['status', 'digest_group']),
+            models.Index(fields=['alert', 'digest_group']),
+        ]
+
+    def __str__(self):
+        return f"Notification #{self.id} for alert {self.alert_id} ({self.status})"
+
 
 class Report(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE)
@@ -138,6 +586,12 @@ class Penalty(models.Model):
         blank=True,
         help_text="GPS longitude where violation occurred"
     )
+
+    place_name = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Place the violation occurred, filled in by reverse geocoding"
+    )
     
     paid_date = models.DateTimeField(
         null=True,
@@ -162,6 +616,8 @@ class Penalty(models.Model):
         indexes = [
             models.Index(fields=['vehicle', 'timestamp']),
             models.Index(fields=['status', 'paid']),
+            # Keyset pagination of the penalty list
+            models.Index(fields=['-timestamp', '-id']),
         ]
 
     def __str__(self):
@@ -199,9 +655,3 @@ class PenaltyRate(models.Model):
 
     def __str__(self):
         return f"Penalty Rate: {self.amount} TZS (from {self.effective_from.date()})"
-
-    def save(self, *args, **kwargs):
-        # Ensure there's only one active rate
-        if not self.pk:
-            self.__class__.objects.all().update(is_active=False)
-        super().save(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Transactional outbox for alert emails.
+
+Code that raises an alert calls `enqueue` in the same transaction, so a
+notification exists if and only if its alert was committed, and no request
+waits on the mail server. `manage.py dispatch_notifications` claims pending
+notifications with `SELECT ... FOR UPDATE SKIP LOCKED` and sends each batch
+over a single SMTP connection. Failed sends are retried with exponential
+backoff; after NOTIFICATION_CONFIG['MAX_ATTEMPTS'] the notification is marked
+dead and left for an operator. `Alert.notified` is only set once an email
+about the alert has actually been handed to the mail server. Map images are
+attached from the cache in `maps`; when there is none the email still goes
+out with the map link only.
+
+Notifications are grouped by severity and recipient list. Each group waits
+for its NOTIFICATION_CONFIG['DIGEST_WINDOWS'] window, counted from its first
+notification, and then goes out as a single summary email. The number of
+emails therefore follows the passing of time, not the number of alerts.
+High severity alerts have no window and are sent right away.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import change_log, maps, resource_versions
+from .config import EMAIL_CONFIG, NOTIFICATION_CONFIG
+from .models import Alert, AlertNotification
+
+logger = logging.getLogger(__name__)
+
+
+def digest_group(severity, recipients):
+    key = '\n'.join([severity] + sorted(recipients))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def digest_window(severity):
+    windows = NOTIFICATION_CONFIG['DIGEST_WINDOWS']
+    return timedelta(seconds=windows.get(severity, max(windows.values(), default=0)))
+
+
+def build_notification(alert, subject, body, recipients=None, attach_map=False, now=None):
+    recipients = list(recipients or EMAIL_CONFIG['AUTHORITY_EMAILS'])
+    now = now or timezone.now()
+    return AlertNotification(
+        alert=alert,
+        subject=subject,
+        body=body,
+        recipients=recipients,
+        attach_map=attach_map,
+        severity=alert.severity,
+        digest_group=digest_group(alert.severity, recipients),
+        created_at=now,
+        next_attempt_at=now + digest_window(alert.severity),
+    )
+
+
+def enqueue(alert, subject, body, recipients=None, attach_map=False):
+    """
+    Queue an email about `alert`, to the authorities unless `recipients` is
+    given. An alert already waiting to be sent to the same recipients is not
+    queued twice; the waiting notification is returned instead.
+    """
+    notification = build_notification(alert, subject, body, recipients, attach_map)
+    waiting = AlertNotification.objects.filter(
+        alert=alert,
+        digest_group=notification.digest_group,
+        status__in=['pending', 'sending']
+    ).first()
+    if waiting is not None:
+        return waiting
+    notification.save()
+    return notification
+
+
+def authority_message(alert):
+    """Subject and body of the standard alert email to the authorities."""
+    vehicle = alert.vehicle
+    return (
+        f"{EMAIL_CONFIG['EMAIL_SUBJECT_PREFIX']}Overload Alert for Vehicle {vehicle.vehicle_id}",
+        f"Alert Type: {alert.alert_type}\n"
+        f"Vehicle: {vehicle.vehicle_name} ({vehicle.vehicle_id})\n"
+        f"Current Weight: {alert.current_weight} kg\n"
+        f"Max Allowed: {vehicle.max_allowed_weight} kg\n"
+        f"Location: {alert.location}\n"
+        f"Time: {alert.timestamp}\n\n"
+        f"Message: {alert.message}"
+    )
+
+
+def enqueue_authority_alert(alert):
+    """Queue the standard alert email to the authorities."""
+    return enqueue(alert, *authority_message(alert))
+
+
+def enqueue_alerts(alerts):
+    """Queue the standard email for new, saved alerts of the automatically notified types."""
+    now = timezone.now()
+    AlertNotification.objects.bulk_create([
+        build_notification(alert, *authority_message(alert), now=now)
+        for alert in alerts
+        if alert.alert_type in NOTIFICATION_CONFIG['AUTO_NOTIFY_ALERT_TYPES']
+    ])
+
+
+def claim_batch(batch_size=None):
+    """
+    Claim the oldest notifications that are due, together with up to
+    DIGEST_MAX_ALERTS more waiting in each of their digest groups, so a
+    digest goes out as soon as the window of its first notification has
+    passed. Notifications backing off after a failed attempt are left to wait.
+    """
+    batch_size = batch_size or NOTIFICATION_CONFIG['BATCH_SIZE']
+    with transaction.atomic():
+        now = timezone.now()
+        pending = AlertNotification.objects.filter(status='pending').select_related('alert').select_for_update(
+            skip_locked=True, of=('self',)
+        )
+        notifications = list(pending.filter(next_attempt_at__lte=now).order_by('next_attempt_at', 'id')[:batch_size])
+        if notifications:
+            claimed = [n.pk for n in notifications]
+            waiting = pending.exclude(pk__in=claimed).exclude(attempts__gt=0, next_attempt_at__gt=now)
+            for group in sorted({n.digest_group for n in notifications}):
+                notifications += waiting.filter(digest_group=group).order_by('id')[
+                    :NOTIFICATION_CONFIG['DIGEST_MAX_ALERTS']
+                ]
+            AlertNotification.objects.filter(pk__in=[n.pk for n in notifications]).update(
+                status='sending',
+                claimed_at=timezone.now(),
+                attempts=F('attempts') + 1
+            )
+    return notifications
+
+
+def build_message(notification, connection):
+    alert = notification.alert
+    message = EmailMessage(
+        notification.subject,
+        notification.body,
+        EMAIL_CONFIG['DEFAULT_FROM_EMAIL'],
+        notification.recipients,
+        connection=connection,
+    )
+    if notification.attach_map and alert.latitude is not None and alert.longitude is not None:
+        map_image = maps.map_image(alert.latitude, alert.longitude)
+        if map_image:
+            message.attach('map_image.jpg', map_image, 'image/jpeg')
+    return message
+
+
+def build_digest(notifications, connection):
+    """One email summarising the alerts of notifications from the same digest group."""
+    first, last = notifications[0].alert.timestamp, notifications[-1].alert.timestamp
+    sections = [f"{n.subject}\n{n.body}" for n in notifications]
+    return EmailMessage(
+        f"{EMAIL_CONFIG['EMAIL_SUBJECT_PREFIX']}{len(notifications)} {notifications[0].severity} severity alerts",
+        f"{len(notifications)} alerts were raised between {first} and {last}.\n\n" +
+        "\n\n----------------------------------------\n\n".join(sections),
+        EMAIL_CONFIG['DEFAULT_FROM_EMAIL'],
+        notifications[0].recipients,
+        connection=connection,
+    )
+
+
+def messages(notifications, connection):
+    """
+    Pair the emails to send with the notifications each one settles. Each
+    digest group becomes one email, or a few when it has more than
+    DIGEST_MAX_ALERTS alerts; an alert queued more than once appears once.
+    """
+    groups = {}
+    for notification in notifications:
+        groups.setdefault(notification.digest_group, {}).setdefault(notification.alert_id, []).append(notification)
+
+    size = NOTIFICATION_CONFIG['DIGEST_MAX_ALERTS']
+    for by_alert in groups.values():
+        alerts = list(by_alert.values())
+        for offset in range(0, len(alerts), size):
+            chunk = alerts[offset:offset + size]
+            covered = [n for same_alert in chunk for n in same_alert]
+            if len(chunk) == 1:
+                yield covered, lambda first=chunk[0][0]: build_message(first, connection)
+            else:
+                firsts = sorted((same_alert[0] for same_alert in chunk), key=lambda n: (n.alert.timestamp, n.alert_id))
+                yield covered, lambda firsts=firsts: build_digest(firsts, connection)
+
+
+def send_batch(notifications):
+    """
+    Send claimed notifications over one SMTP connection and settle them.
+    Emails go through the open connection one at a time, so a rejected
+    email only fails the notifications it covers. Returns the number of
+    notifications sent.
+    """
+    if not notifications:
+        return 0
+    connection = get_connection(fail_silently=False)
+    sent = []
+    try:
+        connection.open()
+    except Exception as e:
+        logger.exception("Could not connect to the mail server")
+        fail(notifications, str(e))
+        return 0
+
+    try:
+        for covered, build in messages(notifications, connection):
+            try:
+                connection.send_messages([build()])
+            except Exception as e:
+                logger.warning("Failed to send notification(s) %s: %s", [n.pk for n in covered], e)
+                fail(covered, str(e))
+            else:
+                sent.extend(covered)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            logger.warning("Error closing the mail server connection", exc_info=True)
+
+    if sent:
+        with transaction.atomic():
+            AlertNotification.objects.filter(pk__in=[n.pk for n in sent]).update(
+                status='sent',
+                sent_at=timezone.now(),
+                last_error=''
+            )
+            alert_ids = {n.alert_id for n in sent}
+            Alert.objects.filter(pk__in=alert_ids).update(notified=True)
+            resource_versions.bump('alerts')
+            change_log.record('alerts', sorted(alert_ids))
+    return len(sent)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt, after `attempts` failed ones."""
+    delay = NOTIFICATION_CONFIG['RETRY_BASE_DELAY'] * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, NOTIFICATION_CONFIG['RETRY_MAX_DELAY']))
+
+
+def fail(notifications, error):
+    """Schedule a retry, or dead-letter notifications that are out of attempts."""
+    now = timezone.now()
+    for notification in notifications:
+        # `attempts` was read before the claim incremented it
+        attempts = notification.attempts + 1
+        if attempts < NOTIFICATION_CONFIG['MAX_ATTEMPTS']:
+            changes = {'status': 'pending', 'next_attempt_at': now + retry_delay(attempts)}
+        else:
+            changes = {'status': 'dead'}
+        AlertNotification.objects.filter(pk=notification.pk).update(last_error=error, **changes)
+
+
+def release_stale_claims():
+    """Return notifications claimed by dispatchers that died before settling them."""
+    cutoff = timezone.now() - timedelta(seconds=NOTIFICATION_CONFIG['CLAIM_TIMEOUT'])
+    return AlertNotification.objects.filter(status='sending', claimed_at__lt=cutoff).update(status='pending')
+
+
+def dispatch(batch_size=None):
+    """Claim and send one batch. Returns (claimed, sent)."""
+    notifications = claim_batch(batch_size)
+    return len(notifications), send_batch(notifications)
@@ -0,0 +1,110 @@
+"""
+Keyset pagination on (timestamp, id), newest first.
+
+A page is found by seeking the (timestamp, id) index to the row after the
+last one of the page before, instead of counting past OFFSET rows, so the
+thousandth page costs the same as the first. The cursor in the `next` and
+`previous` links carries that position. Clients pick `page_size` up to
+PAGINATION_CONFIG['MAX_PAGE_SIZE'], and `count=false` skips the COUNT(*) of
+the whole list.
+"""
+from base64 import b64decode, b64encode
+from collections import namedtuple
+from urllib import parse
+
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .config import PAGINATION_CONFIG
+
+Cursor = namedtuple('Cursor', ['timestamp', 'id', 'reverse'])
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+    # Read for the cursors, whatever fields the response has
+    required_fields = ('id', 'timestamp')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        self.count = queryset.count() if self.wants_count(request) else None
+
+        if cursor is None:
+            queryset = queryset.order_by('-timestamp', '-id')
+        elif not cursor.reverse:
+            queryset = queryset.filter(timestamp__lte=cursor.timestamp).exclude(
+                timestamp=cursor.timestamp, id__gte=cursor.id
+            ).order_by('-timestamp', '-id')
+        else:
+            queryset = queryset.filter(timestamp__gte=cursor.timestamp).exclude(
+                timestamp=cursor.timestamp, id__lte=cursor.id
+            ).order_by('timestamp', 'id')
+
+        # One row more tells whether the list goes on
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if cursor is not None and cursor.reverse:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, cursor is not None
+
+        self.next_link = self.encode_cursor(rows[-1], reverse=False) if has_next and rows else None
+        self.previous_link = self.encode_cursor(rows[0], reverse=True) if has_previous and rows else None
+        if not rows and cursor is not None and cursor.reverse:
+            # Paged back past the start
+            self.next_link = remove_query_param(self.base_url, self.cursor_query_param)
+        return rows
+
+    def get_paginated_response(self, data):
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload.update(next=self.next_link, previous=self.previous_link, results=data)
+        return Response(payload)
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=PAGINATION_CONFIG['MAX_PAGE_SIZE']
+            )
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'))
+            timestamp = parse_datetime(tokens['t'][0])
+            row_id = int(tokens['i'][0])
+            reverse = tokens.get('r', ['0'])[0] == '1'
+        except (KeyError, TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(timestamp, row_id, reverse)
+
+    def encode_cursor(self, row, reverse):
+        tokens = {'t': row.timestamp.isoformat(), 'i': row.pk}
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
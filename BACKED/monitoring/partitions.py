@@ -0,0 +1,135 @@
+"""
+Monthly range partitions for `monitoring_weightreading` on PostgreSQL.
+
+Migration 0021 turns the table into a table partitioned by RANGE
+("timestamp") with one partition per calendar month (UTC), named
+monitoring_weightreading_pYYYYMM, plus a default partition that catches
+anything outside the pre-created months. `manage.py manage_reading_partitions`
+creates upcoming partitions ahead of time and applies the retention policy
+by detaching or dropping whole partitions instead of deleting rows.
+
+Other database backends keep the plain table and these helpers do nothing.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+TABLE = 'monitoring_weightreading'
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def month_start(value):
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month.year:04d}{month.month:02d}'
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+        [TABLE]
+    )
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor):
+    """Return the start of the month covered by every monthly partition, oldest first."""
+    cursor.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+        """,
+        [TABLE]
+    )
+    months = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(datetime(int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc))
+    return sorted(months)
+
+
+def oldest_partition():
+    """Start of the oldest month still attached, or None when the table is not partitioned."""
+    if not is_supported():
+        return None
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return None
+        months = list_partitions(cursor)
+    return months[0] if months else None
+
+
+def create_partition(cursor, month):
+    """
+    Create the partition for `month`, moving any rows for that month out of
+    the default partition first so the partition can be attached. It needs
+    the CHECK constraints of the parent to be attached.
+    """
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    with transaction.atomic():
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'''
+            WITH moved AS (
+                DELETE FROM "{DEFAULT_PARTITION}"
+                WHERE "timestamp" >= %s AND "timestamp" < %s
+                RETURNING *
+            )
+            INSERT INTO "{name}" SELECT * FROM moved
+            ''',
+            [start, end]
+        )
+        cursor.execute(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+            [start, end]
+        )
+
+
+def ensure_partitions(months_ahead, now=None):
+    """Create any missing partitions from the current month to `months_ahead` months out."""
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    with connection.cursor() as cursor:
+        existing = set(list_partitions(cursor))
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def apply_retention(retention_months, drop=False, now=None):
+    """
+    Detach (or drop) partitions whose whole month is older than the
+    retention period. Detached partitions are left as ordinary tables.
+    """
+    cutoff = add_months(month_start(now or datetime.now(dt_timezone.utc)), -retention_months)
+    removed = []
+    with connection.cursor() as cursor:
+        for month in list_partitions(cursor):
+            if add_months(month, 1) > cutoff:
+                break
+            name = partition_name(month)
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            if drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+            removed.append(name)
+    return removed
@@ -0,0 +1,53 @@
+"""
+In-process cache of the penalty rate history.
+
+Every `PenaltyRate` is kept in memory sorted by `effective_from`, so the rate
+in force at any moment is found by binary search without a query, and
+backfilled or delayed readings are charged the rate of their own timestamp.
+Saving or deleting a rate clears the cache of this process, and again when
+the change commits (see monitoring/signals.py); other processes pick it up
+when their copy expires after PENALTY_RATE_CONFIG['CACHE_SECONDS'].
+"""
+import bisect
+import threading
+import time
+
+from .config import PENALTY_RATE_CONFIG
+from .models import PenaltyRate
+
+
+class RateHistory:
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.rates = None
+        self.starts = []
+        self.loaded_at = 0.0
+
+    def load(self):
+        with self.lock:
+            if self.rates is None or time.monotonic() - self.loaded_at > self.max_age:
+                rates = list(PenaltyRate.objects.order_by('effective_from', 'id'))
+                self.starts = [rate.effective_from for rate in rates]
+                self.rates = rates
+                self.loaded_at = time.monotonic()
+            return self.rates, self.starts
+
+    def rate_at(self, timestamp):
+        """
+        The rate in force at `timestamp`, or None when no rate is configured.
+        Timestamps before the first rate get the first rate.
+        """
+        rates, starts = self.load()
+        if not rates:
+            return None
+        index = bisect.bisect_right(starts, timestamp) - 1
+        return rates[max(index, 0)]
+
+    def invalidate(self):
+        with self.lock:
+            self.rates = None
+
+
+rate_history = RateHistory(PENALTY_RATE_CONFIG['CACHE_SECONDS'])
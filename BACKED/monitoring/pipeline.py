@@ -0,0 +1,343 @@
+"""
+Processing of incoming weight readings.
+
+Every reading goes through the same steps: the new vehicle state, alerts,
+penalty and reading status are worked out in memory from the vehicle and
+window rows, locked so concurrent batches for a vehicle queue up, then
+persisted in one transaction with a single UPDATE per vehicle and bulk
+inserts for the rest, and added to the weight rollups. Alerts the
+authorities are emailed about go into the notification outbox in the same
+transaction, and the new vehicle states are pushed to dashboards once it
+commits (see `fleet_feed`).
+Batches are grouped per vehicle and replayed in timestamp order, so they come
+out the same as if every reading had been posted on its own. Retried readings
+are recognised by their key (see `dedup`) and have no effect. Large batches
+have their rules evaluated with NumPy (see `vectorized`), which reaches the
+same decisions as the per-reading path.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction, IntegrityError
+
+from .config import ALERT_CONFIG, INGEST_CONFIG, MAP_CONFIG
+from . import change_log, fleet_feed, notifications, resource_versions, rollups, vectorized
+from .dedup import reading_key, recent_keys
+from .penalty_rates import rate_history
+from .thresholds import threshold_rules
+from .models import Vehicle, WeightReading, ReadingDedupKey, VehicleWeightWindow, Alert, CurrentAlert, Penalty
+
+logger = logging.getLogger(__name__)
+
+# Vehicle columns written by the pipeline, everything else is left alone
+VEHICLE_STATE_FIELDS = [
+    'current_weight',
+    'last_reported_weight',
+    'latitude',
+    'longitude',
+    'last_reported_location',
+    'is_currently_overloaded',
+    'weight_alert',
+    'status',
+    'average_weight',
+]
+
+
+class ReadingPipeline:
+
+    def process(self, reading):
+        """Insert a single unsaved reading and apply its effects."""
+        return self.process_batch([reading])[0]
+
+    def process_batch(self, readings):
+        """
+        Insert unsaved `WeightReading` instances and apply their effects.
+        Returns the readings, which have their primary keys and final
+        status set once the batch is committed. Duplicates of readings
+        already stored are skipped and get `duplicate_of` set to the id of
+        the original instead.
+        """
+        repeats = self.drop_known_duplicates(readings)
+        repeated = {id(reading) for reading, _ in repeats}
+        new_readings = [r for r in readings if id(r) not in repeated]
+
+        with transaction.atomic():
+            keys = self.store_claimed(new_readings)
+
+        transaction.on_commit(lambda: recent_keys.add_many((key.key, key.reading_id) for key in keys))
+        for reading, original in repeats:
+            reading.duplicate_of = original.pk if original.duplicate_of is None else original.duplicate_of
+        return readings
+
+    def drop_known_duplicates(self, readings):
+        """
+        Mark readings already seen by this process, without any query. Returns
+        the repeats within the batch as (repeat, first occurrence) pairs.
+        """
+        first_seen = {}
+        repeats = []
+        for reading in readings:
+            reading.duplicate_of = None
+            reading.dedup_key = key = reading_key(reading)
+            if key is None:
+                continue
+            if key in first_seen:
+                repeats.append((reading, first_seen[key]))
+            else:
+                first_seen[key] = reading
+                reading.duplicate_of = recent_keys.get(key)
+        return repeats
+
+    def store_claimed(self, readings):
+        """
+        Store the new readings and insert their keys, once the readings have
+        their ids, relying on the unique index to catch retries this process
+        has not seen. On a conflict the savepoint is rolled back, the
+        duplicates found are marked and the rest of the batch is stored again.
+        Returns the inserted keys.
+        """
+        while True:
+            new_readings = [r for r in readings if r.duplicate_of is None]
+            keyed = {r.dedup_key: r for r in new_readings if r.dedup_key}
+            if not keyed:
+                if new_readings:
+                    self.store(new_readings)
+                return []
+            try:
+                with transaction.atomic():
+                    self.store(new_readings)
+                    keys = [ReadingDedupKey(key=key, reading_id=reading.pk) for key, reading in keyed.items()]
+                    ReadingDedupKey.objects.bulk_create(keys)
+                return keys
+            except IntegrityError:
+                for reading in new_readings:
+                    reading.pk = None
+                    reading._state.adding = True
+                stored = dict(ReadingDedupKey.objects.filter(key__in=keyed).values_list('key', 'reading_id'))
+                if not stored:
+                    raise
+                for key, reading_id in stored.items():
+                    keyed[key].duplicate_of = reading_id
+
+    def store(self, readings):
+        """Work out the effects of new readings in memory and persist them."""
+        vehicles = self.load_vehicles(readings)
+        windows = VehicleWeightWindow.for_vehicles(vehicles.values(), lock=True)
+        alerts = []
+        penalties = []
+
+        by_vehicle = defaultdict(list)
+        for reading in readings:
+            by_vehicle[reading.vehicle_id].append(reading)
+
+        ordered = []
+        for vehicle_id, vehicle_readings in by_vehicle.items():
+            vehicle = vehicles[vehicle_id]
+            for reading in sorted(vehicle_readings, key=lambda r: r.timestamp):
+                reading.vehicle = vehicle
+                ordered.append(reading)
+
+        if len(ordered) >= INGEST_CONFIG['VECTORIZE_MIN_BATCH']:
+            self.apply_batch(ordered, alerts, penalties)
+        else:
+            for reading in ordered:
+                self.apply_reading(reading.vehicle, reading, alerts, penalties)
+
+        for window in windows.values():
+            window.expire()
+        for reading in ordered:
+            if reading.counts_towards_average:
+                windows[reading.vehicle_id].add(reading.timestamp, reading.weight)
+        for vehicle_id, vehicle in vehicles.items():
+            vehicle.average_weight = windows[vehicle_id].average
+
+        WeightReading.objects.bulk_create(readings)
+        rollups.add_readings(readings)
+        Penalty.objects.bulk_create(penalties)
+        Alert.objects.bulk_create(alerts)
+        CurrentAlert.point_to(alerts)
+        notifications.enqueue_alerts(alerts)
+
+        self.save_windows(windows.values())
+
+        # Logged last, in one insert for the delta sync and one counter
+        # increment per resource, so the counter rows are locked briefly
+        with resource_versions.collect(), change_log.collect():
+            for vehicle in vehicles.values():
+                vehicle.save(update_fields=VEHICLE_STATE_FIELDS)
+            if alerts:
+                resource_versions.bump('alerts')
+            change_log.record('alerts', [alert.pk for alert in alerts])
+            change_log.record('penalties', [penalty.pk for penalty in penalties])
+
+        # Worked out now, pushed to dashboards once committed
+        fleet_changes = fleet_feed.changes(vehicles.values(), alerts)
+        transaction.on_commit(lambda: fleet_feed.publish(fleet_changes))
+
+    def load_vehicles(self, readings):
+        """
+        Map vehicle id to vehicle, locked until the batch commits. Always
+        fetched, an instance cached on a reading may predate another batch.
+        Locked in primary key order so concurrent batches cannot deadlock.
+        """
+        return Vehicle.objects.select_for_update().order_by('pk').in_bulk({r.vehicle_id for r in readings})
+
+    def penalty_rate_at(self, timestamp):
+        rate = rate_history.rate_at(timestamp)
+        if rate is None:
+            logger.error("Failed to create penalty: no penalty rate configured")
+        return rate
+
+    def apply_reading(self, vehicle, reading, alerts, penalties):
+        """Update `vehicle` in memory and collect the alerts and penalty for one reading."""
+        was_overloaded = vehicle.is_currently_overloaded
+        max_allowed = vehicle.max_allowed_weight
+        rule = threshold_rules.rule_for(vehicle)
+        overloaded = rule.is_overloaded(reading.weight, max_allowed)
+        weight_alert = (
+            overloaded or
+            reading.status == 'suspected' or
+            reading.sensor_health == 'malfunctioning'
+        )
+
+        if reading.sensor_health == 'malfunctioning':
+            alert_type, severity = 'sensor_malfunction', ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL']
+        elif overloaded:
+            alert_type, severity = 'overload', rule.overload_severity
+        elif rule.is_warning(reading.weight, max_allowed):
+            alert_type, severity = 'weight_warning', rule.warning_severity
+        else:
+            alert_type, severity = None, None
+
+        self.update_vehicle(vehicle, reading, overloaded, weight_alert)
+        self.record(reading, overloaded, not was_overloaded and overloaded,
+                    overloaded or reading.sensor_health == 'malfunctioning',
+                    alert_type, severity, alerts, penalties)
+
+    def apply_batch(self, readings, alerts, penalties):
+        """
+        Same as calling `apply_reading` for each reading, with the decisions
+        made for the whole batch at once by `vectorized.evaluate`. Readings
+        must be grouped per vehicle and in timestamp order.
+        """
+        decisions, first_of_vehicle = self.evaluate_batch(readings)
+
+        overloaded = decisions.overloaded.tolist()
+        penalty = decisions.penalty.tolist()
+        suspected = decisions.suspected.tolist()
+        weight_alert = decisions.weight_alert.tolist()
+        alert_types = [vectorized.ALERT_TYPES[code] for code in decisions.alert.tolist()]
+        severities = decisions.severity.tolist()
+
+        # Only the last reading of each vehicle decides its final state
+        last_of_vehicle = first_of_vehicle[1:] + [True]
+        for index, reading in enumerate(readings):
+            self.record(reading, overloaded[index], penalty[index], suspected[index],
+                        alert_types[index], severities[index], alerts, penalties)
+            if last_of_vehicle[index]:
+                self.update_vehicle(reading.vehicle, reading, overloaded[index], weight_alert[index])
+
+    def evaluate_batch(self, readings):
+        """Decisions for readings grouped per vehicle, and which reading starts each vehicle."""
+        vehicles = [reading.vehicle for reading in readings]
+        rules = {}
+        for vehicle in vehicles:
+            if vehicle.pk not in rules:
+                rules[vehicle.pk] = threshold_rules.rule_for(vehicle)
+        reading_rules = [rules[vehicle.pk] for vehicle in vehicles]
+
+        first_of_vehicle = [True] + [
+            current.pk != previous.pk for previous, current in zip(vehicles, vehicles[1:])
+        ]
+        decisions = vectorized.evaluate(
+            weights=[reading.weight for reading in readings],
+            max_allowed=[vehicle.max_allowed_weight for vehicle in vehicles],
+            overload_tolerances=[rule.overload_tolerance for rule in reading_rules],
+            warning_margins=[rule.warning_margin for rule in reading_rules],
+            malfunctioning=[reading.sensor_health == 'malfunctioning' for reading in readings],
+            reported_suspected=[reading.status == 'suspected' for reading in readings],
+            was_overloaded=[vehicle.is_currently_overloaded for vehicle in vehicles],
+            first_of_vehicle=first_of_vehicle,
+            overload_severities=[rule.overload_severity for rule in reading_rules],
+            warning_severities=[rule.warning_severity for rule in reading_rules],
+            malfunction_severity=ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL'],
+        )
+        return decisions, first_of_vehicle
+
+    def update_vehicle(self, vehicle, reading, overloaded, weight_alert):
+        vehicle.current_weight = reading.weight
+        vehicle.last_reported_weight = reading.weight
+        vehicle.latitude = reading.latitude
+        vehicle.longitude = reading.longitude
+        vehicle.is_currently_overloaded = overloaded
+        vehicle.weight_alert = weight_alert
+        vehicle.status = 'active'
+
+    def record(self, reading, overloaded, penalty, suspected, alert_type, severity, alerts, penalties):
+        """Set the status of a reading and collect its penalty and alerts."""
+        vehicle = reading.vehicle
+        max_allowed = vehicle.max_allowed_weight
+        reading.overloaded = overloaded
+        reading.status = 'suspected' if suspected else 'valid'
+
+        # A penalty is issued on the transition from normal to overloaded, at
+        # the rate in force when the reading was taken
+        rate = self.penalty_rate_at(reading.timestamp) if penalty else None
+        if rate is not None:
+            penalties.append(Penalty(
+                vehicle=vehicle,
+                overload_amount=reading.weight - max_allowed,
+                amount=rate.amount,
+                timestamp=reading.timestamp,
+                latitude=reading.latitude,
+                longitude=reading.longitude,
+                paid=False
+            ))
+            alerts.append(self.build_alert(
+                reading,
+                'penalty_issued',
+                f"New penalty issued: {rate.amount:,} TZS for overload violation. "
+                f"Current weight: {reading.weight:,} kg "
+                f"(Max allowed: {max_allowed:,} kg) "
+                f"for {vehicle.vehicle_name}"
+            ))
+
+        if alert_type == 'sensor_malfunction':
+            message = (f"Sensor malfunction detected for {vehicle.vehicle_name}. "
+                       f"Reported weight: {reading.weight} kg")
+        elif alert_type == 'overload':
+            message = (f"Suspected overload: {reading.weight} kg "
+                       f"(Max allowed: {max_allowed} kg) "
+                       f"for {vehicle.vehicle_name}")
+        elif alert_type == 'weight_warning':
+            message = (f"Vehicle approaching max weight: {reading.weight} kg "
+                       f"(Max allowed: {max_allowed} kg) "
+                       f"for {vehicle.vehicle_name}")
+        else:
+            return
+        alerts.append(self.build_alert(reading, alert_type, message, severity=severity))
+
+    def build_alert(self, reading, alert_type, message, severity=ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL']):
+        return Alert(
+            vehicle=reading.vehicle,
+            message=message,
+            alert_type=alert_type,
+            severity=severity,
+            latitude=reading.latitude,
+            longitude=reading.longitude,
+            current_weight=reading.weight,
+            location=f"Latitude: {reading.latitude}, Longitude: {reading.longitude}",
+            map_url=MAP_CONFIG['GOOGLE_MAPS_URL_FORMAT'].format(
+                latitude=reading.latitude,
+                longitude=reading.longitude
+            )
+        )
+
+    def save_windows(self, windows):
+        windows = list(windows)
+        VehicleWeightWindow.objects.bulk_create(
+            windows,
+            update_conflicts=True,
+            unique_fields=['vehicle'],
+            update_fields=['count', 'total', 'readings']
+        )
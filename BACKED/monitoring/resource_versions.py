@@ -0,0 +1,73 @@
+"""
+Change counters for conditional GET on the vehicle and alert endpoints.
+
+Every transaction that changes a resource increments its `ResourceVersion`
+row in the same transaction: from the model signals in monitoring/signals.py,
+and explicitly wherever rows are written in bulk without signals. The
+reading pipeline collects its increments into one UPDATE per resource at the
+end of its transaction, which keeps the row lock short. Views build their
+ETag and Last-Modified from the counters alone, so a client whose copy is
+current gets 304 for the price of one primary key lookup, and a counter
+never lags behind the data it describes.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Alert, ResourceVersion, Vehicle
+
+RESOURCE_MODELS = {
+    'vehicles': Vehicle,
+    'alerts': Alert,
+}
+
+_local = threading.local()
+
+
+def increment(resource):
+    updated = ResourceVersion.objects.filter(resource=resource).update(
+        version=F('version') + 1, changed_at=timezone.now()
+    )
+    if not updated:
+        ResourceVersion.objects.get_or_create(resource=resource, defaults={'version': 1})
+
+
+def bump(*resources):
+    """Count a change to `resources` in the current transaction."""
+    pending = getattr(_local, 'pending', None)
+    if pending is not None:
+        pending.update(resources)
+        return
+    for resource in sorted(set(resources)):
+        increment(resource)
+
+
+def bump_for(model):
+    """Bump the resource served from `model`, if it has one."""
+    bump(*[resource for resource, resource_model in RESOURCE_MODELS.items() if resource_model is model])
+
+
+@contextmanager
+def collect():
+    """Count the changes bumped inside the block once per resource when it ends."""
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    pending = _local.pending = set()
+    try:
+        yield
+    finally:
+        _local.pending = None
+    # In a fixed order, so concurrent transactions lock the rows alike
+    for resource in sorted(pending):
+        increment(resource)
+
+
+def current(resources):
+    """The `ResourceVersion` of each of `resources`, by name."""
+    versions = ResourceVersion.objects.in_bulk(resources)
+    for resource in set(resources) - versions.keys():
+        versions[resource], _ = ResourceVersion.objects.get_or_create(resource=resource)
+    return versions
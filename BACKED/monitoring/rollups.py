@@ -0,0 +1,243 @@
+"""
+Weight rollups per vehicle and for the whole fleet, at minute, hour and day
+resolution (see `WeightRollup`).
+
+The pipeline adds every stored batch to the rollups in the same transaction
+with `add_readings`: the batch is summarised in memory and each touched
+bucket is incremented by a single upsert, so trend charts and reports read a
+few rollup rows instead of scanning readings. `rebuild` recomputes the
+rollups from the raw readings still in the table, so by default it leaves
+alone the periods already moved out by `archive` or by partition retention,
+and `prune` drops fine-grained buckets once they are no longer charted.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, FloatField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDay, TruncHour, TruncMinute
+
+from . import partitions
+from .config import ROLLUP_CONFIG
+from .models import Vehicle, WeightReading, ReadingArchive, VehicleWeightRollup, FleetWeightRollup
+from .thresholds import threshold_rules
+
+RESOLUTIONS = {
+    'minute': TruncMinute,
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+
+# Buckets upserted per statement
+UPSERT_CHUNK_SIZE = 100
+
+VALUE_FIELDS = ['count', 'total', 'min_weight', 'max_weight', 'overload_count']
+
+
+def bucket_start(timestamp, resolution):
+    timestamp = timestamp.astimezone(dt_timezone.utc)
+    if resolution == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if resolution == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def summarize(readings):
+    """
+    Fold stored readings into per-bucket [count, total, min, max, overloads]
+    values, keyed by (vehicle_id, resolution, bucket_start) for vehicles and
+    (resolution, bucket_start) for the fleet.
+    """
+    vehicle_buckets = {}
+    fleet_buckets = {}
+    for reading in readings:
+        valid = reading.status == 'valid' and reading.sensor_health == 'healthy'
+        overloaded = getattr(reading, 'overloaded', False)
+        if not valid and not overloaded:
+            continue
+        for resolution in RESOLUTIONS:
+            start = bucket_start(reading.timestamp, resolution)
+            for buckets, key in ((vehicle_buckets, (reading.vehicle_id, resolution, start)),
+                                 (fleet_buckets, (resolution, start))):
+                bucket = buckets.setdefault(key, [0, 0.0, None, None, 0])
+                if valid:
+                    bucket[0] += 1
+                    bucket[1] += reading.weight
+                    bucket[2] = reading.weight if bucket[2] is None else min(bucket[2], reading.weight)
+                    bucket[3] = reading.weight if bucket[3] is None else max(bucket[3], reading.weight)
+                if overloaded:
+                    bucket[4] += 1
+    return vehicle_buckets, fleet_buckets
+
+
+def add_readings(readings):
+    """Add newly stored readings to the rollups."""
+    vehicle_buckets, fleet_buckets = summarize(readings)
+    upsert(VehicleWeightRollup, ['vehicle_id', 'resolution', 'bucket_start'], vehicle_buckets)
+    upsert(FleetWeightRollup, ['resolution', 'bucket_start'], fleet_buckets)
+
+
+def upsert(model, key_columns, buckets):
+    """
+    Insert buckets, or add to the ones that already exist. Buckets are
+    written in key order so concurrent batches lock rows in the same order.
+    """
+    if not buckets:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = key_columns + VALUE_FIELDS
+    row = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    min_weight, max_weight = qn('min_weight'), qn('max_weight')
+    assignments = ', '.join(
+        [f'{qn(name)} = {table}.{qn(name)} + EXCLUDED.{qn(name)}' for name in ('count', 'total', 'overload_count')] +
+        [
+            f'{min_weight} = CASE WHEN {table}.{min_weight} IS NULL OR EXCLUDED.{min_weight} < {table}.{min_weight} '
+            f'THEN EXCLUDED.{min_weight} ELSE {table}.{min_weight} END',
+            f'{max_weight} = CASE WHEN {table}.{max_weight} IS NULL OR EXCLUDED.{max_weight} > {table}.{max_weight} '
+            f'THEN EXCLUDED.{max_weight} ELSE {table}.{max_weight} END',
+        ]
+    )
+
+    items = sorted(buckets.items())
+    with connection.cursor() as cursor:
+        for offset in range(0, len(items), UPSERT_CHUNK_SIZE):
+            chunk = items[offset:offset + UPSERT_CHUNK_SIZE]
+            params = []
+            for key, values in chunk:
+                *key_values, start = key
+                params.extend(key_values)
+                params.append(connection.ops.adapt_datetimefield_value(start))
+                params.extend(values)
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(qn(c) for c in columns)}) '
+                f'VALUES {", ".join([row] * len(chunk))} '
+                f'ON CONFLICT ({", ".join(qn(c) for c in key_columns)}) DO UPDATE SET {assignments}',
+                params
+            )
+
+
+def hot_start():
+    """
+    Start of the range whose readings are all still in the table: the day
+    after the newest archived reading, or the oldest attached partition.
+    None when nothing has been moved out.
+    """
+    starts = []
+    newest_archived = ReadingArchive.objects.aggregate(newest=Max('last_timestamp'))['newest']
+    if newest_archived is not None:
+        starts.append(bucket_start(newest_archived, 'day') + timedelta(days=1))
+    oldest_partition = partitions.oldest_partition()
+    if oldest_partition is not None:
+        starts.append(oldest_partition)
+    return max(starts) if starts else None
+
+
+def rebuild(since=None, vehicle_ids=None, full=False):
+    """
+    Recompute the rollups from the raw readings, from the start of the day
+    of `since`, optionally for some vehicles only. Fleet rollups are then
+    recomputed from the vehicle rollups.
+
+    Only the range still fully in the table (see `hot_start`) is rebuilt,
+    since rebuilding archived or detached periods would replace their
+    rollups with empty ones; `full` rebuilds everything regardless.
+    Overloads are counted under the current threshold rules, so rebuilt
+    buckets may differ from the rules that applied at the time.
+    """
+    if not full:
+        start = hot_start()
+        if start is not None and (since is None or since < start):
+            since = start
+
+    valid = Q(status='valid', sensor_health='healthy')
+    overloaded = Q(weight__gt=F('vehicle__max_allowed_weight') + overload_tolerances())
+
+    readings = WeightReading.objects.all()
+    vehicle_rollups = VehicleWeightRollup.objects.all()
+    fleet_rollups = FleetWeightRollup.objects.all()
+    if since is not None:
+        start = bucket_start(since, 'day')
+        readings = readings.filter(timestamp__gte=start)
+        vehicle_rollups = vehicle_rollups.filter(bucket_start__gte=start)
+        fleet_rollups = fleet_rollups.filter(bucket_start__gte=start)
+
+    rebuilt = vehicle_rollups
+    if vehicle_ids:
+        readings = readings.filter(vehicle_id__in=vehicle_ids)
+        rebuilt = vehicle_rollups.filter(vehicle_id__in=vehicle_ids)
+
+    with transaction.atomic():
+        rebuilt.delete()
+        for resolution, trunc in RESOLUTIONS.items():
+            rows = readings.annotate(
+                bucket=trunc('timestamp', tzinfo=dt_timezone.utc)
+            ).values('vehicle_id', 'bucket').annotate(
+                count=Count('id', filter=valid),
+                total=Coalesce(Sum('weight', filter=valid), 0.0),
+                min_weight=Min('weight', filter=valid),
+                max_weight=Max('weight', filter=valid),
+                overload_count=Count('id', filter=overloaded),
+            ).filter(Q(count__gt=0) | Q(overload_count__gt=0)).order_by()
+            VehicleWeightRollup.objects.bulk_create(
+                (VehicleWeightRollup(vehicle_id=row.pop('vehicle_id'), resolution=resolution,
+                                     bucket_start=row.pop('bucket'), **row)
+                 for row in rows.iterator()),
+                batch_size=1000
+            )
+
+        fleet_rollups.delete()
+        rows = vehicle_rollups.values('resolution', 'bucket_start').annotate(
+            count_sum=Sum('count'),
+            total_sum=Sum('total'),
+            min_weight_min=Min('min_weight'),
+            max_weight_max=Max('max_weight'),
+            overload_count_sum=Sum('overload_count'),
+        ).order_by()
+        FleetWeightRollup.objects.bulk_create(
+            (FleetWeightRollup(
+                resolution=row['resolution'],
+                bucket_start=row['bucket_start'],
+                count=row['count_sum'],
+                total=row['total_sum'],
+                min_weight=row['min_weight_min'],
+                max_weight=row['max_weight_max'],
+                overload_count=row['overload_count_sum'],
+            ) for row in rows.iterator()),
+            batch_size=1000
+        )
+
+
+def overload_tolerances():
+    """
+    SQL expression for the overload tolerance of each reading's vehicle under
+    the current threshold rules, with one branch per distinct tolerance.
+    """
+    rules = threshold_rules.load()
+    vehicles_by_tolerance = {}
+    for vehicle in Vehicle.objects.only('id', 'vehicle_class', 'axle_configuration').iterator():
+        tolerance = rules.rule_for(vehicle).overload_tolerance
+        if tolerance != rules.default.overload_tolerance:
+            vehicles_by_tolerance.setdefault(tolerance, []).append(vehicle.pk)
+
+    default = Value(rules.default.overload_tolerance, output_field=FloatField())
+    if not vehicles_by_tolerance:
+        return default
+    return Case(
+        *[When(vehicle_id__in=ids, then=Value(tolerance)) for tolerance, ids in vehicles_by_tolerance.items()],
+        default=default,
+        output_field=FloatField()
+    )
+
+
+def prune(now=None):
+    """Delete minute and hour buckets older than their retention period."""
+    now = now or datetime.now(dt_timezone.utc)
+    deleted = 0
+    for resolution, days in (('minute', ROLLUP_CONFIG['MINUTE_RETENTION_DAYS']),
+                             ('hour', ROLLUP_CONFIG['HOUR_RETENTION_DAYS'])):
+        cutoff = now - timedelta(days=days)
+        for model in (VehicleWeightRollup, FleetWeightRollup):
+            count, _ = model.objects.filter(resolution=resolution, bucket_start__lt=cutoff).delete()
+            deleted += count
+    return deleted
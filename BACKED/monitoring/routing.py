@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .consumers import FleetFeedConsumer, ReadingStreamConsumer
+
+websocket_urlpatterns = [
+    path('ws/readings/', ReadingStreamConsumer.as_asgi()),
+    path('ws/fleet/', FleetFeedConsumer.as_asgi()),
+]
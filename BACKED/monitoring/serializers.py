@@ -1,3 +1,4 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
 from .models import Vehicle, WeightReading, Alert,Report
 from django.contrib.auth.models import User
@@ -28,7 +29,83 @@ class UserSerializer(serializers.ModelSerializer):
         user.set_password(validated_data['password'])
         user.save()
         return user
-class VehicleSerializer(serializers.ModelSerializer):
+def query_fields(serializer, model, prefix=''):
+    """
+    Columns and relations of `model` read by the fields of `serializer`, as
+    paths for only() and select_related(), or None when some field reads
+    something other than a column or a forward relation.
+    """
+    columns, relations = [], []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if field.source == '*' or '.' in field.source:
+            return None
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete:
+            return None
+        path = prefix + field.source
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) or not model_field.many_to_one:
+                return None
+            nested = query_fields(field, model_field.related_model, path + '__')
+            if nested is None:
+                return None
+            columns.append(path)
+            columns.extend(nested[0])
+            relations.append(path)
+            relations.extend(nested[1])
+        else:
+            columns.append(path)
+    return columns, relations
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets for GET requests. `?fields=id,message,vehicle` keeps
+    only the listed fields, and `?expand=vehicle` swaps the compact form of a
+    nested object for the serializer in `expandable_fields`.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+
+        for name in request.query_params.get('expand', '').split(','):
+            if name in self.expandable_fields and name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+
+        wanted = {name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()}
+        if wanted:
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+    def optimize_queryset(self, queryset, required=()):
+        """Load only the columns and relations the fields read, plus `required` columns."""
+        fields = query_fields(self, queryset.model)
+        if fields is None:
+            return queryset
+        columns, relations = fields
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns, *required)
+
+
+class VehicleSummarySerializer(serializers.ModelSerializer):
+    """Compact vehicle embedded in other resources."""
+    class Meta:
+        model = Vehicle
+        fields = ('id', 'vehicle_id', 'vehicle_name', 'owner', 'driver',
+                  'current_weight', 'max_allowed_weight', 'is_currently_overloaded')
+
+
+class VehicleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Vehicle
         fields = '__all__'
@@ -36,13 +113,49 @@ class VehicleSerializer(serializers.ModelSerializer):
             'vehicle_image': {'required': False}  # Make image optional
         }
 
-class WeightReadingSerializer(serializers.ModelSerializer):
+class WeightReadingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = WeightReading
         fields = '__all__'
 
-class AlertSerializer(serializers.ModelSerializer):
-    vehicle = VehicleSerializer()
+class WeightReadingBatchItemSerializer(WeightReadingSerializer):
+    # Vehicles are looked up once per batch and passed in the context
+    # instead of one query per item
+    vehicle = serializers.IntegerField()
+
+    def validate_vehicle(self, value):
+        vehicle = self.context['vehicles'].get(value)
+        if vehicle is None:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return vehicle
+
+    @classmethod
+    def validate_batch(cls, items):
+        """
+        Validate batch items, looking up all their vehicles in one query.
+        Returns (index, validated_data) pairs and error results for the rest.
+        """
+        vehicle_ids = set()
+        for item in items:
+            try:
+                vehicle_ids.add(int(item.get('vehicle')))
+            except (AttributeError, TypeError, ValueError):
+                continue
+        context = {'vehicles': Vehicle.objects.in_bulk(vehicle_ids)}
+
+        valid = []
+        errors = []
+        for index, item in enumerate(items):
+            serializer = cls(data=item, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+        return valid, errors
+
+class AlertSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    vehicle = VehicleSummarySerializer(read_only=True)
+    expandable_fields = {'vehicle': VehicleSerializer}
     class Meta:
         model = Alert
         fields = '__all__'
@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import change_log, resource_versions
+from .models import Alert, CurrentAlert, Penalty, PenaltyRate, ThresholdRule, Vehicle
+from .penalty_rates import rate_history
+from .thresholds import threshold_rules
+
+
+@receiver(post_save, sender=Alert)
+def point_to_new_alert(sender, instance, created, raw=False, **kwargs):
+    # Alerts created in bulk by the reading pipeline are pointed to there
+    if created and not raw:
+        CurrentAlert.point_to([instance])
+
+
+@receiver(post_delete, sender=Alert)
+def refresh_current_alert(sender, instance, **kwargs):
+    CurrentAlert.refresh(instance.vehicle_id)
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def bump_resource_version(sender, raw=False, **kwargs):
+    if not raw:
+        resource_versions.bump_for(sender)
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_save, sender=Alert)
+@receiver(post_save, sender=Penalty)
+def log_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        change_log.record_for(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_delete, sender=Alert)
+@receiver(post_delete, sender=Penalty)
+def log_deletion(sender, instance, **kwargs):
+    change_log.record_for(sender, [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=PenaltyRate)
+@receiver(post_delete, sender=PenaltyRate)
+def invalidate_penalty_rates(sender, **kwargs):
+    # Now for this connection, and again on commit in case another thread
+    # reloaded the old rates in the meantime
+    rate_history.invalidate()
+    transaction.on_commit(rate_history.invalidate)
+
+
+@receiver(post_save, sender=ThresholdRule)
+@receiver(post_delete, sender=ThresholdRule)
+def invalidate_threshold_rules(sender, **kwargs):
+    threshold_rules.invalidate()
+    transaction.on_commit(threshold_rules.invalidate)
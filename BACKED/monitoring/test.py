@@ -1,8 +1,42 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import User
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Vehicle, WeightReading, Alert, Report
+from .models import Vehicle, WeightReading, ReadingDedupKey, IngestQueueItem, VehicleWeightWindow, VehicleWeightRollup, FleetWeightRollup, ReadingArchive, Alert, AlertNotification, ChangeLog, CurrentAlert, GeocodeCell, ThresholdRule, Report, Penalty, PenaltyRate
+from . import ingest_queue
+from .binary_protocol import encode_frame, FrameError
+from .gateway import ReadingGateway
+from .pipeline import ReadingPipeline
+from .config import EMAIL_CONFIG, GEOCODING_CONFIG, INGEST_CONFIG, NOTIFICATION_CONFIG, PAGINATION_CONFIG, SYNC_CONFIG
+from .serializers import VehicleSummarySerializer
+from .views import AlertViewSet
+from .dedup import recent_keys
+from .penalty_rates import rate_history
+from .thresholds import threshold_rules
+from . import archive, fleet_feed, geocoding, maps, notifications, partitions, resource_versions, rollups
+from vehicle_monitoring_system.asgi import application
+from django.apps import apps
 from django.utils import timezone
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command, CommandError
+from django.core import mail
+from django.core.mail import get_connection
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+import http.server
+import io
+import os
+import random
+import re
+import smtplib
+import threading
+import time
+import tempfile
 
 
 class VehicleViewSetTestCase(TestCase):
@@ -174,3 +208,1587 @@ class VehicleListViewTestCase(TestCase):
         self.assertEqual(len(response.data), 2)  # Two vehicles created
 
 
+
+
+class WeightReadingBatchTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck G",
+            vehicle_id="TRK129",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+            status="active"
+        )
+        PenaltyRate.objects.create(id=1, amount=50000)
+
+    def test_batch_ingest(self):
+        """Test a batch upload processes readings in timestamp order and reports each item"""
+        now = timezone.now()
+        data = [
+            {'vehicle': self.vehicle.id, 'weight': 4000, 'timestamp': now.isoformat()},
+            {'vehicle': self.vehicle.id, 'weight': 6000, 'timestamp': (now - timezone.timedelta(minutes=5)).isoformat()},
+            {'vehicle': 9999, 'weight': 4000},
+            {'vehicle': self.vehicle.id},
+        ]
+
+        response = self.client.post('/api/weights/batch/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'created', 'error', 'error'])
+        self.assertEqual(response.data['results'][1]['reading_status'], 'suspected')
+
+        # The overload came first, so the vehicle ends up back within its limit
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.current_weight, 4000)
+        self.assertFalse(self.vehicle.is_currently_overloaded)
+        self.assertEqual(WeightReading.objects.filter(vehicle=self.vehicle).count(), 2)
+        self.assertEqual(Penalty.objects.filter(vehicle=self.vehicle).count(), 1)
+        self.assertEqual(
+            set(Alert.objects.filter(vehicle=self.vehicle).values_list('alert_type', flat=True)),
+            {'overload', 'penalty_issued'}
+        )
+
+
+class VehicleWeightWindowTestCase(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck H",
+            vehicle_id="TRK130",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+
+    def test_window_matches_rebuild(self):
+        """Test the incrementally maintained average matches a rebuild from history"""
+        now = timezone.now()
+        window = VehicleWeightWindow(vehicle=self.vehicle)
+        for i in range(120):
+            reading = WeightReading.objects.create(
+                vehicle=self.vehicle,
+                weight=1000 + i,
+                timestamp=now - timezone.timedelta(minutes=120 - i)
+            )
+            window.add(reading.timestamp, reading.weight)
+
+        self.assertEqual(window.count, 100)
+        rebuilt = VehicleWeightWindow.rebuild(self.vehicle)
+        self.assertEqual(rebuilt.count, window.count)
+        self.assertAlmostEqual(rebuilt.average, window.average)
+        self.assertAlmostEqual(window.average, sum(range(1020, 1120)) / 100)
+
+    def test_expired_readings_leave_window(self):
+        """Test readings older than the valid period are dropped from the average"""
+        window = VehicleWeightWindow(vehicle=self.vehicle)
+        window.add(timezone.now() - timezone.timedelta(days=29), 2000)
+        window.add(timezone.now(), 4000)
+        window.expire(now=timezone.now() + timezone.timedelta(days=2))
+        self.assertEqual(window.count, 1)
+        self.assertEqual(window.average, 4000)
+
+    def test_batch_sees_state_of_previous_batch(self):
+        """Test a batch reloads its vehicle instead of trusting a stale cached instance"""
+        PenaltyRate.objects.create(id=1, amount=50000)
+        stale = Vehicle.objects.get(pk=self.vehicle.pk)
+        pipeline = ReadingPipeline()
+        pipeline.process_batch([WeightReading(vehicle=self.vehicle, weight=6000)])
+        pipeline.process_batch([WeightReading(vehicle=stale, weight=6500)])
+
+        self.assertEqual(Penalty.objects.filter(vehicle=self.vehicle).count(), 1)
+
+
+class ReadingPipelineTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck I",
+            vehicle_id="TRK131",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+        PenaltyRate.objects.create(id=1, amount=50000)
+
+    def test_overload_writes_vehicle_once(self):
+        """Test an overloaded reading updates the vehicle row and inserts the reading exactly once"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/weights/', {'vehicle': self.vehicle.id, 'weight': 6000}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'suspected')
+        statements = [q['sql'] for q in queries.captured_queries]
+        self.assertEqual(len([s for s in statements if s.startswith('UPDATE "monitoring_vehicle"')]), 1)
+        self.assertEqual(len([s for s in statements if s.startswith('INSERT INTO "monitoring_weightreading"')]), 1)
+        self.assertFalse([s for s in statements if s.startswith('UPDATE "monitoring_weightreading"')])
+
+        self.vehicle.refresh_from_db()
+        self.assertTrue(self.vehicle.is_currently_overloaded)
+        self.assertTrue(self.vehicle.weight_alert)
+        self.assertEqual(Alert.objects.filter(vehicle=self.vehicle).count(), 2)
+        self.assertEqual(Penalty.objects.filter(vehicle=self.vehicle).count(), 1)
+
+
+class IngestQueueTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck J",
+            vehicle_id="TRK132",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+
+    def test_enqueue_and_drain(self):
+        """Test queued readings are accepted with 202 and processed by a worker in order"""
+        data = [{'vehicle': self.vehicle.id, 'weight': w} for w in (4000, 4500)]
+        response = self.client.post('/api/weights/enqueue/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(WeightReading.objects.count(), 0)
+        self.assertEqual(self.client.get('/api/weights/queue/').data['depth'], 2)
+
+        items = ingest_queue.claim_batch()
+        self.assertEqual(ingest_queue.process_items(items), 2)
+
+        self.assertEqual(self.client.get('/api/weights/queue/').data['depth'], 0)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.current_weight, 4500)
+        self.assertEqual(WeightReading.objects.count(), 2)
+
+    def test_bad_item_does_not_fail_batch(self):
+        """Test one failing item is retried later on its own while the rest of its batch is stored"""
+        now = timezone.now()
+        other = Vehicle.objects.create(
+            vehicle_name="Truck J2", vehicle_id="TRK133", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=5000,
+        )
+        ingest_queue.enqueue([{'vehicle': self.vehicle, 'weight': 4000}, {'vehicle': other, 'weight': 4100}])
+        bad = IngestQueueItem.objects.create(
+            vehicle_id=self.vehicle.id, payload={'vehicle': self.vehicle.id, 'weight': None, 'timestamp': now.isoformat()}
+        )
+        ingest_queue.enqueue([{'vehicle': other, 'weight': w} for w in (4200, 4300)])
+        unparseable = IngestQueueItem.objects.create(
+            vehicle_id=other.id, payload={'vehicle': other.id, 'weight': 4400, 'timestamp': 'soon'}
+        )
+
+        items = ingest_queue.claim_batch()
+        self.assertEqual(ingest_queue.process_items(items), 4)
+
+        self.assertEqual(WeightReading.objects.count(), 4)
+        bad.refresh_from_db()
+        self.assertEqual(bad.status, 'pending')
+        self.assertGreater(bad.next_attempt_at, now)
+        self.assertEqual(IngestQueueItem.objects.get(pk=unparseable.pk).status, 'failed')
+        # Not due again until its backoff has passed
+        self.assertEqual(ingest_queue.claim_batch(), [])
+
+    def test_later_items_wait_for_failed_item(self):
+        """Test the readings of a vehicle after a failed one are not stored before it"""
+        now = timezone.now()
+        bad = IngestQueueItem.objects.create(
+            vehicle_id=self.vehicle.id, payload={'vehicle': self.vehicle.id, 'weight': None, 'timestamp': now.isoformat()}
+        )
+        later, = ingest_queue.enqueue([{'vehicle': self.vehicle, 'weight': 4500}])
+
+        self.assertEqual(ingest_queue.process_items(ingest_queue.claim_batch()), 0)
+        self.assertFalse(WeightReading.objects.exists())
+        later.refresh_from_db()
+        self.assertEqual((later.status, later.attempts), ('pending', 0))
+        self.assertEqual(ingest_queue.claim_batch(), [])
+
+        # Once the failed item is due and stored, the later one follows it
+        bad.payload['weight'] = 4000
+        IngestQueueItem.objects.filter(pk=bad.pk).update(payload=bad.payload, next_attempt_at=now)
+        self.assertEqual(ingest_queue.process_items(ingest_queue.claim_batch()), 2)
+        self.assertEqual(list(WeightReading.objects.order_by('id').values_list('weight', flat=True)), [4000, 4500])
+
+
+class ReadingStreamConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='station1', password='secret-pass-123')
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck K",
+            vehicle_id="TRK133",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+
+    def connect(self, token):
+        return WebsocketCommunicator(application, f'/ws/readings/?token={token}')
+
+    def test_stream_readings_with_acks(self):
+        """Test an authenticated connection streams readings and gets one ack per reading"""
+        async def stream():
+            communicator = self.connect(AccessToken.for_user(self.user))
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to([
+                {'id': 'a', 'vehicle': self.vehicle.id, 'weight': 4000},
+                {'id': 'b', 'vehicle': self.vehicle.id},
+            ])
+            acks = [await communicator.receive_json_from(timeout=5) for _ in range(2)]
+            await communicator.disconnect()
+            return acks
+
+        acks = {ack['id']: ack for ack in async_to_sync(stream)()}
+        self.assertEqual(acks['a']['type'], 'ack')
+        self.assertEqual(acks['a']['status'], 'valid')
+        self.assertEqual(acks['b']['type'], 'error')
+        self.assertEqual(WeightReading.objects.get().id, acks['a']['reading_id'])
+
+    def test_rejects_invalid_token(self):
+        """Test connections without a valid JWT are refused"""
+        async def attempt():
+            connected, _ = await self.connect('invalid').connect()
+            return connected
+
+        self.assertFalse(async_to_sync(attempt)())
+
+
+class FleetFeedConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dispatcher', password='secret-pass-123')
+        self.dar = Vehicle.objects.create(
+            vehicle_name="Truck L", vehicle_id="TRK134", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=5000, latitude=-6.8, longitude=39.28,
+        )
+        self.dodoma = Vehicle.objects.create(
+            vehicle_name="Truck M", vehicle_id="TRK135", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=5000, latitude=-6.17, longitude=35.74,
+        )
+        PenaltyRate.objects.create(id=1, amount=50000)
+
+    def connect(self, token):
+        return WebsocketCommunicator(application, f'/ws/fleet/?token={token}')
+
+    def store(self, *readings):
+        ReadingPipeline().process_batch([WeightReading(**reading) for reading in readings])
+
+    def test_workers_warn_about_local_layer(self):
+        """Test worker processes are told when their updates cannot reach dashboards"""
+        stderr = io.StringIO()
+        fleet_feed.warn_if_local(stderr)
+        self.assertIn("REDIS_URL", stderr.getvalue())
+
+    def test_pushes_changes_within_bbox(self):
+        """Test subscribers get a snapshot, then only changes to vehicles inside their map area"""
+        async def watch():
+            communicator = self.connect(AccessToken.for_user(self.user))
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.send_json_to({'type': 'subscribe', 'bbox': [-7.5, 38.5, -6.5, 40.0]})
+            snapshot = await communicator.receive_json_from(timeout=5)
+            await database_sync_to_async(self.store)(
+                {'vehicle': self.dodoma, 'weight': 4000, 'latitude': -6.17, 'longitude': 35.74},
+                {'vehicle': self.dar, 'weight': 6000, 'latitude': -6.81, 'longitude': 39.29},
+            )
+            update = await communicator.receive_json_from(timeout=5)
+            nothing_else = await communicator.receive_nothing()
+            await communicator.disconnect()
+            return snapshot, update, nothing_else
+
+        snapshot, update, nothing_else = async_to_sync(watch)()
+        self.assertEqual(snapshot['type'], 'snapshot')
+        self.assertEqual([vehicle['id'] for vehicle in snapshot['vehicles']], [self.dar.id])
+        self.assertEqual(update['type'], 'fleet.update')
+        self.assertEqual(len(update['changes']), 1)
+        change = update['changes'][0]
+        self.assertEqual(change['id'], self.dar.id)
+        self.assertEqual(change['weight'], 6000)
+        self.assertTrue(change['overloaded'])
+        self.assertEqual(change['alert']['id'], Alert.objects.filter(vehicle=self.dar).latest('id').id)
+        self.assertTrue(nothing_else)
+
+    def test_vehicle_subscription(self):
+        """Test a subscription to some vehicles only receives their changes"""
+        async def watch():
+            communicator = self.connect(AccessToken.for_user(self.user))
+            await communicator.connect()
+            await communicator.send_json_to({'type': 'subscribe', 'vehicles': [self.dodoma.id]})
+            await communicator.receive_json_from(timeout=5)
+            await database_sync_to_async(self.store)({'vehicle': self.dar, 'weight': 4000})
+            skipped = await communicator.receive_nothing()
+            await database_sync_to_async(self.store)({'vehicle': self.dodoma, 'weight': 4200})
+            update = await communicator.receive_json_from(timeout=5)
+            await communicator.disconnect()
+            return skipped, update
+
+        skipped, update = async_to_sync(watch)()
+        self.assertTrue(skipped)
+        self.assertEqual([change['id'] for change in update['changes']], [self.dodoma.id])
+        self.assertNotIn('alert', update['changes'][0])
+
+    def test_rejects_invalid_token(self):
+        """Test dashboards without a valid JWT are refused"""
+        async def attempt():
+            connected, _ = await self.connect('invalid').connect()
+            return connected
+
+        self.assertFalse(async_to_sync(attempt)())
+
+
+class BinaryGatewayTestCase(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck L",
+            vehicle_id="TRK134",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+
+    def test_frames_round_trip_into_readings(self):
+        """Test binary frames decode into readings and unknown vehicles are rejected"""
+        data = b''.join([
+            encode_frame(self.vehicle.id, 7, 1, 1_700_000_000_000, 4200.5, -6.792354, 39.208328),
+            encode_frame(self.vehicle.id, 7, 2, 1_700_000_001_000, 4300, malfunctioning=True),
+            encode_frame(9999, 8, 1, 1_700_000_000_000, 1000),
+        ])
+        gateway = ReadingGateway()
+        self.assertEqual(gateway.feed(data), 3)
+        self.assertEqual(gateway.process(gateway.take()), 2)
+        self.assertEqual(gateway.rejected, 1)
+
+        first, second = WeightReading.objects.order_by('timestamp')
+        self.assertEqual(first.sensor_id, '7')
+        self.assertEqual(first.weight, 4200.5)
+        self.assertAlmostEqual(first.latitude, -6.792354)
+        self.assertEqual(first.timestamp.timestamp(), 1_700_000_000)
+        self.assertIsNone(second.latitude)
+        self.assertEqual(second.status, 'suspected')
+
+    def test_implausible_frames_are_rejected_alone(self):
+        """Test frames with bad timestamps, weights or locations are rejected without their neighbours"""
+        data = b''.join([
+            encode_frame(self.vehicle.id, 7, 1, 1_700_000_000_000, 4200),
+            encode_frame(self.vehicle.id, 7, 2, 2 ** 62, 4200),
+            encode_frame(self.vehicle.id, 7, 3, 1_700_000_002_000, float('nan')),
+            encode_frame(self.vehicle.id, 7, 4, 1_700_000_003_000, float('inf')),
+            encode_frame(self.vehicle.id, 7, 5, 1_700_000_004_000, 4300, 95.0, 39.2),
+            encode_frame(self.vehicle.id, 7, 6, 1_700_000_005_000, 4400),
+        ])
+        gateway = ReadingGateway()
+        gateway.feed(data)
+        self.assertEqual(gateway.process(gateway.take()), 2)
+        self.assertEqual(gateway.rejected, 4)
+        self.assertEqual(sorted(WeightReading.objects.values_list('weight', flat=True)), [4200, 4400])
+
+    def test_failing_reading_is_rejected_alone(self):
+        """Test a frame the pipeline fails on is rejected while the rest of its batch is stored"""
+        gateway = ReadingGateway()
+        gateway.feed(b''.join(encode_frame(self.vehicle.id, 7, n, 1_700_000_000_000 + n, 4000 + n) for n in range(3)))
+        process_batch = gateway.pipeline.process_batch
+
+        def fail_on_second(readings):
+            if any(reading.weight == 4001 for reading in readings):
+                raise RuntimeError("Broken reading")
+            return process_batch(readings)
+
+        with mock.patch.object(gateway.pipeline, 'process_batch', side_effect=fail_on_second):
+            self.assertEqual(gateway.process(gateway.take()), 2)
+        self.assertEqual(gateway.rejected, 1)
+
+    def test_partial_frame_is_rejected(self):
+        """Test a buffer that is not a whole number of frames is refused"""
+        frame = encode_frame(self.vehicle.id, 7, 1, 1_700_000_000_000, 4200)
+        with self.assertRaises(FrameError):
+            ReadingGateway().feed(frame + frame[:10])
+
+
+class ReadingDeduplicationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck M",
+            vehicle_id="TRK135",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+        PenaltyRate.objects.create(id=1, amount=50000)
+        recent_keys.clear()
+
+    def test_retry_is_not_stored_twice(self):
+        """Test a retried reading creates no second reading, alert or penalty"""
+        data = {'vehicle': self.vehicle.id, 'weight': 6000, 'sensor_id': 'S1', 'sequence': 41}
+        first = self.client.post('/api/weights/', data, format='json')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        # Not in this process's cache, so the unique index catches it
+        recent_keys.clear()
+        retry = self.client.post('/api/weights/', data, format='json')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data, {'duplicate': True, 'id': first.data['id']})
+
+        self.assertEqual(WeightReading.objects.count(), 1)
+        self.assertEqual(Penalty.objects.count(), 1)
+        self.assertEqual(Alert.objects.count(), 2)
+
+    def test_cached_keys_need_no_query(self):
+        """Test a retry already in the cache is rejected without touching the database"""
+        recent_keys.add_many([('key:abc', 7)])
+        reading = WeightReading(vehicle=self.vehicle, weight=4000, idempotency_key='abc')
+        with self.assertNumQueries(0):
+            ReadingPipeline().drop_known_duplicates([reading])
+        self.assertEqual(reading.duplicate_of, 7)
+
+    def test_batch_reports_duplicates(self):
+        """Test repeats within a batch are stored once and reported as duplicates"""
+        data = [{'vehicle': self.vehicle.id, 'weight': 4000, 'idempotency_key': 'k1'}] * 2
+        response = self.client.post('/api/weights/batch/', data, format='json')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['duplicates'], 1)
+        self.assertEqual(response.data['results'][1]['id'], response.data['results'][0]['id'])
+
+    def test_keys_are_inserted_with_their_reading(self):
+        """Test keys are stored once with their reading id, and a conflict only drops the retry"""
+        first = ReadingPipeline().process(WeightReading(vehicle=self.vehicle, weight=4000, idempotency_key='k1'))
+        recent_keys.clear()
+
+        batch = [
+            WeightReading(vehicle=self.vehicle, weight=4100, idempotency_key='k1'),
+            WeightReading(vehicle=self.vehicle, weight=4200, idempotency_key='k2'),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            ReadingPipeline().process_batch(batch)
+        statements = [q['sql'] for q in queries.captured_queries]
+        self.assertFalse([s for s in statements if s.startswith('UPDATE "monitoring_readingdedupkey"')])
+
+        self.assertEqual(batch[0].duplicate_of, first.pk)
+        self.assertEqual(WeightReading.objects.count(), 2)
+        self.assertEqual(dict(ReadingDedupKey.objects.values_list('key', 'reading_id')),
+                         {'key:k1': first.pk, 'key:k2': batch[1].pk})
+
+
+class ReadingPartitionsTestCase(TestCase):
+    def test_month_arithmetic(self):
+        """Test partition months roll over year boundaries in both directions"""
+        month = partitions.month_start(datetime(2026, 11, 17, 8, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(month, datetime(2026, 11, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partitions.add_months(month, 3), datetime(2027, 2, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partitions.add_months(month, -11), datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partitions.partition_name(month), 'monitoring_weightreading_p202611')
+
+    def test_command_requires_postgresql(self):
+        """Test the partition command refuses to run on other databases"""
+        if partitions.is_supported():
+            self.skipTest("Running on PostgreSQL")
+        with self.assertRaises(CommandError):
+            call_command('manage_reading_partitions')
+
+    def test_nothing_references_reading_ids(self):
+        """Test no foreign key relies on reading ids, which are only unique with their timestamp"""
+        references = [
+            f'{model.__name__}.{field.name}'
+            for model in apps.get_models()
+            for field in model._meta.get_fields(include_hidden=True)
+            if field.is_relation and field.concrete and field.related_model is WeightReading
+        ]
+        self.assertEqual(references, [])
+
+
+class WeightRollupTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck R",
+            vehicle_id="TRK246",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+        self.hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+    def post_readings(self, weights):
+        readings = [
+            {'vehicle': self.vehicle.id, 'weight': weight, 'timestamp': (self.hour + timezone.timedelta(minutes=i)).isoformat()}
+            for i, weight in enumerate(weights)
+        ]
+        response = self.client.post('/api/weights/batch/', readings, format='json')
+        self.assertEqual(response.data['created'], len(weights))
+
+    def rollup_values(self, model):
+        return sorted(model.objects.values_list(
+            'resolution', 'bucket_start', 'count', 'total', 'min_weight', 'max_weight', 'overload_count'
+        ))
+
+    def test_readings_update_rollups_incrementally(self):
+        """Test each batch is added to the existing buckets"""
+        self.post_readings([4000, 3000])
+        self.post_readings([4600, 9000])
+
+        rollup = VehicleWeightRollup.objects.get(vehicle=self.vehicle, resolution='hour')
+        self.assertEqual((rollup.count, rollup.total), (3, 11600))
+        self.assertEqual((rollup.min_weight, rollup.max_weight), (3000, 4600))
+        self.assertEqual(rollup.overload_count, 1)
+        self.assertEqual(VehicleWeightRollup.objects.filter(resolution='minute').count(), 2)
+        fleet = FleetWeightRollup.objects.get(resolution='hour')
+        self.assertEqual((fleet.count, fleet.total, fleet.overload_count), (3, 11600, 1))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        """Test rebuilding from raw readings gives the same rollups"""
+        self.post_readings([4000, 3000, 9000, 4600])
+        vehicle_rollups = self.rollup_values(VehicleWeightRollup)
+        fleet_rollups = self.rollup_values(FleetWeightRollup)
+
+        rollups.rebuild()
+        self.assertEqual(self.rollup_values(VehicleWeightRollup), vehicle_rollups)
+        self.assertEqual(self.rollup_values(FleetWeightRollup), fleet_rollups)
+
+    def test_weight_trends_read_rollups(self):
+        """Test the hourly trend covers the whole day from the rollups"""
+        self.post_readings([4000, 3000])
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/reports/weight-trends/')
+        self.assertEqual(len(response.data['times']), 24)
+        self.assertEqual(response.data['average_weights'][self.hour.hour], 3500)
+        self.assertEqual(response.data['counts'][self.hour.hour], 2)
+
+
+class ReadingArchiveTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(BASE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck Q",
+            vehicle_id="TRK357",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+        self.old = datetime(2024, 3, 10, 8, 0, tzinfo=dt_timezone.utc)
+        for i in range(3):
+            WeightReading.objects.create(
+                vehicle=self.vehicle, weight=4000 + i, sensor_id='S1', sequence=i,
+                timestamp=self.old + timezone.timedelta(days=i)
+            )
+        self.recent = WeightReading.objects.create(vehicle=self.vehicle, weight=4500)
+
+    def test_old_readings_move_to_archive(self):
+        """Test readings past the cutoff are written to a monthly file and removed"""
+        entries = archive.archive_before(timezone.now() - timezone.timedelta(days=30))
+        self.assertEqual(len(entries), 1)
+        entry = ReadingArchive.objects.get()
+        self.assertEqual((entry.vehicle_id, entry.month.isoformat(), entry.row_count),
+                         (self.vehicle.id, '2024-03-01', 3))
+        self.assertEqual(list(WeightReading.objects.all()), [self.recent])
+
+        rows = archive.read_file(entry.path)
+        self.assertEqual([row['weight'] for row in rows], [4000, 4001, 4002])
+        self.assertEqual(rows[1]['timestamp'], self.old + timezone.timedelta(days=1))
+        self.assertEqual(rows[2]['sequence'], 2)
+
+    def test_history_reads_archived_range(self):
+        """Test the history endpoint merges archived and hot readings"""
+        archive.archive_before(timezone.now() - timezone.timedelta(days=30))
+        response = self.client.get('/api/weights/history/', {
+            'vehicle': self.vehicle.id,
+            'start': '2024-03-11',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['archived'], 2)
+        self.assertEqual([row['weight'] for row in response.data['results']], [4001, 4002, 4500])
+
+    def test_history_rejects_invalid_range(self):
+        """Test the history endpoint rejects unparseable and empty time ranges"""
+        invalid = self.client.get('/api/weights/history/', {'vehicle': self.vehicle.id, 'start': 'garbage'})
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        reversed_range = self.client.get('/api/weights/history/', {
+            'vehicle': self.vehicle.id,
+            'start': '2024-03-12',
+            'end': '2024-03-11',
+        })
+        self.assertEqual(reversed_range.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_keeps_archived_rollups(self):
+        """Test a default rollup rebuild leaves archived periods alone"""
+        rollups.rebuild()
+        archive.archive_before(timezone.now() - timezone.timedelta(days=30))
+        rollups.rebuild()
+        old_days = VehicleWeightRollup.objects.filter(resolution='day', bucket_start__year=2024)
+        self.assertEqual(sorted(old_days.values_list('total', flat=True)), [4000, 4001, 4002])
+        self.assertEqual(FleetWeightRollup.objects.filter(resolution='day').count(), 4)
+
+        rollups.rebuild(full=True)
+        self.assertFalse(old_days.exists())
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    EXPLAIN the hot queries against a seeded dataset and fail if any of them
+    reads a whole readings or alerts table instead of using an index.
+    """
+    LARGE_TABLES = ('monitoring_weightreading', 'monitoring_alert')
+
+    @classmethod
+    def setUpTestData(cls):
+        random.seed(7)
+        cls.now = timezone.now()
+        cls.vehicles = Vehicle.objects.bulk_create([
+            Vehicle(vehicle_name=f"Truck {i}", vehicle_id=f"PLN{i:03d}", description="Transport Truck",
+                    owner="John Doe", max_allowed_weight=5000)
+            for i in range(20)
+        ])
+        WeightReading.objects.bulk_create([
+            WeightReading(
+                vehicle=vehicle,
+                weight=random.randint(1000, 6000),
+                timestamp=cls.now - timezone.timedelta(hours=9 * i),
+                status=random.choice(['valid', 'valid', 'suspected']),
+                sensor_health=random.choice(['healthy'] * 9 + ['malfunctioning'])
+            )
+            for vehicle in cls.vehicles for i in range(500)
+        ])
+        alerts = Alert.objects.bulk_create([
+            Alert(vehicle=vehicle, message="Seeded alert",
+                  alert_type=random.choice(['overload', 'sensor_malfunction', 'other']),
+                  severity=random.choice(['low', 'medium', 'high']))
+            for vehicle in cls.vehicles for _ in range(200)
+        ])
+        # auto_now_add stamps them all with the current time; spread them out
+        for i, alert in enumerate(alerts):
+            alert.timestamp = cls.now - timezone.timedelta(hours=i % 4000)
+        Alert.objects.bulk_update(alerts, ['timestamp'])
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndexes(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            scanned = re.findall(r'Seq Scan on (\w+)', plan)
+        else:
+            scanned = re.findall(r'\bSCAN (\w+)$', plan, re.MULTILINE)
+        full_scans = [table for table in scanned if table.startswith(self.LARGE_TABLES)]
+        self.assertEqual(full_scans, [], f"Sequential scan in query plan:\n{plan}")
+
+    def test_average_weight_readings(self):
+        """Test the average weight rebuild reads the partial index"""
+        self.assertUsesIndexes(VehicleWeightWindow.recent_readings(self.vehicles[3]))
+
+    def test_reading_history(self):
+        """Test a vehicle's readings over a range use the vehicle/time index"""
+        self.assertUsesIndexes(WeightReading.objects.filter(
+            vehicle=self.vehicles[5],
+            timestamp__gte=self.now - timezone.timedelta(days=14),
+            timestamp__lt=self.now
+        ).order_by('timestamp', 'id'))
+
+    def test_latest_alert_per_vehicle(self):
+        """Test the alert list finds each vehicle's latest alert by index"""
+        self.assertUsesIndexes(AlertViewSet().get_queryset())
+
+    def test_report_date_range(self):
+        """Test report alert queries over a date range use the timestamp indexes"""
+        start = self.now - timezone.timedelta(days=2)
+        self.assertUsesIndexes(Alert.objects.filter(severity='high', timestamp__gte=start, timestamp__lt=self.now))
+        self.assertUsesIndexes(Alert.objects.filter(
+            alert_type__in=['overload', 'sensor_malfunction'],
+            timestamp__gte=start,
+            timestamp__lt=self.now
+        ).select_related('vehicle').order_by('-timestamp')[:50])
+
+
+class CurrentAlertTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicles = [
+            Vehicle.objects.create(
+                vehicle_name=f"Truck {name}",
+                vehicle_id=f"CUR{name}",
+                description="Transport Truck",
+                owner="John Doe",
+                max_allowed_weight=5000,
+            )
+            for name in "AB"
+        ]
+
+    def create_alert(self, vehicle, alert_type='overload'):
+        return Alert.objects.create(vehicle=vehicle, message="Overload detected", alert_type=alert_type, severity="high")
+
+    def test_pipeline_points_to_latest_alert(self):
+        """Test alerts created by readings move the vehicle's pointer"""
+        ReadingPipeline().process_batch([
+            WeightReading(vehicle=self.vehicles[0], weight=5050),
+            WeightReading(vehicle=self.vehicles[0], weight=9000),
+        ])
+        latest = Alert.objects.filter(vehicle=self.vehicles[0]).order_by('-id').first()
+        self.assertEqual(CurrentAlert.objects.get(vehicle=self.vehicles[0]).alert, latest)
+
+    def test_feed_returns_latest_alert_per_vehicle(self):
+        """Test the alert feed lists one alert per vehicle, newest first"""
+        self.create_alert(self.vehicles[0])
+        first_latest = self.create_alert(self.vehicles[0], 'sensor_malfunction')
+        second_latest = self.create_alert(self.vehicles[1])
+
+        response = self.client.get('/api/alerts/')
+        self.assertEqual([alert['id'] for alert in response.data['results']], [second_latest.id, first_latest.id])
+
+    def test_deleting_current_alert_falls_back(self):
+        """Test deleting the latest alert points back at the one before it"""
+        previous = self.create_alert(self.vehicles[0])
+        self.create_alert(self.vehicles[0]).delete()
+        self.assertEqual(CurrentAlert.objects.get(vehicle=self.vehicles[0]).alert, previous)
+
+        previous.delete()
+        self.assertFalse(CurrentAlert.objects.filter(vehicle=self.vehicles[0]).exists())
+
+    def test_late_commit_does_not_move_pointer_back(self):
+        """Test an older alert committed after a newer one leaves the pointer on the newer"""
+        early = self.create_alert(self.vehicles[0])
+        late = self.create_alert(self.vehicles[0])
+        CurrentAlert.point_to([early])
+        self.assertEqual(CurrentAlert.objects.get(vehicle=self.vehicles[0]).alert, late)
+
+        # The timestamp decides before the id
+        Alert.objects.filter(pk=early.pk).update(timestamp=late.timestamp + timezone.timedelta(minutes=1))
+        early.refresh_from_db()
+        CurrentAlert.point_to([early])
+        self.assertEqual(CurrentAlert.objects.get(vehicle=self.vehicles[0]).alert, early)
+
+    def test_alert_history_endpoint(self):
+        """Test a vehicle's alert history is read from its alerts, newest first and capped"""
+        alerts = [self.create_alert(self.vehicles[0]) for _ in range(3)]
+        self.create_alert(self.vehicles[1])
+
+        response = self.client.get(f'/api/vehicles/{self.vehicles[0].id}/alert-history/', {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([alert['id'] for alert in response.data], [alerts[2].id, alerts[1].id])
+        self.assertNotIn('alert_history', self.client.get(f'/api/vehicles/{self.vehicles[0].id}/').data)
+
+
+class PenaltyRateHistoryTestCase(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck P",
+            vehicle_id="TRK468",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+        self.now = timezone.now()
+        PenaltyRate.objects.create(amount=50000, effective_from=self.now - timezone.timedelta(days=30))
+        PenaltyRate.objects.create(amount=80000, effective_from=self.now - timezone.timedelta(days=1))
+        # The rates are rolled back with the test, so must not stay cached
+        self.addCleanup(rate_history.invalidate)
+
+    def test_rate_lookup_is_effective_dated(self):
+        """Test each timestamp gets the rate in force at that time, without queries once loaded"""
+        rate_history.rate_at(self.now)
+        with self.assertNumQueries(0):
+            self.assertEqual(rate_history.rate_at(self.now).amount, 80000)
+            self.assertEqual(rate_history.rate_at(self.now - timezone.timedelta(days=5)).amount, 50000)
+            self.assertEqual(rate_history.rate_at(self.now - timezone.timedelta(days=90)).amount, 50000)
+
+    def test_new_rate_invalidates_cache(self):
+        """Test saving a rate is seen by the next lookup"""
+        rate_history.rate_at(self.now)
+        PenaltyRate.objects.create(amount=90000, effective_from=self.now - timezone.timedelta(hours=1))
+        self.assertEqual(rate_history.rate_at(self.now).amount, 90000)
+
+    def test_backfilled_reading_uses_rate_of_its_time(self):
+        """Test a delayed overload reading is charged the rate in force when it was taken"""
+        ReadingPipeline().process(
+            WeightReading(vehicle=self.vehicle, weight=9000, timestamp=self.now - timezone.timedelta(days=3))
+        )
+        self.assertEqual(Penalty.objects.get(vehicle=self.vehicle).amount, 50000)
+
+
+class ThresholdRuleTestCase(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck T",
+            vehicle_id="TRK579",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+            vehicle_class="heavy",
+            axle_configuration="3-axle",
+        )
+        # Drop anything cached from rows rolled back by earlier tests
+        threshold_rules.invalidate()
+        rate_history.invalidate()
+        self.addCleanup(threshold_rules.invalidate)
+
+    def test_most_specific_rule_wins(self):
+        """Test vehicle, class and axle, class, axle and global rules apply in that order"""
+        global_rule = ThresholdRule.objects.create(overload_tolerance=100)
+        self.assertEqual(threshold_rules.rule_for(self.vehicle), global_rule)
+        axle_rule = ThresholdRule.objects.create(axle_configuration="3-axle", overload_tolerance=200)
+        self.assertEqual(threshold_rules.rule_for(self.vehicle), axle_rule)
+        class_rule = ThresholdRule.objects.create(vehicle_class="heavy", overload_tolerance=300)
+        self.assertEqual(threshold_rules.rule_for(self.vehicle), class_rule)
+        both_rule = ThresholdRule.objects.create(vehicle_class="heavy", axle_configuration="3-axle", overload_tolerance=400)
+        self.assertEqual(threshold_rules.rule_for(self.vehicle), both_rule)
+        vehicle_rule = ThresholdRule.objects.create(vehicle=self.vehicle, overload_tolerance=500)
+        self.assertEqual(threshold_rules.rule_for(self.vehicle), vehicle_rule)
+
+        vehicle_rule.is_active = False
+        vehicle_rule.save()
+        self.assertEqual(threshold_rules.rule_for(self.vehicle), both_rule)
+
+    def test_rules_drive_reading_decisions_without_queries(self):
+        """Test readings are judged by the vehicle's rule, loaded once"""
+        ThresholdRule.objects.create(vehicle_class="heavy", overload_tolerance=1000, warning_margin=10,
+                                     overload_severity='high', warning_severity='low')
+        threshold_rules.rule_for(self.vehicle)
+        rate_history.rate_at(timezone.now())
+
+        pipeline = ReadingPipeline()
+        readings = [WeightReading(vehicle=self.vehicle, weight=weight) for weight in (4600, 5800, 6100)]
+        alerts = []
+        with self.assertNumQueries(0):
+            for reading in readings:
+                pipeline.apply_reading(self.vehicle, reading, alerts, [])
+
+        self.assertEqual([r.status for r in readings], ['valid', 'valid', 'suspected'])
+        self.assertEqual([(a.alert_type, a.severity) for a in alerts],
+                         [('weight_warning', 'low'), ('weight_warning', 'low'), ('overload', 'high')])
+
+
+class VectorizedRulesTestCase(TestCase):
+    def setUp(self):
+        self.vehicles = [
+            Vehicle.objects.create(
+                vehicle_name=f"Truck V{index}",
+                vehicle_id=f"TRK7{index}",
+                description="Transport Truck",
+                owner="John Doe",
+                max_allowed_weight=max_allowed,
+                vehicle_class=vehicle_class,
+                is_currently_overloaded=index % 2 == 0,
+            )
+            for index, (max_allowed, vehicle_class) in enumerate(
+                [(5000, "heavy"), (5000, ""), (12000, "heavy"), (7500.5, "light")]
+            )
+        ]
+        now = timezone.now()
+        ThresholdRule.objects.create(overload_tolerance=50, warning_margin=5)
+        ThresholdRule.objects.create(vehicle_class="heavy", overload_tolerance=1000, warning_margin=10,
+                                     overload_severity='high', warning_severity='low')
+        ThresholdRule.objects.create(vehicle=self.vehicles[3], overload_tolerance=0, warning_margin=0,
+                                     overload_severity='medium')
+        PenaltyRate.objects.create(amount=50000, effective_from=now - timezone.timedelta(days=30))
+        PenaltyRate.objects.create(amount=80000, effective_from=now - timezone.timedelta(minutes=30))
+        self.start = now - timezone.timedelta(hours=1)
+        # Drop anything cached from rows rolled back by earlier tests
+        threshold_rules.invalidate()
+        rate_history.invalidate()
+        self.addCleanup(threshold_rules.invalidate)
+        self.addCleanup(rate_history.invalidate)
+
+    def build_readings(self, seed, count=400):
+        """Readings on fresh copies of the vehicles, grouped per vehicle and in timestamp order"""
+        rng = random.Random(seed)
+        vehicles = Vehicle.objects.in_bulk([v.pk for v in self.vehicles])
+        readings = []
+        for index in range(count):
+            vehicle = vehicles[self.vehicles[index * len(self.vehicles) // count].pk]
+            rule = threshold_rules.rule_for(vehicle)
+            max_allowed = vehicle.max_allowed_weight
+            weight = rng.choice([
+                rng.uniform(0, max_allowed * 1.5),
+                max_allowed + rule.overload_tolerance,
+                max_allowed * (1 - rule.warning_margin / 100),
+                max_allowed,
+                0,
+            ])
+            readings.append(WeightReading(
+                vehicle=vehicle,
+                weight=weight,
+                latitude=-6.8,
+                longitude=39.28,
+                timestamp=self.start + timezone.timedelta(seconds=index * 10),
+                status=rng.choice(['valid', 'valid', 'suspected']),
+                sensor_health='malfunctioning' if rng.random() < 0.05 else 'healthy',
+            ))
+        return readings
+
+    def outcome(self, readings, alerts, penalties):
+        vehicles = {r.vehicle_id: r.vehicle for r in readings}
+        return {
+            'readings': [(r.status, r.overloaded) for r in readings],
+            'alerts': [(a.vehicle.pk, a.alert_type, a.severity, a.message, a.current_weight) for a in alerts],
+            'penalties': [(p.vehicle.pk, p.amount, p.overload_amount, p.timestamp) for p in penalties],
+            'vehicles': [
+                (v.pk, v.current_weight, v.latitude, v.longitude, v.is_currently_overloaded, v.weight_alert, v.status)
+                for v in vehicles.values()
+            ],
+        }
+
+    def test_batch_evaluation_matches_per_reading_path(self):
+        """Test the vectorized engine reaches exactly the per-reading decisions"""
+        pipeline = ReadingPipeline()
+        for seed in range(10):
+            expected_alerts, expected_penalties = [], []
+            readings = self.build_readings(seed)
+            for reading in readings:
+                pipeline.apply_reading(reading.vehicle, reading, expected_alerts, expected_penalties)
+            expected = self.outcome(readings, expected_alerts, expected_penalties)
+
+            alerts, penalties = [], []
+            readings = self.build_readings(seed)
+            pipeline.apply_batch(readings, alerts, penalties)
+
+            self.assertEqual(self.outcome(readings, alerts, penalties), expected, f"seed {seed}")
+            self.assertTrue(expected_penalties)
+
+    def test_large_batches_are_stored_the_same(self):
+        """Test a batch over the vectorize threshold stores the same penalties, alerts and state"""
+        readings = self.build_readings(seed=1, count=300)
+        self.assertGreaterEqual(len(readings), INGEST_CONFIG['VECTORIZE_MIN_BATCH'])
+        rng = random.Random(1)
+        rng.shuffle(readings)
+        ReadingPipeline().process_batch(readings)
+
+        expected_alerts, expected_penalties = [], []
+        replay = self.build_readings(seed=1, count=300)
+        pipeline = ReadingPipeline()
+        for reading in replay:
+            pipeline.apply_reading(reading.vehicle, reading, expected_alerts, expected_penalties)
+
+        self.assertEqual(Penalty.objects.count(), len(expected_penalties))
+        self.assertEqual(Alert.objects.count(), len(expected_alerts))
+        self.assertEqual(
+            sorted(WeightReading.objects.values_list('timestamp', 'status')),
+            sorted((r.timestamp, r.status) for r in replay)
+        )
+        for vehicle in Vehicle.objects.filter(pk__in=[v.pk for v in self.vehicles]):
+            replayed = next(r.vehicle for r in reversed(replay) if r.vehicle_id == vehicle.pk)
+            self.assertEqual(vehicle.is_currently_overloaded, replayed.is_currently_overloaded)
+            self.assertEqual(vehicle.current_weight, replayed.current_weight)
+
+    def test_benchmark_command(self):
+        """Test the rule engine benchmark runs both engines"""
+        out = io.StringIO()
+        call_command('benchmark_rule_engine', readings=2000, vehicles=20, repeat=1, stdout=out)
+        self.assertIn('per-reading', out.getvalue())
+        self.assertIn('Vectorized speedup', out.getvalue())
+
+
+class NotificationOutboxTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck N",
+            vehicle_id="TRK680",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+        self.alert = Alert.objects.create(
+            vehicle=self.vehicle,
+            message="Overload detected",
+            alert_type="overload",
+            severity="high",
+            location="Downtown",
+        )
+
+    def test_notify_queues_and_dispatcher_delivers(self):
+        """Test the notify endpoint returns at once and the alert is only notified once sent"""
+        response = self.client.post(f'/api/alerts/{self.alert.id}/notify/')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(mail.outbox), 0)
+        notification = AlertNotification.objects.get(pk=response.data['notification_id'])
+        self.assertEqual(notification.status, 'pending')
+        self.alert.refresh_from_db()
+        self.assertFalse(self.alert.notified)
+
+        call_command('dispatch_notifications', once=True, stdout=io.StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("TRK680", mail.outbox[0].subject)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.alert.refresh_from_db()
+        self.assertTrue(self.alert.notified)
+
+    def test_batch_is_sent_over_one_connection(self):
+        """Test a batch of notifications opens a single mail server connection"""
+        for index in range(3):
+            notifications.enqueue(self.alert, "Overload", "Body", recipients=[f"officer{index}@example.com"])
+        with mock.patch('monitoring.notifications.get_connection', wraps=get_connection) as connect:
+            self.assertEqual(notifications.dispatch(), (3, 3))
+        connect.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failed_sends_back_off_then_dead_letter(self):
+        """Test failures are retried with growing delays and dead-lettered when out of attempts"""
+        notification = notifications.enqueue_authority_alert(self.alert)
+        delays = []
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=smtplib.SMTPException("Mail server unavailable")):
+            for _ in range(NOTIFICATION_CONFIG['MAX_ATTEMPTS']):
+                started = timezone.now()
+                self.assertEqual(notifications.dispatch(), (1, 0))
+                notification.refresh_from_db()
+                if notification.status == 'pending':
+                    delays.append(round((notification.next_attempt_at - started).total_seconds()))
+                    # Nothing is due until the backoff has passed
+                    self.assertEqual(notifications.dispatch(), (0, 0))
+                    AlertNotification.objects.filter(pk=notification.pk).update(next_attempt_at=timezone.now())
+
+        self.assertEqual(notification.status, 'dead')
+        self.assertEqual(notification.attempts, NOTIFICATION_CONFIG['MAX_ATTEMPTS'])
+        self.assertIn("Mail server unavailable", notification.last_error)
+        self.assertEqual(delays, [notifications.retry_delay(n).total_seconds() for n in range(1, len(delays) + 1)])
+        self.assertEqual(delays, sorted(delays))
+        self.alert.refresh_from_db()
+        self.assertFalse(self.alert.notified)
+
+
+class StubMapHandler(http.server.BaseHTTPRequestHandler):
+    """Static map API stand-in: answers with a fake image, an error or too slowly"""
+    mode = 'ok'
+    requests = []
+
+    def do_GET(self):
+        StubMapHandler.requests.append(self.path)
+        if self.mode == 'slow':
+            time.sleep(1)
+        if self.mode == 'error':
+            self.send_response(503)
+            self.end_headers()
+            return
+        body = b'\xff\xd8 map ' + self.path.encode() + b' \xff\xd9'
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MapImageServiceTestCase(TestCase):
+    def setUp(self):
+        StubMapHandler.mode = 'ok'
+        StubMapHandler.requests = []
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StubMapHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def service(self, **options):
+        options.setdefault('timeout', (0.5, 0.3))
+        return maps.MapImageService(
+            url_template=f'http://127.0.0.1:{self.server.server_port}/map?key={{api_key}}&zoom={{zoom}}'
+                         f'&center={{latitude}},{{longitude}}',
+            api_key='test',
+            directory=self.directory,
+            **options
+        )
+
+    def test_nearby_locations_share_a_cached_image(self):
+        """Test locations that round to the same coordinates are fetched once"""
+        service = self.service()
+        first = service.image(-6.80012, 39.28031)
+        self.assertTrue(first.startswith(b'\xff\xd8'))
+        self.assertIn(b'center=-6.8,39.28', first)
+        self.assertEqual(service.image(-6.8031, 39.2768), first)
+        # The cache is on disk, so other processes share it
+        self.assertEqual(self.service().image(-6.8, 39.28), first)
+        self.assertEqual(len(StubMapHandler.requests), 1)
+
+    def test_least_recently_used_images_are_evicted(self):
+        """Test the cache stays under its size limit by dropping the images unused the longest"""
+        service = self.service()
+        image_size = len(service.image(1, 1))
+        service.image(2, 2)
+        service.max_cache_bytes = image_size * 2 + 1
+        for index, location in enumerate([(1, 1), (2, 2)]):
+            os.utime(service.path(*service.key(*location)), (index, index))
+        # (1, 1) was used longest ago, but is used again before (3, 3) is added
+        service.image(1, 1)
+        service.image(3, 3)
+
+        cached = sorted(os.listdir(self.directory))
+        self.assertEqual(cached, sorted(os.path.basename(service.path(*service.key(*location)))
+                                        for location in [(1, 1), (3, 3)]))
+
+    def test_unavailable_service_degrades_to_no_image(self):
+        """Test errors and timeouts return no image, and the service is left alone for a while"""
+        StubMapHandler.mode = 'error'
+        service = self.service()
+        self.assertIsNone(service.image(1, 1))
+        self.assertIsNone(service.image(2, 2))
+        self.assertEqual(len(StubMapHandler.requests), 1)
+
+        StubMapHandler.mode = 'slow'
+        service = self.service(failure_cooldown=0)
+        started = time.monotonic()
+        self.assertIsNone(service.image(1, 1))
+        self.assertLess(time.monotonic() - started, 1)
+        StubMapHandler.mode = 'ok'
+        self.assertIsNotNone(service.image(1, 1))
+
+    def test_notifications_attach_the_map_when_available(self):
+        """Test alert emails carry the cached map, or go out with the link only"""
+        vehicle = Vehicle.objects.create(vehicle_name="Truck M", vehicle_id="TRK791", max_allowed_weight=5000)
+        alert = Alert.objects.create(vehicle=vehicle, message="Overload detected", alert_type="overload",
+                                     severity="high", latitude=-6.8, longitude=39.28)
+        with mock.patch('monitoring.maps.map_service', return_value=self.service()):
+            notifications.enqueue(alert, "With map", "Body", attach_map=True)
+            notifications.dispatch()
+            StubMapHandler.mode = 'error'
+            Alert.objects.filter(pk=alert.pk).update(latitude=-3.37, longitude=36.68)
+            notifications.enqueue(alert, "Without map", "Body", attach_map=True)
+            notifications.dispatch()
+
+        self.assertEqual([(m.subject, len(m.attachments)) for m in mail.outbox], [("With map", 1), ("Without map", 0)])
+
+
+class StubGeocoder:
+    """Geocoding provider stand-in that names the location it is asked about"""
+    name = 'stub'
+
+    def __init__(self):
+        self.calls = []
+
+    def reverse(self, latitude, longitude):
+        self.calls.append((latitude, longitude))
+        return f"Place {latitude:.3f} {longitude:.3f}"
+
+
+class ReverseGeocodingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.provider = StubGeocoder()
+        self.geocoder = geocoding.Geocoder(self.provider, precision=2, cache_size=100)
+        previous, geocoding._geocoder = geocoding._geocoder, self.geocoder
+        self.addCleanup(setattr, geocoding, '_geocoder', previous)
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck G",
+            vehicle_id="TRK802",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+
+    def test_grid_cells_are_resolved_once(self):
+        """Test points in one grid cell share a lookup, remembered in memory and in the database"""
+        names = self.geocoder.place_names([(-6.8012, 39.2834), (-6.8049, 39.2801), (-3.3869, 36.6830)])
+        self.assertEqual(names[(-6.8012, 39.2834)], names[(-6.8049, 39.2801)])
+        self.assertEqual(names[(-6.8012, 39.2834)], "Place -6.805 39.285")
+        self.assertEqual(len(self.provider.calls), 2)
+        self.assertEqual(GeocodeCell.objects.count(), 2)
+
+        with self.assertNumQueries(0):
+            self.geocoder.place_name(-6.8001, 39.2899)
+        fresh = geocoding.Geocoder(self.provider, precision=2, cache_size=100)
+        self.assertEqual(fresh.place_name(-3.3851, 36.6812), "Place -3.385 36.685")
+        self.assertEqual(len(self.provider.calls), 2)
+
+    def test_batch_endpoint(self):
+        """Test the batch endpoint answers every point in order"""
+        points = [{'latitude': -6.8012, 'longitude': 39.2834}, {'latitude': None, 'longitude': 1},
+                  {'latitude': -6.8049, 'longitude': 39.2801}]
+        response = self.client.post('/api/geocode/', {'points': points}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        del points[1]
+        response = self.client.post('/api/geocode/', {'points': points}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['place_name'] for r in response.data['results']], ["Place -6.805 39.285"] * 2)
+        self.assertEqual(len(self.provider.calls), 1)
+
+    @mock.patch.dict(GEOCODING_CONFIG, {'LIVE_LOOKUPS': 2})
+    def test_batch_endpoint_caps_live_lookups(self):
+        """Test a batch of unknown cells only looks a few up and leaves the rest unnamed"""
+        points = [{'latitude': -6.8 + i, 'longitude': 39.28} for i in range(5)]
+        response = self.client.post('/api/geocode/', {'points': points}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self.provider.calls), 2)
+        self.assertEqual(sum(r['place_name'] is None for r in response.data['results']), 3)
+
+    def test_alerts_and_penalties_get_place_names(self):
+        """Test the backfill names alerts and penalties, and reports need no lookups"""
+        alert = Alert.objects.create(vehicle=self.vehicle, message="Overload detected", alert_type="overload",
+                                     severity="high", latitude=-6.8012, longitude=39.2834)
+        unnamed = Alert.objects.create(vehicle=self.vehicle, message="Overload detected", alert_type="overload",
+                                       severity="high", latitude=-6.8049, longitude=39.2801)
+        penalty = Penalty.objects.create(vehicle=self.vehicle, overload_amount=500, amount=50000,
+                                         timestamp=timezone.now(), latitude=-3.3869, longitude=36.6830)
+
+        call_command('geocode_locations', limit=1, stdout=io.StringIO())
+        alert.refresh_from_db()
+        unnamed.refresh_from_db()
+        penalty.refresh_from_db()
+        self.assertEqual(alert.place_name, "")
+        self.assertEqual(unnamed.place_name, "Place -6.805 39.285")
+        self.assertEqual(penalty.place_name, "Place -3.385 36.685")
+
+        calls = len(self.provider.calls)
+        response = self.client.get('/api/reports/summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({a['place_name'] for a in response.data['overload_alerts']}, {"Place -6.805 39.285"})
+        self.assertEqual(len(self.provider.calls), calls)
+
+
+class NotificationDigestTestCase(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck D",
+            vehicle_id="TRK913",
+            description="Transport Truck",
+            owner="John Doe",
+            max_allowed_weight=5000,
+        )
+
+    def alert(self, severity):
+        return Alert.objects.create(vehicle=self.vehicle, message="Overload detected", alert_type="overload",
+                                    severity=severity, current_weight=6000)
+
+    def open_window(self):
+        """Let the digest window of every waiting notification pass"""
+        AlertNotification.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+
+    def test_alerts_are_summarised_once_per_window(self):
+        """Test medium alerts wait for their window and then go out as one email per recipient list"""
+        alerts = [self.alert('medium') for _ in range(5)]
+        for alert in alerts:
+            notifications.enqueue_authority_alert(alert)
+        notifications.enqueue(alerts[0], "Overload", "Body", recipients=["officer@example.com"])
+        self.assertEqual(notifications.dispatch(), (0, 0))
+
+        AlertNotification.objects.filter(alert=alerts[0]).update(next_attempt_at=timezone.now())
+        self.assertEqual(notifications.dispatch(), (6, 6))
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(m for m in mail.outbox if m.to == EMAIL_CONFIG['AUTHORITY_EMAILS'])
+        self.assertIn("5 medium severity alerts", digest.subject)
+        self.assertEqual(digest.body.count("Alert Type: overload"), 5)
+        self.assertEqual(Alert.objects.filter(notified=True).count(), 5)
+
+    def test_high_severity_is_sent_at_once(self):
+        """Test high severity alerts skip the window and are sent as their own email"""
+        notifications.enqueue_authority_alert(self.alert('high'))
+        notifications.enqueue_authority_alert(self.alert('medium'))
+        self.assertEqual(notifications.dispatch(), (1, 1))
+        self.assertIn("Overload Alert for Vehicle TRK913", mail.outbox[0].subject)
+
+    def test_covered_alerts_are_not_queued_again(self):
+        """Test an alert waiting in a digest is not queued or summarised twice"""
+        alert = self.alert('medium')
+        first = notifications.enqueue_authority_alert(alert)
+        self.assertEqual(notifications.enqueue_authority_alert(alert), first)
+        self.assertEqual(AlertNotification.objects.count(), 1)
+
+        self.open_window()
+        notifications.dispatch()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertNotEqual(notifications.enqueue_authority_alert(alert), first)
+
+    def test_large_digests_are_split(self):
+        """Test a digest group over DIGEST_MAX_ALERTS alerts is sent as several emails"""
+        for _ in range(5):
+            notifications.enqueue_authority_alert(self.alert('low'))
+        self.open_window()
+        with mock.patch.dict(NOTIFICATION_CONFIG, DIGEST_MAX_ALERTS=2):
+            self.assertEqual(notifications.dispatch(), (5, 5))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_digest_leaves_retries_backing_off(self):
+        """Test a due digest does not pull in a notification of its group still waiting for a retry"""
+        retrying = notifications.enqueue_authority_alert(self.alert('medium'))
+        AlertNotification.objects.filter(pk=retrying.pk).update(
+            attempts=1, next_attempt_at=timezone.now() + timezone.timedelta(hours=1)
+        )
+        due = notifications.enqueue_authority_alert(self.alert('medium'))
+        AlertNotification.objects.filter(pk=due.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual([n.pk for n in notifications.claim_batch()], [due.pk])
+
+    def test_digest_groups_are_limited_separately(self):
+        """Test a busy digest group cannot crowd the others out of a claim"""
+        for _ in range(6):
+            notifications.enqueue_authority_alert(self.alert('low'))
+        for _ in range(2):
+            notifications.enqueue_authority_alert(self.alert('medium'))
+        AlertNotification.objects.filter(pk__in=[
+            AlertNotification.objects.filter(alert__severity=severity).earliest('id').pk for severity in ('low', 'medium')
+        ]).update(next_attempt_at=timezone.now())
+        with mock.patch.dict(NOTIFICATION_CONFIG, DIGEST_MAX_ALERTS=2):
+            claimed = notifications.claim_batch()
+        self.assertEqual(sorted(n.alert.severity for n in claimed), ['low'] * 3 + ['medium'] * 2)
+
+    def test_pipeline_alerts_are_queued_with_the_readings(self):
+        """Test overloads found by the reading pipeline are queued for the authorities"""
+        ReadingPipeline().process(WeightReading(vehicle=self.vehicle, weight=6000))
+        self.assertEqual(
+            list(AlertNotification.objects.values_list('alert__alert_type', flat=True)),
+            ['overload']
+        )
+
+
+class ConditionalGetTestCase(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck N", vehicle_id="TRK136", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=5000,
+        )
+        PenaltyRate.objects.create(id=1, amount=50000)
+
+    def test_unchanged_list_is_not_queried(self):
+        """Test a matching If-None-Match gets 304 without querying vehicles"""
+        response = self.client.get('/api/vehicles/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get('/api/vehicles/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        self.assertFalse([q for q in queries.captured_queries if 'monitoring_vehicle' in q['sql']])
+
+        modified_since = self.client.get('/api/vehicles/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(modified_since.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_replace_the_etag(self):
+        """Test vehicle edits and processed readings give the lists and details new ETags"""
+        vehicles = self.client.get('/api/vehicles/')['ETag']
+        detail = self.client.get(f'/api/vehicles/{self.vehicle.id}/')['ETag']
+        self.assertNotEqual(self.client.get('/api/vehicles/?page=1')['ETag'], vehicles)
+        alerts = self.client.get('/api/alerts/')['ETag']
+
+        self.client.patch(f'/api/vehicles/{self.vehicle.id}/', {'owner': 'Jane Doe'}, format='json')
+        response = self.client.get(f'/api/vehicles/{self.vehicle.id}/', HTTP_IF_NONE_MATCH=detail)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['owner'], 'Jane Doe')
+        self.assertNotEqual(self.client.get('/api/alerts/')['ETag'], alerts)
+
+        alerts = self.client.get('/api/alerts/')['ETag']
+        vehicles = self.client.get('/api/vehicles/')['ETag']
+        ReadingPipeline().process(WeightReading(vehicle=self.vehicle, weight=6000))
+        response = self.client.get('/api/alerts/', HTTP_IF_NONE_MATCH=alerts)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(self.client.get('/api/vehicles/', HTTP_IF_NONE_MATCH=vehicles).status_code, status.HTTP_200_OK)
+
+    def test_one_bump_per_transaction(self):
+        """Test a transaction changing many rows moves the counter once"""
+        other = Vehicle.objects.create(
+            vehicle_name="Truck O", vehicle_id="TRK137", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=5000,
+        )
+        before = resource_versions.current(['vehicles'])['vehicles'].version
+        ReadingPipeline().process_batch([
+            WeightReading(vehicle=self.vehicle, weight=4000),
+            WeightReading(vehicle=other, weight=4100),
+        ])
+        self.assertEqual(resource_versions.current(['vehicles'])['vehicles'].version, before + 1)
+
+    def test_counter_moves_with_the_change(self):
+        """Test the counter is incremented inside the writing transaction, not after it commits"""
+        before = resource_versions.current(['vehicles'])['vehicles'].version
+        with transaction.atomic():
+            self.vehicle.owner = 'Jane Doe'
+            self.vehicle.save()
+            self.assertEqual(resource_versions.current(['vehicles'])['vehicles'].version, before + 1)
+
+
+@mock.patch.dict(SYNC_CONFIG, {'SETTLE_SECONDS': 0})
+class DeltaSyncTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck P", vehicle_id="TRK138", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=5000,
+        )
+        self.other = Vehicle.objects.create(
+            vehicle_name="Truck Q", vehicle_id="TRK139", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=5000,
+        )
+        PenaltyRate.objects.create(id=1, amount=50000)
+
+    def sync(self, since, **params):
+        return self.client.get('/api/sync/', {'since': since, **params})
+
+    def test_returns_changes_after_cursor(self):
+        """Test a sync returns each changed object once, deletions, and a cursor with nothing after it"""
+        cursor = self.client.get('/api/sync/').data['cursor']
+        ReadingPipeline().process_batch([
+            WeightReading(vehicle=self.vehicle, weight=6000),
+            WeightReading(vehicle=self.vehicle, weight=6200),
+        ])
+        deleted = Alert.objects.filter(vehicle=self.vehicle).earliest('id')
+        deleted_id = deleted.id
+        deleted.delete()
+
+        response = self.sync(cursor)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual([v['id'] for v in response.data['vehicles']['changed']], [self.vehicle.id])
+        self.assertEqual(response.data['vehicles']['changed'][0]['current_weight'], 6200)
+        alert_ids = {a['id'] for a in response.data['alerts']['changed']}
+        self.assertEqual(alert_ids, set(Alert.objects.filter(vehicle=self.vehicle).values_list('id', flat=True)))
+        self.assertEqual(response.data['alerts']['deleted'], [deleted_id])
+        self.assertEqual(len(response.data['penalties']['changed']), Penalty.objects.count())
+
+        response = self.sync(response.data['cursor'])
+        self.assertFalse(response.data['vehicles']['changed'] or response.data['alerts']['changed'])
+
+    def test_limit_pages_through_changes(self):
+        """Test has_more is set while changes remain beyond the limit"""
+        cursor = self.client.get('/api/sync/').data['cursor']
+        self.vehicle.save()
+        self.other.save()
+
+        first = self.sync(cursor, limit=1)
+        self.assertTrue(first.data['has_more'])
+        second = self.sync(first.data['cursor'], limit=1)
+        self.assertFalse(second.data['has_more'])
+        self.assertEqual(
+            [first.data['vehicles']['changed'][0]['id'], second.data['vehicles']['changed'][0]['id']],
+            [self.vehicle.id, self.other.id]
+        )
+
+    def test_pipeline_logs_in_one_insert(self):
+        """Test a processed batch writes all its changes with a single insert"""
+        with CaptureQueriesContext(connection) as queries:
+            ReadingPipeline().process_batch([
+                WeightReading(vehicle=self.vehicle, weight=6000),
+                WeightReading(vehicle=self.other, weight=4000),
+            ])
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "monitoring_changelog"')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_unsettled_and_expired_cursors(self):
+        """Test recent changes wait for the settle time and pruned cursors get 410"""
+        cursor = self.client.get('/api/sync/').data['cursor']
+        self.vehicle.save()
+        with mock.patch.dict(SYNC_CONFIG, {'SETTLE_SECONDS': 60}):
+            response = self.sync(cursor)
+        self.assertEqual(response.data['cursor'], cursor)
+        self.assertFalse(response.data['vehicles']['changed'])
+
+        ChangeLog.objects.update(changed_at=timezone.now() - timezone.timedelta(days=60))
+        self.other.save()
+        call_command('prune_change_log', stdout=io.StringIO())
+        self.assertEqual(self.sync(cursor).status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.sync('soon').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.vehicle = Vehicle.objects.create(
+            vehicle_name="Truck R", vehicle_id="TRK140", description="Transport Truck",
+            owner="John Doe", max_allowed_weight=50000,
+        )
+        now = timezone.now()
+        # Pairs of readings share a timestamp, so pages have to split ties on id
+        WeightReading.objects.bulk_create([
+            WeightReading(vehicle=self.vehicle, weight=1000 + i, timestamp=now - timezone.timedelta(minutes=i // 2))
+            for i in range(25)
+        ])
+        self.expected = list(WeightReading.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+
+    def pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_walks_every_row_once(self):
+        """Test following next links returns every reading once, newest first"""
+        self.assertEqual(self.pages('/api/weights/?page_size=4'), self.expected)
+
+    def test_previous_returns_the_page_before(self):
+        """Test previous links page back to the same rows"""
+        first = self.client.get('/api/weights/?page_size=6')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual([r['id'] for r in back.data['results']], [r['id'] for r in first.data['results']])
+        self.assertIsNone(first.data['previous'])
+
+    def test_page_size_cap_and_count_opt_out(self):
+        """Test page sizes are capped and count=false skips the COUNT query"""
+        with mock.patch.dict(PAGINATION_CONFIG, {'MAX_PAGE_SIZE': 10}):
+            response = self.client.get('/api/weights/?page_size=500')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(response.data['count'], 25)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/weights/?count=false')
+        self.assertNotIn('count', response.data)
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT(' in q['sql']])
+        self.assertEqual(self.client.get('/api/weights/?cursor=bogus').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_penalties_keep_list_shape_unless_paged(self):
+        """Test the penalty list stays a plain list without paging parameters"""
+        now = timezone.now()
+        for minutes in range(5):
+            Penalty.objects.create(
+                vehicle=self.vehicle, amount=50000, overload_amount=100,
+                timestamp=now - timezone.timedelta(minutes=minutes)
+            )
+        self.assertEqual(len(self.client.get('/api/penalties/').data), 5)
+        response = self.client.get('/api/penalties/?page_size=2&count=false')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(len(self.pages('/api/penalties/?page_size=2')), 5)
+
+
+class SparseFieldsetTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(3):
+            vehicle = Vehicle.objects.create(
+                vehicle_name=f"Truck S{i}", vehicle_id=f"TRK15{i}", description="Transport Truck",
+                owner="John Doe", max_allowed_weight=5000,
+            )
+            Alert.objects.create(vehicle=vehicle, message="Overload detected", alert_type="overload", severity="high")
+
+    def alert_queries(self, queries):
+        return [q['sql'] for q in queries.captured_queries if 'FROM "monitoring_alert"' in q['sql']]
+
+    def test_alerts_embed_vehicle_summary_in_one_query(self):
+        """Test alerts embed a compact vehicle, joined in the alert query instead of one query each"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/alerts/?count=false')
+        self.assertEqual(len(response.data['results']), 3)
+        vehicle = response.data['results'][0]['vehicle']
+        self.assertEqual(set(vehicle), set(VehicleSummarySerializer.Meta.fields))
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('SELECT') and
+                          'FROM "monitoring_vehicle"' in q['sql']])
+        self.assertEqual(len(self.alert_queries(queries)), 1)
+
+        expanded = self.client.get('/api/alerts/?expand=vehicle').data['results'][0]['vehicle']
+        self.assertIn('description', expanded)
+        self.assertIn('vehicle_image', expanded)
+
+    def test_fields_limit_payload_and_columns(self):
+        """Test ?fields= returns only the listed fields and loads only their columns"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/alerts/?fields=id,severity&count=false')
+        self.assertEqual([set(alert) for alert in response.data['results']], [{'id', 'severity'}] * 3)
+        (sql,) = self.alert_queries(queries)
+        self.assertNotIn('"monitoring_alert"."message"', sql)
+        self.assertNotIn('"monitoring_vehicle"', sql)
+
+        readings = self.client.get('/api/weights/?fields=id,weight')
+        self.assertEqual(readings.status_code, status.HTTP_200_OK)
+
+    def test_writes_ignore_fields(self):
+        """Test ?fields= does not affect updates"""
+        alert = Alert.objects.first()
+        response = self.client.patch(f'/api/alerts/{alert.id}/?fields=id', {'severity': 'low'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['severity'], 'low')
+        self.assertIn('vehicle', response.data)
@@ -0,0 +1,74 @@
+"""
+Compiled threshold rules.
+
+Active `ThresholdRule` rows are loaded once and compiled into one dict per
+scope, so the rule for a vehicle is found with at most four dict lookups and
+no query per reading. Saving or deleting a rule clears the compiled rules of
+this process, and again when the change commits (see monitoring/signals.py);
+other processes reload after THRESHOLD_CONFIG['CACHE_SECONDS'].
+"""
+import threading
+import time
+
+from .config import THRESHOLD_CONFIG
+from .models import ThresholdRule
+
+
+class CompiledRules:
+
+    def __init__(self, rules):
+        self.by_vehicle = {}
+        self.by_class_and_axle = {}
+        self.by_class = {}
+        self.by_axle = {}
+        # Defaults from ALERT_CONFIG until a global rule is stored
+        self.default = ThresholdRule()
+
+        # Ordered by id, so a later rule for the same scope wins
+        for rule in rules:
+            if rule.vehicle_id:
+                self.by_vehicle[rule.vehicle_id] = rule
+            elif rule.vehicle_class and rule.axle_configuration:
+                self.by_class_and_axle[rule.vehicle_class, rule.axle_configuration] = rule
+            elif rule.vehicle_class:
+                self.by_class[rule.vehicle_class] = rule
+            elif rule.axle_configuration:
+                self.by_axle[rule.axle_configuration] = rule
+            else:
+                self.default = rule
+
+    def rule_for(self, vehicle):
+        return (
+            self.by_vehicle.get(vehicle.pk) or
+            self.by_class_and_axle.get((vehicle.vehicle_class, vehicle.axle_configuration)) or
+            self.by_class.get(vehicle.vehicle_class) or
+            self.by_axle.get(vehicle.axle_configuration) or
+            self.default
+        )
+
+
+class RuleCache:
+
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.compiled = None
+        self.loaded_at = 0.0
+
+    def load(self):
+        with self.lock:
+            if self.compiled is None or time.monotonic() - self.loaded_at > self.max_age:
+                self.compiled = CompiledRules(ThresholdRule.objects.filter(is_active=True).order_by('id'))
+                self.loaded_at = time.monotonic()
+            return self.compiled
+
+    def rule_for(self, vehicle):
+        """The threshold rule that applies to `vehicle`."""
+        return self.load().rule_for(vehicle)
+
+    def invalidate(self):
+        with self.lock:
+            self.compiled = None
+
+
+threshold_rules = RuleCache(THRESHOLD_CONFIG['CACHE_SECONDS'])
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     VehicleViewSet, WeightReadingViewSet, AlertViewSet,
     RegisterView, LoginView, UserView,
-    AlertFrequencyView, WeightTrendView, AlertNotificationView, ReportView,get_penalties,mark_as_paid,get_penalty_rate,mark_as_paid
+    AlertFrequencyView, WeightTrendView, AlertNotificationView, ReverseGeocodeView, ReportView, SyncView,get_penalties,mark_as_paid,get_penalty_rate,mark_as_paid
 )
 from django.conf import settings
 from django.conf.urls.static import static
@@ -27,7 +27,9 @@ urlpatterns = [
     path('api/penalties/rate/', get_penalty_rate),
     path('api/penalties/', get_penalties),
     path('api/penalties/<int:penalty_id>/mark-paid/', mark_as_paid, name='mark-penalty-paid'),
-    path('api/alerts/<int:pk>/notify/',AlertNotificationView.as_view(), name='notify')
+    path('api/alerts/<int:pk>/notify/',AlertNotificationView.as_view(), name='notify'),
+    path('api/geocode/', ReverseGeocodeView.as_view(), name='reverse-geocode'),
+    path('api/sync/', SyncView.as_view(), name='sync')
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,75 @@
+"""
+Vectorized evaluation of the reading rules for whole batches.
+
+`evaluate` makes the same decisions as `ReadingPipeline.apply_reading` does
+one reading at a time (overload, warning, sensor malfunction, penalty on the
+transition to overloaded, alert type and severity, reading status), but on
+NumPy arrays holding the whole batch. The readings of each vehicle must be
+contiguous and in timestamp order, so the previous state of a reading is the
+reading before it, or the vehicle's stored state for its first reading.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+NO_ALERT = 0
+WEIGHT_WARNING = 1
+OVERLOAD = 2
+SENSOR_MALFUNCTION = 3
+
+ALERT_TYPES = {
+    NO_ALERT: None,
+    WEIGHT_WARNING: 'weight_warning',
+    OVERLOAD: 'overload',
+    SENSOR_MALFUNCTION: 'sensor_malfunction',
+}
+
+Decisions = namedtuple('Decisions', [
+    'overloaded',     # bool, over max allowed weight plus the overload tolerance
+    'penalty',        # bool, first overloaded reading after a normal one
+    'suspected',      # bool, the reading is stored as suspected rather than valid
+    'weight_alert',   # bool, the vehicle's weight_alert flag after this reading
+    'alert',          # int, one of the alert codes above
+    'severity',       # str, severity of the alert ('' when there is none)
+])
+
+
+def evaluate(weights, max_allowed, overload_tolerances, warning_margins, malfunctioning,
+             reported_suspected, was_overloaded, first_of_vehicle, overload_severities,
+             warning_severities, malfunction_severity):
+    """
+    Decide the effects of a batch of readings. All arguments but
+    `malfunction_severity` are arrays with one entry per reading;
+    `was_overloaded` is only read for the first reading of each vehicle.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    max_allowed = np.asarray(max_allowed, dtype=np.float64)
+    malfunctioning = np.asarray(malfunctioning, dtype=bool)
+    first_of_vehicle = np.asarray(first_of_vehicle, dtype=bool)
+
+    overloaded = weights > max_allowed + np.asarray(overload_tolerances, dtype=np.float64)
+    warning = weights > max_allowed * (1 - np.asarray(warning_margins, dtype=np.float64) / 100)
+
+    previous = np.empty_like(overloaded)
+    previous[1:] = overloaded[:-1]
+    previous[first_of_vehicle] = np.asarray(was_overloaded, dtype=bool)[first_of_vehicle]
+
+    alert = np.select(
+        [malfunctioning, overloaded, warning],
+        [SENSOR_MALFUNCTION, OVERLOAD, WEIGHT_WARNING],
+        NO_ALERT
+    )
+    severity = np.select(
+        [alert == SENSOR_MALFUNCTION, alert == OVERLOAD, alert == WEIGHT_WARNING],
+        [malfunction_severity, np.asarray(overload_severities), np.asarray(warning_severities)],
+        ''
+    )
+
+    return Decisions(
+        overloaded=overloaded,
+        penalty=overloaded & ~previous,
+        suspected=malfunctioning | overloaded,
+        weight_alert=overloaded | malfunctioning | np.asarray(reported_suspected, dtype=bool),
+        alert=alert,
+        severity=severity,
+    )
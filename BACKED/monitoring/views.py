@@ -1,12 +1,20 @@
 import requests
-from django.db.models import Max
+from django.db.models import Max, Min, Sum
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import viewsets
-from .models import Vehicle, Alert, WeightReading, Report,Penalty, PenaltyRate
-from .serializers import VehicleSerializer, WeightReadingSerializer, AlertSerializer, ReportSerializer
-from django.core.mail import send_mail
-from django.core.mail import EmailMessage
+from .models import Vehicle, Alert, WeightReading, Report,Penalty, PenaltyRate, VehicleWeightRollup, FleetWeightRollup
+from .serializers import VehicleSerializer, WeightReadingSerializer, WeightReadingBatchItemSerializer, AlertSerializer, ReportSerializer
+from .pipeline import ReadingPipeline
+from . import archive, change_log, ingest_queue, notifications, resource_versions, rollups
+from .penalty_rates import rate_history
+from .thresholds import threshold_rules
+from .geocoding import geocoder
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from .pagination import KeysetPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -18,14 +26,14 @@ from rest_framework.decorators import authentication_classes
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from datetime import timedelta 
 from django.db.models import Count, Avg, Q
-from django.core.mail import send_mail
 from django.conf import settings
-from .config import EMAIL_CONFIG, API_KEYS, ALERT_CONFIG, MAP_CONFIG, REPORT_CONFIG, WEIGHT_READING_CONFIG
-from rest_framework.decorators import api_view, permission_classes
+from .config import API_KEYS, ALERT_CONFIG, MAP_CONFIG, REPORT_CONFIG, WEIGHT_READING_CONFIG, INGEST_CONFIG, ARCHIVE_CONFIG, GEOCODING_CONFIG, SYNC_CONFIG
+from rest_framework.decorators import api_view, permission_classes, action
 from datetime import datetime
 from rest_framework.decorators import api_view, permission_classes
 from django.db import transaction
 from django.conf import settings
+import hashlib
 import logging
 logger = logging.getLogger(__name__)
 
@@ -73,10 +81,69 @@ class LoginView(APIView):
         return Response({'error': 'Invalid Credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 
-class VehicleViewSet(viewsets.ModelViewSet):
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified on list and detail responses, derived from the
+    change counters of `version_resources` (see monitoring/resource_versions.py)
+    rather than from the response. Requests with a matching If-None-Match or
+    If-Modified-Since are answered with 304 before the queryset is touched.
+    """
+    version_resources = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(request, super().retrieve, *args, **kwargs)
+
+    def conditional(self, request, handler, *args, **kwargs):
+        # Read before the data, so a concurrent change can only make the tag older than the body
+        versions = resource_versions.current(self.version_resources)
+        etag, last_modified = self.validators(request, versions)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+            # Cached copies are revalidated on every use
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def validators(self, request, versions):
+        # The path and query string pick the page, the renderer the format
+        variant = '|'.join([
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            *(f'{resource}:{versions[resource].version}' for resource in self.version_resources)
+        ])
+        etag = quote_etag(hashlib.sha1(variant.encode()).hexdigest())
+        last_modified = max(int(version.changed_at.timestamp()) for version in versions.values())
+        return etag, last_modified
+
+
+class SparseQuerysetMixin:
+    """
+    Reads only what the response shows: GET querysets are cut down to the
+    columns and relations of the fields left after ?fields= and ?expand=
+    (see SparseFieldsMixin), plus any columns the paginator needs.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return queryset
+        required = getattr(self.paginator, 'required_fields', ())
+        return self.get_serializer().optimize_queryset(queryset, required)
+
+
+class VehicleViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
     pagination_class = PageNumberPagination
+    version_resources = ('vehicles',)
 
     def perform_create(self, serializer):
         instance = serializer.save()
@@ -84,22 +151,23 @@ class VehicleViewSet(viewsets.ModelViewSet):
 
     def check_weight_alert(self, vehicle):
         """Logic to check if the vehicle exceeds the weight limit."""
-        if vehicle.current_weight > vehicle.max_allowed_weight + ALERT_CONFIG['OVERLOAD_THRESHOLD']:
-            vehicle.weight_alert = True
-            vehicle.save()
+        if threshold_rules.rule_for(vehicle).is_overloaded(vehicle.current_weight, vehicle.max_allowed_weight):
+            with transaction.atomic():
+                vehicle.weight_alert = True
+                vehicle.save()
 
-            # Send alert to authorities
-            alert_message = f"Overload detected: {vehicle.vehicle_name} has exceeded the weight limit. Current weight: {vehicle.current_weight} kg."
-            vehicle_location = f"Latitude: {vehicle.latitude}, Longitude: {vehicle.longitude}"
-            alert = self.create_alert(vehicle, 'overload', alert_message, vehicle_location)
+                # Send alert to authorities
+                alert_message = f"Overload detected: {vehicle.vehicle_name} has exceeded the weight limit. Current weight: {vehicle.current_weight} kg."
+                vehicle_location = f"Latitude: {vehicle.latitude}, Longitude: {vehicle.longitude}"
+                alert = self.create_alert(vehicle, 'overload', alert_message, vehicle_location)
 
-            # Send alert to authorities
-            self.send_alert_to_authorities(alert)
+                # Queued with the alert, sent by the notification dispatcher
+                notifications.enqueue_authority_alert(alert)
 
-            # Generate map URL
-            map_url = self.generate_map_url(vehicle.latitude, vehicle.longitude)
-            alert.map_url = map_url
-            alert.save()
+                # Generate map URL
+                map_url = self.generate_map_url(vehicle.latitude, vehicle.longitude)
+                alert.map_url = map_url
+                alert.save()
 
     def create_alert(self, vehicle, alert_type, message, location):
         """Logic to create a new alert."""
@@ -110,33 +178,8 @@ class VehicleViewSet(viewsets.ModelViewSet):
             severity=ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL'],
             location=location  
         )
-        alert_timestamp = alert.timestamp.isoformat()
-        vehicle.alert_history.append({
-            'alert_type': alert_type,
-            'message': message,
-            'timestamp': alert_timestamp,
-            'severity': alert.severity,
-            'location': location
-        })
-        vehicle.save()
         return alert
 
-    def send_alert_to_authorities(self, alert):
-        """Send the alert to authorities."""
-        subject = f"{EMAIL_CONFIG['EMAIL_SUBJECT_PREFIX']}Overload Alert for Vehicle {alert.vehicle.vehicle_name}"
-        message = f"Alert Type: {alert.alert_type}\n" \
-                f"Message: {alert.message}\n" \
-                f"Vehicle Location: {alert.location}\n" \
-                f"Alert Severity: {alert.severity}"
-
-        # Send email to authorities
-        send_mail(
-            subject, 
-            message, 
-            EMAIL_CONFIG['DEFAULT_FROM_EMAIL'], 
-            EMAIL_CONFIG['AUTHORITY_EMAILS']
-        )
-
     def generate_map_url(self, latitude, longitude):
         """Generate a map URL for vehicle's current location."""
         return MAP_CONFIG['GOOGLE_MAPS_URL_FORMAT'].format(
@@ -144,287 +187,193 @@ class VehicleViewSet(viewsets.ModelViewSet):
             longitude=longitude
         )
 
-class WeightReadingViewSet(viewsets.ModelViewSet):
-    queryset = WeightReading.objects.all()
-    serializer_class = WeightReadingSerializer
-
-    def perform_create(self, serializer):
-        instance = serializer.save()
-        self.update_vehicle_data(instance)
-        self.validate_weight(instance)
-
-    def update_vehicle_data(self, weight_reading):
-        vehicle = weight_reading.vehicle
-
-        # Track previous state before updating
-        previous_state = {
-            'was_overloaded': vehicle.is_currently_overloaded,
-            'current_weight': vehicle.current_weight
-        }
-
-        vehicle.current_weight = weight_reading.weight
-        vehicle.last_reported_weight = weight_reading.weight
-        vehicle.latitude = weight_reading.latitude
-        vehicle.longitude = weight_reading.longitude
-        vehicle.last_reported_location = weight_reading.timestamp
-
-        self.update_average_weight(vehicle)
-
-        # Determine if currently overloaded
-        vehicle.is_currently_overloaded = (
-            weight_reading.weight > vehicle.max_allowed_weight + ALERT_CONFIG['OVERLOAD_THRESHOLD']
-        )
-
-        vehicle.weight_alert = (
-            vehicle.is_currently_overloaded or
-            weight_reading.status == 'suspected' or
-            weight_reading.sensor_health == 'malfunctioning'
-        )
-
-        vehicle.status = 'active'
-        vehicle.save()
-
-        # Check for state transition that warrants a penalty
-        self.check_for_penalty(vehicle, weight_reading, previous_state)
-
-    def check_for_penalty(self, vehicle, weight_reading, previous_state):
+    @action(detail=True, methods=['get'], url_path='alert-history')
+    def alert_history(self, request, pk=None):
         """
-        Check if we need to issue a penalty based on state transition:
-        - From normal to overloaded = new penalty
-        - From overloaded to normal = reset tracking
+        The vehicle's most recent alerts, newest first, read from Alert by
+        index. ?limit= caps the number returned (at most MAX_ALERT_HISTORY).
         """
-        current_weight = weight_reading.weight
-        max_allowed = vehicle.max_allowed_weight
-        overload_threshold = ALERT_CONFIG['OVERLOAD_THRESHOLD']
-        
-        # Check if transitioned from normal to overloaded
-        if (not previous_state['was_overloaded'] and 
-            current_weight > max_allowed + overload_threshold):
-            
-            # Create a new penalty
-            self.create_penalty(vehicle, weight_reading)
-            
-        # If returned to normal weight, we'll be ready for next penalty
-        elif (previous_state['was_overloaded'] and 
-              current_weight <= max_allowed):
-            
-            # Vehicle returned to normal state - no action needed
-            pass
-
-    def create_penalty(self, vehicle, weight_reading):
-        """Create a new penalty record for the vehicle"""
-        from .models import Penalty, PenaltyRate  # Avoid circular imports
-        
+        vehicle = self.get_object()
         try:
-            with transaction.atomic():
-                # Get the current penalty rate
-                rate = PenaltyRate.objects.get(id=1)
-                
-                # Calculate overload amount
-                overload_amount = weight_reading.weight - vehicle.max_allowed_weight
-                
-                # Create the penalty
-                Penalty.objects.create(
-                    vehicle=vehicle,
-                    overload_amount=overload_amount,
-                    amount=rate.amount,
-                    timestamp=weight_reading.timestamp,
-                    latitude=weight_reading.latitude,
-                    longitude=weight_reading.longitude,
-                    paid=False
-                )
-                
-                # Create an alert about the penalty
-                self.create_penalty_alert(vehicle, weight_reading, rate.amount)
-                
-        except Exception as e:
-            # Log the error but don't fail the weight reading
-            logger.error(f"Failed to create penalty: {str(e)}")
-
-    def create_penalty_alert(self, vehicle, weight_reading, penalty_amount):
-        """Create an alert about the penalty that was issued"""
-        location = f"Latitude: {weight_reading.latitude}, Longitude: {weight_reading.longitude}"
-        map_url = self.generate_map_url(weight_reading.latitude, weight_reading.longitude)
-        
-        message = (
-            f"New penalty issued: {penalty_amount:,} TZS for overload violation. "
-            f"Current weight: {weight_reading.weight:,} kg "
-            f"(Max allowed: {vehicle.max_allowed_weight:,} kg) "
-            f"for {vehicle.vehicle_name}"
-        )
-
-        alert = self.create_alert(
-            vehicle,
-            'penalty_issued',
-            message,
-            weight_reading.weight,
-            weight_reading.latitude,
-            weight_reading.longitude,
-            location,
-            map_url,
-            severity=ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL']
-        )
-        
-        # Send notification to authorities
-        # self.send_alert_to_authorities(alert, weight_reading.latitude, weight_reading.longitude)
-
-    def update_average_weight(self, vehicle):
-        recent_readings = WeightReading.objects.filter(
-            vehicle=vehicle,
-            timestamp__gte=timezone.now() - timedelta(days=WEIGHT_READING_CONFIG['VALID_READING_DAYS']),
-            status='valid',
-            sensor_health='healthy'
-        ).exclude(weight=0).order_by('-timestamp')[:WEIGHT_READING_CONFIG['MAX_READINGS_FOR_AVERAGE']]
-
-        if recent_readings.exists():
-            total_weight = sum(r.weight for r in recent_readings)
-            vehicle.average_weight = total_weight / len(recent_readings)
-        else:
-            vehicle.average_weight = None
-
-    def validate_weight(self, weight_reading):
-        vehicle = weight_reading.vehicle
-        max_allowed = vehicle.max_allowed_weight
-
-        if weight_reading.sensor_health == 'malfunctioning':
-            weight_reading.status = 'suspected'
-            self.create_sensor_malfunction_alert(weight_reading)
-        elif weight_reading.weight > max_allowed + ALERT_CONFIG['OVERLOAD_THRESHOLD']:
-            weight_reading.status = 'suspected'
-            self.create_overload_alert(weight_reading)
-        elif weight_reading.weight > max_allowed:
-            weight_reading.status = 'valid'
-            self.create_warning_notification(weight_reading)
-        else:
-            weight_reading.status = 'valid'
+            limit = min(int(request.query_params.get('limit', REPORT_CONFIG['MAX_ALERT_HISTORY'])),
+                        REPORT_CONFIG['MAX_ALERT_HISTORY'])
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
 
-        weight_reading.save()
+        alerts = Alert.objects.filter(vehicle=vehicle).order_by('-id').values(
+            'id', 'alert_type', 'message', 'timestamp', 'severity', 'location', 'map_url'
+        )[:max(limit, 0)]
+        return Response(list(alerts))
 
-    def create_overload_alert(self, weight_reading):
-        location = f"Latitude: {weight_reading.latitude}, Longitude: {weight_reading.longitude}"
-        map_url = self.generate_map_url(weight_reading.latitude, weight_reading.longitude)
-        message = (
-            f"Suspected overload: {weight_reading.weight} kg "
-            f"(Max allowed: {weight_reading.vehicle.max_allowed_weight} kg) "
-            f"for {weight_reading.vehicle.vehicle_name}"
-        )
+class WeightReadingViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
+    queryset = WeightReading.objects.all()
+    serializer_class = WeightReadingSerializer
+    pagination_class = KeysetPagination
 
-        alert = self.create_alert(
-            weight_reading.vehicle,
-            'overload',
-            message,
-            weight_reading.weight,
-            weight_reading.latitude,
-            weight_reading.longitude,
-            location,
-            map_url
-        )
-        # self.send_alert_to_authorities(alert, weight_reading.latitude, weight_reading.longitude)
-
-    def create_sensor_malfunction_alert(self, weight_reading):
-        location = f"Latitude: {weight_reading.latitude}, Longitude: {weight_reading.longitude}"
-        map_url = self.generate_map_url(weight_reading.latitude, weight_reading.longitude)
-        message = (
-            f"Sensor malfunction detected for {weight_reading.vehicle.vehicle_name}. "
-            f"Reported weight: {weight_reading.weight} kg"
-        )
+    def create(self, request, *args, **kwargs):
+        data = request.data
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key and hasattr(data, 'copy'):
+            data = data.copy()
+            data.setdefault('idempotency_key', idempotency_key)
 
-        self.create_alert(
-            weight_reading.vehicle,
-            'sensor_malfunction',
-            message,
-            weight_reading.weight,
-            weight_reading.latitude,
-            weight_reading.longitude,
-            location,
-            map_url
-        )
+        serializer = self.get_serializer(data=data)
+        serializer.is_valid(raise_exception=True)
 
-    def create_warning_notification(self, weight_reading):
-        location = f"Latitude: {weight_reading.latitude}, Longitude: {weight_reading.longitude}"
-        map_url = self.generate_map_url(weight_reading.latitude, weight_reading.longitude)
-        message = (
-            f"Vehicle approaching max weight: {weight_reading.weight} kg "
-            f"(Max allowed: {weight_reading.vehicle.max_allowed_weight} kg) "
-            f"for {weight_reading.vehicle.vehicle_name}"
-        )
+        # The pipeline inserts the reading once, with its final status
+        reading = ReadingPipeline().process(WeightReading(**serializer.validated_data))
+        if reading.duplicate_of:
+            return Response({'duplicate': True, 'id': reading.duplicate_of}, status=status.HTTP_200_OK)
 
-        self.create_alert(
-            weight_reading.vehicle,
-            'weight_warning',
-            message,
-            weight_reading.weight,
-            weight_reading.latitude,
-            weight_reading.longitude,
-            location,
-            map_url,
-            severity=ALERT_CONFIG['WARNING_SEVERITY_LEVEL']
-        )
+        serializer.instance = reading
+        headers = self.get_success_headers(serializer.data)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
-    def create_alert(self, vehicle, alert_type, message, current_weight, latitude, longitude, location, map_url, severity=ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL']):
-        alert = Alert.objects.create(
-            vehicle=vehicle,
-            message=message,
-            alert_type=alert_type,
-            severity=severity,
-            latitude=latitude,
-            longitude=longitude,
-            current_weight=current_weight,
-            location=location,
-            map_url=map_url
-        )
-
-        alert_entry = {
-            'alert_type': alert_type,
-            'message': message,
-            'timestamp': alert.timestamp.isoformat(),
-            'severity': severity,
-            'location': location,
-            'map_url': map_url
-        }
-
-        vehicle.alert_history = [alert_entry] + vehicle.alert_history[:REPORT_CONFIG['MAX_ALERT_HISTORY']-1]
-        vehicle.save()
-
-        return alert
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Ingest many readings in one request. Accepts a list of readings (or
+        {"readings": [...]}) and reports the outcome of every item by index.
+        """
+        items = request.data.get('readings') if isinstance(request.data, dict) else request.data
+        error = self.check_batch(items)
+        if error:
+            return error
+
+        valid, results = WeightReadingBatchItemSerializer.validate_batch(items)
+        readings = [(index, WeightReading(**data)) for index, data in valid]
+        ReadingPipeline().process_batch([reading for _, reading in readings])
+
+        created = 0
+        for index, reading in readings:
+            if reading.duplicate_of:
+                results.append({'index': index, 'status': 'duplicate', 'id': reading.duplicate_of})
+                continue
+            created += 1
+            results.append({
+                'index': index,
+                'status': 'created',
+                'id': reading.id,
+                'reading_status': reading.status
+            })
+        results.sort(key=lambda result: result['index'])
 
-    def send_alert_to_authorities(self, alert, lat, long):
-        subject = f"{EMAIL_CONFIG['EMAIL_SUBJECT_PREFIX']}Overload Alert for Vehicle {alert.vehicle.vehicle_name}"
+        return Response({
+            'created': created,
+            'duplicates': len(readings) - created,
+            'failed': len(items) - len(readings),
+            'results': results
+        }, status=status.HTTP_201_CREATED if readings else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def enqueue(self, request):
+        """
+        Accept one reading or a list of readings for asynchronous processing.
+        Readings are validated and queued, then processed by the ingest
+        workers (`manage.py run_ingest_workers`).
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items['readings'] if 'readings' in items else [items]
+        error = self.check_batch(items)
+        if error:
+            return error
 
-        tomtom_api_key = API_KEYS['TOMTOM_API_KEY']
-        static_map_url = MAP_CONFIG['TOMTOM_STATIC_MAP_URL'].format(
-            api_key=tomtom_api_key,
-            latitude=lat,
-            longitude=long
-        )
+        valid, results = WeightReadingBatchItemSerializer.validate_batch(items)
+        queued = ingest_queue.enqueue([data for _, data in valid])
 
-        response = requests.get(static_map_url)
-        map_image = response.content if response.status_code == 200 else None
+        for (index, _), item in zip(valid, queued):
+            results.append({'index': index, 'status': 'queued', 'id': item.id})
+        results.sort(key=lambda result: result['index'])
 
-        google_maps_url = MAP_CONFIG['GOOGLE_MAPS_URL_FORMAT'].format(
-            latitude=lat,
-            longitude=long
-        )
-        
-        message = (
-            f"Alert Type: {alert.alert_type}\n"
-            f"Message: {alert.message}\n"
-            f"Alert Severity: {alert.severity}\n"
-            f"Click this link to check the vehicle on Google Maps: {google_maps_url}\n"
-            f"VEHICLE LOCATION:"
-        )
+        return Response({
+            'queued': len(queued),
+            'failed': len(items) - len(queued),
+            'results': results
+        }, status=status.HTTP_202_ACCEPTED if queued else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def queue(self, request):
+        """Depth and lag of the asynchronous ingest queue."""
+        return Response(ingest_queue.queue_stats())
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Readings of one vehicle over a time range, oldest first:
+        ?vehicle=<id>&start=<date or datetime>&end=<date or datetime>.
+        Archived readings are read back from the archive when the range
+        reaches past the hot window. Defaults to the last 7 days.
+        """
+        try:
+            vehicle_id = int(request.query_params.get('vehicle', ''))
+        except ValueError:
+            return Response({'error': 'A vehicle id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        email = EmailMessage(
-            subject,
-            message,
-            EMAIL_CONFIG['DEFAULT_FROM_EMAIL'],
-            EMAIL_CONFIG['AUTHORITY_EMAILS'],
-        )
+        start = self.parse_time(request.query_params.get('start'))
+        end = self.parse_time(request.query_params.get('end'))
+        if start is False or end is False:
+            return Response(
+                {'error': 'Invalid date format. Use YYYY-MM-DD or an ISO 8601 datetime.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        end = end or timezone.now()
+        start = start or end - timedelta(days=7)
+        if start >= end:
+            return Response({'error': 'start must be before end'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = ARCHIVE_CONFIG['MAX_HISTORY_RESULTS']
+
+        rows = {row['id']: row for row in archive.read_range(vehicle_id, start, end)}
+        archived = len(rows)
+        hot = WeightReading.objects.filter(
+            vehicle_id=vehicle_id,
+            timestamp__gte=start,
+            timestamp__lt=end
+        ).order_by('timestamp', 'id').values(*archive.FIELDS)[:limit + 1]
+        for row in hot:
+            rows[row['id']] = row
+
+        results = sorted(rows.values(), key=lambda row: (row['timestamp'], row['id']))[:limit]
+        for row in results:
+            row['vehicle'] = vehicle_id
+        return Response({
+            'vehicle': vehicle_id,
+            'start': start,
+            'end': end,
+            'count': len(results),
+            'archived': archived,
+            'truncated': len(rows) > limit,
+            'results': results
+        })
 
-        if map_image:
-            email.attach('map_image.jpg', map_image, 'image/jpeg')
+    @staticmethod
+    def parse_time(value):
+        """Parse a date or datetime query parameter; None when absent, False when invalid."""
+        if not value:
+            return None
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                day = parse_date(value)
+                if day is None:
+                    return False
+                parsed = datetime.combine(day, datetime.min.time())
+        except ValueError:
+            return False
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
 
-        email.send()
+    def check_batch(self, items):
+        if not isinstance(items, list):
+            return Response(
+                {'error': 'Expected a list of readings'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > INGEST_CONFIG['MAX_BATCH_SIZE']:
+            return Response(
+                {'error': f"A batch may contain at most {INGEST_CONFIG['MAX_BATCH_SIZE']} readings"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return None
 
     def generate_map_url(self, latitude, longitude):
         return MAP_CONFIG['GOOGLE_MAPS_URL_FORMAT'].format(
@@ -432,21 +381,24 @@ class WeightReadingViewSet(viewsets.ModelViewSet):
             longitude=longitude
         )
     
-class AlertViewSet(viewsets.ModelViewSet):
+class AlertViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ModelViewSet):
     queryset = Alert.objects.all()
     serializer_class = AlertSerializer
+    pagination_class = KeysetPagination
+    # Alerts embed their vehicle
+    version_resources = ('alerts', 'vehicles')
 
     def perform_update(self, serializer):
         instance = serializer.save()
         self.resolve_alert(instance)
 
     def get_queryset(self):
-        # Get only the latest alert for each vehicle
-        return Alert.objects.filter(
-            pk__in=Alert.objects.values('vehicle')
-                .annotate(latest=Max('id'))
-                .values_list('latest', flat=True)
-        ).order_by('-timestamp')
+        # Get only the latest alert for each vehicle, through the CurrentAlert
+        # pointers, so the cost does not depend on the alert history. The
+        # vehicle is joined when the response shows it (SparseQuerysetMixin)
+        return super().get_queryset().filter(
+            current_for__isnull=False
+        ).order_by('-timestamp', '-id')
 
     def resolve_alert(self, alert):
         """Logic to resolve an alert."""
@@ -509,11 +461,13 @@ class ReportView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Whole days as half-open timestamp ranges, which unlike a lookup on
+        # the date part can use the timestamp indexes
         filters = {}
         if start_date:
-            filters['timestamp__date__gte'] = start_date
+            filters['timestamp__gte'] = self.day_start(start_date)
         if end_date:
-            filters['timestamp__date__lte'] = end_date
+            filters['timestamp__lt'] = self.day_start(end_date + timedelta(days=1))
 
         # Get alert counts
         critical_alerts = Alert.objects.filter(
@@ -527,13 +481,13 @@ class ReportView(APIView):
         ).count()
 
         # Get normal vehicles (no critical/warning alerts)
-        alerted_vehicles = Vehicle.objects.filter(
-            Q(alerts__severity=ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL'], **filters) |
-            Q(alerts__severity=ALERT_CONFIG['WARNING_SEVERITY_LEVEL'], **filters)
-        ).distinct()
+        alerted_vehicles = Alert.objects.filter(
+            severity__in=[ALERT_CONFIG['CRITICAL_SEVERITY_LEVEL'], ALERT_CONFIG['WARNING_SEVERITY_LEVEL']],
+            **filters
+        ).values('vehicle_id')
 
         normal_vehicles = Vehicle.objects.exclude(
-            id__in=alerted_vehicles.values('id')
+            id__in=alerted_vehicles
         ).count()
 
         # Get overload alerts with vehicle details
@@ -542,10 +496,36 @@ class ReportView(APIView):
             **filters
         ).select_related('vehicle').order_by('-timestamp')[:50]
 
+        # Place names not filled in yet are taken from the geocoding cache,
+        # never looked up while the report is requested
+        unnamed = [(a.latitude, a.longitude) for a in overload_alerts if not a.place_name]
+        place_names = geocoder().place_names(unnamed, resolve=False) if unnamed else {}
+
+        # Reading statistics come from the daily fleet rollups
+        day_rollups = FleetWeightRollup.objects.filter(resolution='day')
+        if start_date:
+            day_rollups = day_rollups.filter(bucket_start__gte=filters['timestamp__gte'])
+        if end_date:
+            day_rollups = day_rollups.filter(bucket_start__lt=filters['timestamp__lt'])
+        weights = day_rollups.aggregate(
+            readings=Sum('count'),
+            total=Sum('total'),
+            min_weight=Min('min_weight'),
+            max_weight=Max('max_weight'),
+            overloads=Sum('overload_count')
+        )
+
         return Response({
             'critical_alerts': critical_alerts,
             'warning_alerts': warning_alerts,
             'normal_vehicles': normal_vehicles,
+            'weight_summary': {
+                'readings': weights['readings'] or 0,
+                'average_weight': round(weights['total'] / weights['readings'], 2) if weights['readings'] else 0,
+                'min_weight': weights['min_weight'],
+                'max_weight': weights['max_weight'],
+                'overload_readings': weights['overloads'] or 0
+            },
             'overload_alerts': [
                 {
                     'id': alert.id,
@@ -560,6 +540,7 @@ class ReportView(APIView):
                     'timestamp': alert.timestamp,
                     'latitude': alert.latitude,
                     'longitude': alert.longitude,
+                    'place_name': alert.place_name or place_names.get((alert.latitude, alert.longitude)),
                     'severity': alert.severity,
                     'alert_type': alert.alert_type
                 }
@@ -568,6 +549,10 @@ class ReportView(APIView):
         })
 
 
+    @staticmethod
+    def day_start(day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
 class AlertFrequencyView(APIView):
     def get(self, request):
         # Get alert frequency for last 6 months
@@ -625,118 +610,132 @@ class AlertFrequencyView(APIView):
 
 
 class WeightTrendView(APIView):
+    """
+    Weight trends read from the rollups, so the cost does not grow with the
+    number of readings. ?resolution=hour (default) covers every hour of the
+    current day, minute the last hour and day the last 30 days. ?vehicle=<id>
+    shows a single vehicle instead of the whole fleet.
+    """
+    WINDOWS = {
+        'minute': (timedelta(minutes=1), 60),
+        'hour': (timedelta(hours=1), 24),
+        'day': (timedelta(days=1), 30),
+    }
+
     def get(self, request):
-        # Get weight trends for the current day
-        today = timezone.now().date()
-        
-        # Group by hour
-        readings = WeightReading.objects.filter(
-            timestamp__date=today,
-            status='valid',
-            sensor_health='healthy'
-        ).extra({
-            'hour': "EXTRACT(HOUR FROM timestamp)"
-        }).values('hour').annotate(
-            avg_weight=Avg('weight')
-        ).order_by('hour')
+        resolution = request.query_params.get('resolution', 'hour')
+        if resolution not in self.WINDOWS:
+            return Response(
+                {"error": f"Invalid resolution. Use one of: {', '.join(self.WINDOWS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        step, buckets = self.WINDOWS[resolution]
 
-        # Prepare data for chart
-        times = ['6AM', '9AM', '12PM', '3PM', '6PM', '9PM']
-        hours = [6, 9, 12, 15, 18, 21]
-        avg_weights = [0] * len(hours)
-        
-        # Fill with actual data
-        for reading in readings:
-            hour = int(reading['hour'])
-            if hour in hours:
-                index = hours.index(hour)
-                avg_weights[index] = round(reading['avg_weight'], 2)
+        now = timezone.now()
+        if resolution == 'hour':
+            start = rollups.bucket_start(now, 'day')
+        else:
+            start = rollups.bucket_start(now, resolution) - step * (buckets - 1)
+
+        queryset = FleetWeightRollup.objects.all()
+        vehicle = request.query_params.get('vehicle')
+        if vehicle:
+            try:
+                queryset = VehicleWeightRollup.objects.filter(vehicle_id=int(vehicle))
+            except ValueError:
+                return Response({"error": "Invalid vehicle id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        found = {
+            rollup.bucket_start: rollup
+            for rollup in queryset.filter(
+                resolution=resolution,
+                bucket_start__gte=start,
+                bucket_start__lt=start + step * buckets
+            )
+        }
+
+        times, avg_weights, counts, min_weights, max_weights, overloads = [], [], [], [], [], []
+        for index in range(buckets):
+            bucket = start + step * index
+            rollup = found.get(bucket)
+            times.append(self.label(bucket, resolution))
+            avg_weights.append(round(rollup.average, 2) if rollup else 0)
+            counts.append(rollup.count if rollup else 0)
+            min_weights.append(rollup.min_weight if rollup else None)
+            max_weights.append(rollup.max_weight if rollup else None)
+            overloads.append(rollup.overload_count if rollup else 0)
 
         return Response({
+            'resolution': resolution,
             'times': times,
-            'average_weights': avg_weights
+            'average_weights': avg_weights,
+            'counts': counts,
+            'min_weights': min_weights,
+            'max_weights': max_weights,
+            'overload_counts': overloads
         })
 
+    @staticmethod
+    def label(bucket, resolution):
+        if resolution == 'minute':
+            return bucket.strftime('%H:%M')
+        if resolution == 'hour':
+            return f"{bucket.hour % 12 or 12}{'AM' if bucket.hour < 12 else 'PM'}"
+        return bucket.strftime('%b %d')
+
 
 class AlertNotificationView(APIView):
     def post(self, request, pk):
+        """
+        Queue an email about the alert to the authorities and return at once;
+        the notification dispatcher sends it and marks the alert notified.
+        """
         try:
-            alert = Alert.objects.get(pk=pk)
-            vehicle = alert.vehicle
-            
-            # Send email notification
-            subject = f"{EMAIL_CONFIG['EMAIL_SUBJECT_PREFIX']}Overload Alert for Vehicle {vehicle.vehicle_id}"
-            message = (
-                f"Alert Type: {alert.alert_type}\n"
-                f"Vehicle: {vehicle.vehicle_name} ({vehicle.vehicle_id})\n"
-                f"Current Weight: {alert.current_weight} kg\n"
-                f"Max Allowed: {vehicle.max_allowed_weight} kg\n"
-                f"Location: {alert.location}\n"
-                f"Time: {alert.timestamp}\n\n"
-                f"Message: {alert.message}"
-            )
-            
-            send_mail(
-                subject,
-                message,
-                EMAIL_CONFIG['DEFAULT_FROM_EMAIL'],
-                EMAIL_CONFIG['AUTHORITY_EMAILS'],
-                fail_silently=False,
-            )
-            
-            # Update alert to mark as notified
-            alert.notified = True
-            alert.save()
-            
-            return Response({
-                'status': 'success',
-                'message': 'Notification sent successfully'
-            })
-            
+            alert = Alert.objects.select_related('vehicle').get(pk=pk)
         except Alert.DoesNotExist:
             return Response(
                 {'error': 'Alert not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Exception as e:
+
+        notification = notifications.enqueue_authority_alert(alert)
+        return Response({
+            'status': 'queued',
+            'message': 'Notification queued for delivery',
+            'notification_id': notification.id
+        }, status=status.HTTP_202_ACCEPTED)
+        
+class ReverseGeocodeView(APIView):
+    def post(self, request):
+        """
+        Place names for a batch of coordinates:
+        {"points": [{"latitude": -6.8, "longitude": 39.28}, ...]}. Points in
+        the same grid cell share one lookup, and cells resolved before need none.
+        The provider allows one lookup a second, so only LIVE_LOOKUPS unknown
+        cells are looked up per request; the other points get a null place
+        name until a later request or `geocode_locations` resolves them.
+        """
+        points = request.data.get('points')
+        if not isinstance(points, list):
+            return Response({'error': 'Expected a list of points'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(points) > GEOCODING_CONFIG['MAX_BATCH']:
             return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': f"A batch may contain at most {GEOCODING_CONFIG['MAX_BATCH']} points"},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        
-# views.py
+        try:
+            coordinates = [(float(point['latitude']), float(point['longitude'])) for point in points]
+        except (KeyError, TypeError, ValueError):
+            return Response({'error': 'Every point needs a numeric latitude and longitude'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if any(not (-90 <= lat <= 90 and -180 <= lon <= 180) for lat, lon in coordinates):
+            return Response({'error': 'Coordinates out of range'}, status=status.HTTP_400_BAD_REQUEST)
 
+        names = geocoder().place_names(coordinates, max_lookups=GEOCODING_CONFIG['LIVE_LOOKUPS'])
+        return Response({'results': [
+            {'latitude': lat, 'longitude': lon, 'place_name': names[(lat, lon)]} for lat, lon in coordinates
+        ]})
 
-# Get penalties within date range
-# @api_view(['GET'])
-# @permission_classes([IsAuthenticated])
-# def get_penalties(request):
-#     start_date = request.GET.get('start_date')
-#     end_date = request.GET.get('end_date')
-    
-#     try:
-#         start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
-#         end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
-        
-#         penalties = Penalty.objects.all()
-        
-#         if start:
-#             penalties = penalties.filter(timestamp__gte=start)
-#         if end:
-#             penalties = penalties.filter(timestamp__lte=end)
-            
-#         data = [{
-#             'id': p.id,
-#             'vehicle_id': p.vehicle.vehicle_id,
-#             'overload_amount': p.overload_amount,
-#             'timestamp': p.timestamp,
-#             'amount': p.amount,
-#             'paid': p.paid
-#         } for p in penalties]
-        
-#         return Response(data)
-#     except Exception as e:
-#         return Response({'error': str(e)}, status=400)
 
 # Get current penalty rate
 @api_view(['GET'])
@@ -746,7 +745,9 @@ def get_penalty_rate(request):
     Get current penalty rate
     """
     try:
-        rate = PenaltyRate.objects.latest('effective_from')
+        rate = rate_history.rate_at(timezone.now())
+        if rate is None:
+            raise PenaltyRate.DoesNotExist
         return Response({
             'rate': rate.amount,
             'effective_from': rate.effective_from,
@@ -795,6 +796,78 @@ def update_penalty_rate(request):
             'error': 'Failed to update penalty rate'
         }, status=500)
 
+
+def penalty_data(p):
+    return {
+        'id': p.id,
+        'vehicle': {
+            'id': p.vehicle.id,
+            'vehicle_id': p.vehicle.vehicle_id,
+            'owner': p.vehicle.owner,
+            'vehicle_name': p.vehicle.vehicle_name
+        },
+        'overload_amount': float(p.overload_amount),
+        'timestamp': p.timestamp,
+        'amount': float(p.amount),
+        'paid': p.paid,
+        'status': p.status,
+        'location': {
+            'latitude': float(p.latitude) if p.latitude else None,
+            'longitude': float(p.longitude) if p.longitude else None,
+            'place_name': p.place_name
+        },
+        'paid_date': p.paid_date,
+        'reference_number': p.reference_number
+    }
+
+
+class SyncView(APIView):
+    def get(self, request):
+        """
+        Vehicles, alerts and penalties changed after a cursor:
+        GET /api/sync/?since=<cursor>&limit=<changes>. Answers
+        {"cursor": ..., "has_more": ..., "vehicles": {"changed": [...], "deleted": [ids]},
+        "alerts": {...}, "penalties": {...}}; pass the cursor back on the next
+        sync, straight away while `has_more` is true. Without `since` only the
+        cursor is returned: take it before downloading the full lists.
+        """
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': change_log.latest_cursor(), 'has_more': False})
+        try:
+            since = int(since)
+            limit = int(request.query_params.get('limit', SYNC_CONFIG['PAGE_SIZE']))
+        except ValueError:
+            return Response({'error': 'since and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({'error': 'since must be 0 or more and limit 1 or more'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if change_log.expired(since):
+            return Response({'error': 'Cursor expired, download the lists again'}, status=status.HTTP_410_GONE)
+
+        changes, cursor, has_more = change_log.changes_since(since, min(limit, SYNC_CONFIG['MAX_PAGE_SIZE']))
+        vehicles = Vehicle.objects.in_bulk(changes['vehicles'][0])
+        alerts = Alert.objects.select_related('vehicle').in_bulk(changes['alerts'][0])
+        penalties = Penalty.objects.select_related('vehicle').in_bulk(changes['penalties'][0])
+
+        def delta(resource, objects, data):
+            changed_ids, deleted_ids = changes[resource]
+            return {
+                'changed': data([objects[pk] for pk in changed_ids if pk in objects]),
+                # Deleted since it was logged, its deletion is logged after the cursor
+                'deleted': deleted_ids + [pk for pk in changed_ids if pk not in objects],
+            }
+
+        context = {'request': request}
+        return Response({
+            'cursor': cursor,
+            'has_more': has_more,
+            'vehicles': delta('vehicles', vehicles, lambda rows: VehicleSerializer(rows, many=True, context=context).data),
+            'alerts': delta('alerts', alerts, lambda rows: AlertSerializer(rows, many=True, context=context).data),
+            'penalties': delta('penalties', penalties, lambda rows: [penalty_data(p) for p in rows]),
+        })
+
+
 @api_view(['GET'])
 # @permission_classes([IsAuthenticated])
 def get_penalties(request):
@@ -865,29 +938,19 @@ def get_penalties(request):
                     'error': 'Invalid max_overload value'
                 }, status=400)
         
+        # Paged when asked for, the whole list otherwise
+        if 'cursor' in request.GET or 'page_size' in request.GET:
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(penalties, request)
+            return paginator.get_paginated_response([penalty_data(p) for p in page])
+
         # Serialize data with more vehicle details
-        data = [{
-            'id': p.id,
-            'vehicle': {
-                'id': p.vehicle.id,
-                'vehicle_id': p.vehicle.vehicle_id,
-                'owner': p.vehicle.owner,
-                'vehicle_name': p.vehicle.vehicle_name
-            },
-            'overload_amount': float(p.overload_amount),
-            'timestamp': p.timestamp,
-            'amount': float(p.amount),
-            'paid': p.paid,
-            'status': p.status,
-            'location': {
-                'latitude': float(p.latitude) if p.latitude else None,
-                'longitude': float(p.longitude) if p.longitude else None
-            },
-            'paid_date': p.paid_date,
-            'reference_number': p.reference_number
-        } for p in penalties]
+        data = [penalty_data(p) for p in penalties]
         
         return Response(data)
+    except NotFound:
+        # Invalid cursor
+        raise
     except Exception as e:
         logger.error(f"Error getting penalties: {str(e)}")
         return Response({
@@ -33,6 +33,7 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # runserver serves the ASGI application, including websockets
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -90,6 +91,26 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'vehicle_monitoring_system.wsgi.application'
+ASGI_APPLICATION = 'vehicle_monitoring_system.asgi.application'
+
+# Fan-out of fleet updates to dashboards (monitoring/fleet_feed.py). Set
+# REDIS_URL so that readings processed by the ingest workers and the gateway
+# reach dashboards connected to the web processes; the in-memory layer only
+# reaches clients of the same process, and the workers warn when started on it.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        },
+    }
 
 
 # Database
@@ -156,6 +177,8 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",  
 ]
+# Validators of conditional GET on the vehicle and alert endpoints
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified']
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 8 
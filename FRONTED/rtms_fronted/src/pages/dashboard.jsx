@@ -49,6 +49,12 @@ function Dashboard() {
   const mapRef = useRef(null);
 
   const API_URL = 'http://localhost:8000/api/';
+  const WS_URL = 'ws://localhost:8000/ws/';
+  // Slow safety net behind the feed, for readings published where this socket cannot hear them
+  const FALLBACK_POLL_MS = 60000;
+  const socketRef = useRef(null);
+  const reconnectRef = useRef(null);
+  const vehiclesRef = useRef([]);
 
   // Fetch user profile data
   const fetchUserProfile = async () => {
@@ -177,25 +183,90 @@ function Dashboard() {
     navigate('/login');
   };
 
+  // Merge pushed fleet changes into the vehicles and alerts on screen
+  const applyFleetChanges = (changes) => {
+    const byId = new Map(changes.map(change => [change.id, change]));
+    const merge = vehicles => vehicles.map(vehicle => {
+      const change = byId.get(vehicle.id);
+      if (!change) return vehicle;
+      return {
+        ...vehicle,
+        weight: change.weight ?? vehicle.weight,
+        status: change.weight_alert ? 'overload' : 'normal',
+        location: change.lat != null && change.lon != null ? [change.lat, change.lon] : vehicle.location,
+        lastUpdate: new Date().toLocaleString()
+      };
+    });
+    setAllVehicles(merge);
+    setDisplayVehicles(merge);
+
+    const newAlerts = changes.filter(change => change.alert).map(change => {
+      const vehicle = vehiclesRef.current.find(v => v.id === change.id);
+      return {
+        id: change.alert.id,
+        type: change.alert.type || 'Weight Alert',
+        vehicle_id: vehicle ? vehicle.plate : change.id,
+        vehicle_name: vehicle ? vehicle.vehicleName : 'Unknown',
+        message: change.alert.message || 'Unknown Alert',
+        time: change.alert.timestamp ? new Date(change.alert.timestamp).toLocaleString() : new Date().toLocaleString(),
+        severity: change.alert.severity || 'high',
+        location: change.lat != null && change.lon != null ? [change.lat, change.lon] : null
+      };
+    });
+    if (newAlerts.length) {
+      setAllAlerts(alerts => [...newAlerts, ...alerts.filter(a => !newAlerts.some(n => n.id === a.id))]);
+      setDisplayAlerts(newAlerts.slice(0, 1));
+    }
+  };
+
+  // Open the fleet feed; on a dropped connection reload the data and reconnect
+  const connectFleetFeed = () => {
+    const socket = new WebSocket(`${WS_URL}fleet/?token=${localStorage.getItem('access_token')}`);
+    socket.onopen = () => socket.send(JSON.stringify({ type: 'subscribe' }));
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      if (message.type === 'fleet.update') {
+        applyFleetChanges(message.changes);
+      }
+    };
+    socket.onclose = () => {
+      if (socketRef.current !== socket) return;
+      reconnectRef.current = setTimeout(() => {
+        fetchDashboardData();
+        connectFleetFeed();
+      }, 5000);
+    };
+    socketRef.current = socket;
+  };
+
   // Set up real-time updates
   useEffect(() => {
     fetchUserProfile();
     fetchDashboardData();
+    connectFleetFeed();
 
-    const dataPollingInterval = setInterval(() => {
+    const fallbackPollInterval = setInterval(() => {
       fetchDashboardData();
-    }, 8000);
+    }, FALLBACK_POLL_MS);
 
     const timeInterval = setInterval(() => {
       setCurrentTime(new Date());
     }, 10000);
 
     return () => {
-      clearInterval(dataPollingInterval);
+      const socket = socketRef.current;
+      socketRef.current = null;
+      if (socket) socket.close();
+      clearTimeout(reconnectRef.current);
+      clearInterval(fallbackPollInterval);
       clearInterval(timeInterval);
     };
   }, []);
 
+  useEffect(() => {
+    vehiclesRef.current = allVehicles;
+  }, [allVehicles]);
+
   // Calculate weight percentage
   const calculateWeightPercentage = (weight, maxWeight) => {
     return Math.min(100, (weight / maxWeight) * 100);
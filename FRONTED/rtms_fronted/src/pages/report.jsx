@@ -54,33 +54,11 @@ const formatNumber = (num) => {
   return num.toLocaleString();
 };
 
-// Geocoding utility function
-const reverseGeocode = async (lat, lon) => {
-  // Check if coordinates are valid numbers
-  if (isNaN(lat) || isNaN(lon)) {
-    console.warn('Invalid coordinates:', lat, lon);
-    return 'Unknown Location';
-  }
+// Place names are resolved by the backend, once per map grid cell
+const GEOCODE_URL = 'http://localhost:8000/api/geocode/';
+const GEOCODE_BATCH_SIZE = 200;
 
-  try {
-    const response = await fetch(
-      `https://nominatim.openstreetmap.org/reverse?format=json&lat=${lat}&lon=${lon}`
-    );
-    const data = await response.json();
-    
-    // Extract and format the location name
-    if (data.display_name) {
-      // Split the display name by commas and take first two parts
-      const parts = data.display_name.split(',').map(part => part.trim());
-      const shortName = parts.slice(0, 2).join(', ');
-      return shortName || `${lat.toFixed(4)}, ${lon.toFixed(4)}`;
-    }
-    return `${lat.toFixed(4)}, ${lon.toFixed(4)}`;
-  } catch (error) {
-    console.error('Geocoding error:', error);
-    return `${lat.toFixed(4)}, ${lon.toFixed(4)}`;
-  }
-};
+const formatCoordinates = (lat, lon) => `${lat.toFixed(4)}, ${lon.toFixed(4)}`;
 
 // Custom hook for geocoding
 const useGeocodedLocations = (alerts) => {
@@ -88,36 +66,54 @@ const useGeocodedLocations = (alerts) => {
   const [isLoading, setIsLoading] = useState(false);
 
   useEffect(() => {
-
     const processLocations = async () => {
-  setIsLoading(true);
-  const newLocationNames = {};
-  
-  for (const alert of alerts) {
-    console.log()
-    if (alert.location && alert.location.includes(',')) {
-      const [latStr, lonStr] = alert.location.split(',');
-      const lat = parseFloat(alert.coordinates[0]);
-      const lon = parseFloat(alert.coordinates[1]);
-      // Only proceed if both coordinates are valid numbers
-      if (!isNaN(lat) && !isNaN(lon)) {
-        const name = await reverseGeocode(lat, lon);
-        newLocationNames[alert.location] = name;
-      } else {
-        newLocationNames[alert.location] = 'Invalid Location';
+      const newLocationNames = {};
+      const unnamed = [];
+
+      for (const alert of alerts) {
+        if (alert.placeName) {
+          newLocationNames[alert.location] = alert.placeName;
+        } else if (alert.hasCoordinates) {
+          unnamed.push(alert);
+        } else {
+          newLocationNames[alert.location] = 'Unknown Location';
+        }
+      }
+
+      if (unnamed.length > 0) {
+        setIsLoading(true);
+        const token = localStorage.getItem('access_token');
+        for (let start = 0; start < unnamed.length; start += GEOCODE_BATCH_SIZE) {
+          const batch = unnamed.slice(start, start + GEOCODE_BATCH_SIZE);
+          try {
+            const response = await axios.post(GEOCODE_URL, {
+              points: batch.map(alert => ({
+                latitude: alert.coordinates[0],
+                longitude: alert.coordinates[1]
+              }))
+            }, {
+              headers: { 'Authorization': `Bearer ${token}` }
+            });
+            response.data.results.forEach((result, index) => {
+              const [lat, lon] = batch[index].coordinates;
+              newLocationNames[batch[index].location] = result.place_name || formatCoordinates(lat, lon);
+            });
+          } catch (error) {
+            console.error('Geocoding error:', error);
+            batch.forEach(alert => {
+              newLocationNames[alert.location] = formatCoordinates(...alert.coordinates);
+            });
+          }
+        }
       }
-    } else {
-      newLocationNames[alert.location] = 'Unknown Location';
-    }
-  }
-  
-  setLocationNames(newLocationNames);
-  setIsLoading(false);
-};
+
+      setLocationNames(newLocationNames);
+      setIsLoading(false);
+    };
 
     processLocations();
   }, [alerts]);
-console.log(locationNames)
+
   return { locationNames, isLoading };
 };
 
@@ -163,6 +159,8 @@ function VehicleReports() {
     coordinates: alert.latitude && alert.longitude ? 
                 [parseFloat(alert.latitude), parseFloat(alert.longitude)] : 
                 [-6.7924, 39.2083],
+    hasCoordinates: alert.latitude != null && alert.longitude != null,
+    placeName: alert.place_name || '',
     notified: alert.notified || false
   });
 
@@ -278,12 +276,13 @@ function VehicleReports() {
       });
       
       const data = response.data || {};
+      const labels = data.times || ['6AM', '9AM', '12PM', '3PM', '6PM', '9PM'];
       return {
-        labels: data.times || ['6AM', '9AM', '12PM', '3PM', '6PM', '9PM'],
+        labels,
         datasets: [
           {
             label: 'Average Vehicle Weight (kg)',
-            data: data.average_weights || [0, 0, 0, 0, 0, 0],
+            data: data.average_weights || Array(labels.length).fill(0),
             fill: true,
             backgroundColor: 'rgba(52, 152, 219, 0.2)',
             borderColor: 'rgba(52, 152, 219, 1)',
@@ -291,7 +290,7 @@ function VehicleReports() {
           },
           {
             label: 'Max Weight Limit',
-            data: Array(6).fill(15000),
+            data: Array(labels.length).fill(15000),
             borderColor: 'rgba(231, 76, 60, 1)',
             borderWidth: 2,
             borderDash: [5, 5],
@@ -373,7 +372,7 @@ function VehicleReports() {
       return false;
     }
     // Location filter
-    if (alertFilters.location && !(alert.location || '').toLowerCase().includes(alertFilters.location.toLowerCase())) {
+    if (alertFilters.location && !(locationNames[alert.location] || alert.location || '').toLowerCase().includes(alertFilters.location.toLowerCase())) {
       return false;
     }
     // Overload filter